@@ -0,0 +1,176 @@
+"""
+Compares the closure-compiling interpreter and the bytecode backend with a naive
+recursive evaluator that dispatches on node type and keeps variables in a dict.
+
+Run with: python -m benchmarks.interpreter [iterations]
+"""
+
+import sys
+from io import StringIO
+from time import perf_counter
+
+from qbparse import Program, parse
+from qbparse.ast import (
+    Assignment,
+    BinOp,
+    Constant,
+    Expr,
+    Goto,
+    If,
+    Label,
+    Print,
+    Statement,
+    UniOp,
+    Var,
+)
+from qbparse.bytecode import CompiledProgram
+from qbparse.interpreter import Interpreter, uses_double
+from qbparse.profiler import Profile
+from qbparse.runtime import (
+    BINARY_OPS,
+    UNARY_OPS,
+    Output,
+    Value,
+    constant_value,
+    converter,
+    format_value,
+    initial_value,
+    truth,
+)
+
+SOURCE = """n& = {iterations}
+total# = 0
+i& = 0
+10 i& = i& + 1
+x = i& * 3 + 1
+if x mod 7 = 0 then
+    total# = total# + x / 7
+elseif x mod 5 = 0 and i& > 10 then
+    total# = total# - 1
+else
+    total# = total# + 0.5
+end if
+if i& < n& then goto 10
+? i&, total#
+"""
+
+
+class Jump(Exception):
+    def __init__(self, label: Label):
+        self.label = label
+
+
+class NaiveEvaluator:
+    def __init__(self, program: Program, out: Output):
+        impl = program.globals.procedures["_main"].impl
+        assert impl is not None
+        self.statements = impl.statements
+        self.out = out
+        self.env: dict[tuple[str, object], Value] = {}
+
+    def eval(self, expr: Expr) -> Value:
+        match expr:
+            case Constant():
+                return constant_value(expr.value, expr.type)
+            case Var():
+                key = (expr.target.name, expr.target.type)
+                if key not in self.env:
+                    return initial_value(expr.target.type)
+                return self.env[key]
+            case BinOp():
+                return BINARY_OPS[expr.name](
+                    self.eval(expr.left), self.eval(expr.right)
+                )
+            case UniOp():
+                return UNARY_OPS[expr.name](self.eval(expr.param))
+            case _:
+                raise TypeError(expr)
+
+    def exec(self, stmt: Statement):
+        match stmt:
+            case Assignment():
+                assert isinstance(stmt.lval, Var)
+                target = stmt.lval.target
+                value = converter(target.type)(self.eval(stmt.rval))
+                self.env[(target.name, target.type)] = value
+            case Print():
+                for param in stmt.params:
+                    if param is Print.TAB_SEPARATOR:
+                        self.out.next_zone()
+                    elif param is Print.FINAL_NEWLINE:
+                        self.out.write("\n")
+                    else:
+                        value = self.eval(param)
+                        self.out.write(format_value(value, uses_double(param)))
+            case If():
+                if truth(self.eval(stmt.guard)):
+                    self.block(stmt.true_branch)
+                    return
+                for guard, body in stmt.elseifs:
+                    if truth(self.eval(guard)):
+                        self.block(body)
+                        return
+                self.block(stmt.false_branch)
+            case Goto():
+                assert stmt.target is not None
+                raise Jump(stmt.target)
+            case Label():
+                pass
+            case _:
+                raise TypeError(stmt)
+
+    def block(self, statements: list[Statement]):
+        i = 0
+        while i < len(statements):
+            try:
+                self.exec(statements[i])
+                i += 1
+            except Jump as jump:
+                if jump.label not in statements:
+                    raise
+                i = next(n for n, s in enumerate(statements) if s is jump.label)
+
+    def run(self):
+        self.block(self.statements)
+        self.out.flush()
+
+
+def best_time(run, repeats: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = perf_counter()
+        run()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def main(iterations: int):
+    program = parse(SOURCE.format(iterations=iterations))
+
+    naive_out = StringIO()
+    naive = best_time(lambda: NaiveEvaluator(program, Output(naive_out)).run())
+
+    compiled_out = StringIO()
+    interpreter = Interpreter(program)
+    compiled = best_time(lambda: interpreter.run(compiled_out))
+
+    profiled_out = StringIO()
+    profiled_program = Interpreter(program, Profile())
+    profiled = best_time(lambda: profiled_program.run(profiled_out))
+
+    bytecode_out = StringIO()
+    bytecode_program = CompiledProgram(program)
+    bytecode = best_time(lambda: bytecode_program.run(bytecode_out))
+
+    assert naive_out.getvalue() == compiled_out.getvalue() == bytecode_out.getvalue()
+    print(f"output:    {compiled_out.getvalue().splitlines()[0]}")
+    print(f"naive:     {naive * 1000:8.1f} ms")
+    print(f"closures:  {compiled * 1000:8.1f} ms  ({naive / compiled:.1f}x)")
+    print(
+        f"profiled:  {profiled * 1000:8.1f} ms  ({profiled / compiled:.1f}x closures)"
+    )
+    print(f"bytecode:  {bytecode * 1000:8.1f} ms  ({naive / bytecode:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
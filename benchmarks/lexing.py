@@ -0,0 +1,76 @@
+"""
+Tokens per second lexing a large generated source, sequentially and in parallel
+chunks with increasing numbers of worker processes, and replaying a recording
+of the tokens, both before and after reading each replayed token. The parallel
+and replayed output is checked against the sequential lexer.
+
+Run with: python -m benchmarks.lexing [megabytes]
+"""
+
+import os
+import sys
+from time import perf_counter
+
+from qbparse.chunked import chunk_bounds, lex_chunks
+from qbparse.lexer import Lexer, Tokens
+from qbparse.recording import dumps, replay
+from qbparse.source import source_hash
+
+LINES = """x{n}& = &HFF& + {n} * 2.5d0 - y! ' comment
+if x{n}& > {n} then ? "value"; x{n}&, z$ else goto 10
+10 label{n}: a%% = (b%% + c%%) \\ 3 _
+    + 1
+"""
+
+
+def source(megabytes: float) -> bytes:
+    parts: list[str] = []
+    size = 0
+    n = 0
+    while size < megabytes * 1024 * 1024:
+        part = LINES.format(n=n)
+        parts.append(part)
+        size += len(part)
+        n += 1
+    return "".join(parts).encode()
+
+
+def sequential(data: bytes):
+    lexer = Lexer(binary=True)
+    lexer.input(data)
+    return [(t.type, t.value, t.lineno, t.lexpos, lexer.lexpos) for t in lexer]
+
+
+def main(megabytes: float):
+    data = source(megabytes)
+    print(f"{len(data) / 1024 / 1024:.1f} MB")
+    start = perf_counter()
+    expected = sequential(data)
+    elapsed = perf_counter() - start
+    print(f"sequential: {len(expected) / elapsed:12,.0f} tokens/s")
+    cores = os.cpu_count() or 1
+    jobs = 1
+    while jobs <= cores:
+        bounds = chunk_bounds(data, jobs)
+        start = perf_counter()
+        tokens = lex_chunks(data, bounds, jobs).tokens
+        elapsed = perf_counter() - start
+        result = [(t.type, t.value, t.lineno, t.lexpos, t.endpos) for t in tokens]
+        assert result == expected
+        print(f"{jobs:3} jobs:   {len(tokens) / elapsed:12,.0f} tokens/s")
+        jobs *= 2
+    recording = dumps(Tokens(data), source_hash(data))
+    # Replayed tokens are made as they are read, so time reading them too
+    start = perf_counter()
+    tokens = replay(recording).tokens
+    ready = perf_counter() - start
+    result = [(t.type, t.value, t.lineno, t.lexpos, t.endpos) for t in tokens]
+    elapsed = perf_counter() - start
+    assert result == expected
+    print(f"replay:     {len(tokens) / ready:12,.0f} tokens/s before reading")
+    print(f"            {len(tokens) / elapsed:12,.0f} tokens/s read")
+    print(f"recording:  {len(recording) / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 8)
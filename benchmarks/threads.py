@@ -0,0 +1,43 @@
+"""
+Parses a batch of programs on 1, 2, 4 and 8 threads. On the free-threaded
+build the speedup should be close to the thread count; with the GIL there is
+none.
+
+Run with: python -m benchmarks.threads [programs]
+"""
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from qbparse import parse
+
+
+def program(n: int) -> str:
+    # Each input is distinct, so none is served from a token cache
+    return (
+        "\n".join(
+            f'x{i} = {i} * {n} + y\nif x{i} > 3 then ? x{i}, "big" else ? x{i}'
+            for i in range(200)
+        )
+        + "\n"
+    )
+
+
+def main(programs: int):
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"GIL enabled: {gil}")
+    inputs = [program(n) for n in range(programs)]
+    base = None
+    for threads in (1, 2, 4, 8):
+        with ThreadPoolExecutor(threads) as pool:
+            start = perf_counter()
+            for _ in pool.map(parse, inputs):
+                pass
+            elapsed = perf_counter() - start
+        base = base or elapsed
+        print(f"{threads} threads: {elapsed * 1000:8.1f} ms  ({base / elapsed:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 64)
@@ -1,20 +1,131 @@
-from qbparse.ast import ProcDefinition
-from qbparse.context import ParseContext
+import os
+from collections.abc import Generator
+from mmap import mmap
+from typing import BinaryIO
+
+from qbparse.ast import ProcDefinition, Statement
+from qbparse.context import CancelToken, ParseContext
 from qbparse.datatypes import BUILTIN_TYPES, TypeSignature
-from qbparse.parsers import do_block
+from qbparse.errors import Cancelled, ParseError
+from qbparse.lexer import tokenize
+from qbparse.parsers import iter_program
+from qbparse.source import LineIndex, Source, map_file
 from qbparse.symbols import Procedure, SymbolStore
 
 
 class Program:
-    def __init__(self):
+    def __init__(self, lines: LineIndex):
         self.globals = SymbolStore()
+        # Errors collected when parsing in recovery mode
+        self.errors: list[ParseError] = []
+        # Resolves node spans and error offsets to line and column
+        self.lines = lines
+        # Set if a parse in recovery mode was cancelled, leaving the program
+        # incomplete
+        self.cancelled = False
+
+
+def parse(
+    input: Source,
+    recover: bool = False,
+    lazy: bool = False,
+    prelude: SymbolStore | None = None,
+    cancel: CancelToken | None = None,
+    deadline: float | None = None,
+    cached: bool = False,
+    jobs: int = 1,
+):
+    """
+    Parse a complete program, given as text or CP437-encoded bytes. With recover
+    set, parse errors are collected in Program.errors and a partial program is
+    returned instead of raising.
 
+    With lazy set, SUB and FUNCTION bodies are only parsed when their
+    Procedure.impl is first accessed. Their signatures are available straight
+    away. Errors in a lazily parsed body are raised from, or in recovery mode
+    added to Program.errors by, that access.
 
-def parse(input: str):
-    program = Program()
-    ctx = ParseContext(input, program.globals)
+    A prelude is a frozen SymbolStore, such as the globals of a parsed program
+    of shared declarations. The program starts with a fork of its symbols.
+
+    The parse stops with Cancelled once cancel is cancelled, or with
+    DeadlineExceeded once time.monotonic() passes deadline. In recovery mode
+    the program parsed so far is returned instead, with Program.cancelled set.
+    Such a parse lexes as it goes, rather than up front, so that it stops
+    promptly.
+
+    Otherwise the whole source is lexed first. With cached set, its tokens are
+    kept in the process-wide qbparse.lexer.cache, bounded by CACHE_TOKENS, for
+    the next parse of the same text. With jobs other than 1, a large source is
+    lexed in up to that many worker processes, or one per CPU if jobs is 0; see
+    chunked.lex_parallel().
+    """
+    program = Program(LineIndex(input))
+    if prelude is not None:
+        program.globals = prelude.fork()
+    watched = cancel is not None or deadline is not None
+    tokens = input if watched else tokenize(input, cached, jobs)
+    ctx = ParseContext(tokens, program.globals, recover, lazy)
+    ctx.lines = program.lines
     main = Procedure("_main", TypeSignature(BUILTIN_TYPES["_none"], []))
-    main.impl = ProcDefinition()
-    program.globals.procedures["_main"] = main
-    main.impl.statements = do_block(ctx)
+    main.impl = ProcDefinition(program.globals).at(0, len(input))
+    program.globals.add_procedure(main)
+    statements: list[Statement] = []
+    try:
+        ctx.watch(cancel, deadline)
+        for stmt in iter_program(ctx):
+            statements.append(stmt)
+    except Cancelled:
+        if not recover:
+            raise
+        program.cancelled = True
+    main.impl.statements = statements
+    main.impl.labels = ctx.labels
+    program.errors = ctx.errors
     return program
+
+
+def parse_file(
+    path: str | os.PathLike[str],
+    recover: bool = False,
+    lazy: bool = False,
+    jobs: int = 1,
+):
+    """
+    Parse a CP437-encoded source file. The file is memory-mapped and lexed as
+    bytes, so no decoded copy of the whole file is made. Jobs is as for parse().
+    """
+    with map_file(path) as input:
+        return parse(input, recover, lazy, jobs=jobs)
+
+
+def iter_statements(
+    input: Source | os.PathLike[str] | BinaryIO,
+) -> Generator[Statement]:
+    """
+    Parse a program, yielding each top-level statement of the main block as soon
+    as it is complete. Nothing keeps hold of the statements, so memory use does
+    not grow with the length of the program. Paths and binary files are
+    memory-mapped as for parse_file().
+    """
+    if not isinstance(input, str | bytes | mmap):
+        with map_file(input) as data:
+            yield from iter_statements(data)
+        return
+    symbols = SymbolStore()
+    ctx = ParseContext(input, symbols)
+    try:
+        yield from iter_program(ctx)
+    except ParseError as error:
+        error.locate(LineIndex(input))
+        raise
+
+
+def __getattr__(name: str):
+    # The asyncio API is imported on first use, so importing qbparse does not
+    # import asyncio
+    if name in ("aparse", "aparse_many", "AsyncParser"):
+        from qbparse import aio
+
+        return getattr(aio, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
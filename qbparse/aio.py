@@ -0,0 +1,153 @@
+"""
+Parsing from asyncio code without blocking the event loop.
+
+Parses run on an executor: by default the event loop's default thread pool,
+or any Executor given to an AsyncParser, such as a ProcessPoolExecutor to
+parse on several cores. An AsyncParser bounds how many parses run at once,
+and requests for a source that is already being parsed with the same options
+wait for that parse instead of starting another.
+
+Cancelling the awaiting task stops its parse once no other task is waiting for
+it. A parse that has already started on a thread is stopped through a
+CancelToken; one that has started in another process runs to completion.
+"""
+
+import asyncio
+from collections.abc import Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from weakref import WeakKeyDictionary
+
+from qbparse import Program, parse
+from qbparse.context import CancelToken
+from qbparse.source import Source, source_hash
+
+
+class Job:
+    """
+    A parse in flight, and the number of tasks waiting for it.
+    """
+
+    def __init__(self, task: "asyncio.Task[Program]", cancel: CancelToken | None):
+        self.task = task
+        self.cancel = cancel
+        self.waiters = 0
+
+    def stop(self):
+        if self.cancel is not None:
+            self.cancel.cancel()
+        self.task.cancel()
+
+
+class AsyncParser:
+    def __init__(self, executor: Executor | None = None, limit: int | None = None):
+        """
+        Parse on executor, or the event loop's default executor if None, with
+        at most limit parses running at once. An AsyncParser must only be used
+        from one event loop.
+        """
+        self.executor = executor
+        self.limit = asyncio.Semaphore(limit) if limit else None
+        # In-flight parses by source hash and options
+        self.jobs: dict[tuple[bytes, bool, bool], Job] = {}
+
+    def __repr__(self):
+        return f"[AsyncParser executor={self.executor} jobs={len(self.jobs)}]"
+
+    async def parse(
+        self, input: Source, recover: bool = False, lazy: bool = False
+    ) -> Program:
+        """
+        As qbparse.parse(). Lazy parses keep a reference to their parse state,
+        so cannot be returned from another process.
+        """
+        in_process = not isinstance(self.executor, ProcessPoolExecutor)
+        if lazy and not in_process:
+            raise ValueError("Lazy parses cannot be run in another process")
+        key = (source_hash(input), recover, lazy)
+        job = self.jobs.get(key)
+        if job is None:
+            cancel = CancelToken() if in_process else None
+            task = asyncio.ensure_future(self.run(input, recover, lazy, cancel))
+            job = self.jobs[key] = Job(task, cancel)
+            task.add_done_callback(partial(self.done, key, job))
+        job.waiters += 1
+        try:
+            return await asyncio.shield(job.task)
+        except asyncio.CancelledError:
+            job.waiters -= 1
+            if not job.waiters:
+                # Forgotten straight away, so that a later request for the same
+                # source starts a new parse rather than joining this one
+                if self.jobs.get(key) is job:
+                    del self.jobs[key]
+                job.stop()
+            raise
+
+    async def run(
+        self, input: Source, recover: bool, lazy: bool, cancel: CancelToken | None
+    ) -> Program:
+        loop = asyncio.get_running_loop()
+        call = partial(parse, input, recover, lazy, cancel=cancel)
+        if self.limit is None:
+            return await loop.run_in_executor(self.executor, call)
+        async with self.limit:
+            return await loop.run_in_executor(self.executor, call)
+
+    def done(
+        self, key: tuple[bytes, bool, bool], job: Job, task: "asyncio.Task[Program]"
+    ):
+        if self.jobs.get(key) is job:
+            del self.jobs[key]
+        if not task.cancelled():
+            # Retrieved here so an unawaited failure is not logged
+            task.exception()
+
+    async def parse_many(
+        self, inputs: Iterable[Source], recover: bool = False, lazy: bool = False
+    ) -> list[Program]:
+        """
+        Parse each input, returning the programs in the same order.
+        """
+        return await asyncio.gather(
+            *(self.parse(input, recover, lazy) for input in inputs)
+        )
+
+
+# An AsyncParser on the default executor for each event loop
+_parsers: WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncParser] = (
+    WeakKeyDictionary()
+)
+
+
+def default_parser() -> AsyncParser:
+    loop = asyncio.get_running_loop()
+    parser = _parsers.get(loop)
+    if parser is None:
+        parser = _parsers[loop] = AsyncParser()
+    return parser
+
+
+async def aparse(
+    input: Source,
+    recover: bool = False,
+    lazy: bool = False,
+    parser: AsyncParser | None = None,
+) -> Program:
+    """
+    Parse on parser, by default on the event loop's default executor.
+    """
+    return await (parser or default_parser()).parse(input, recover, lazy)
+
+
+async def aparse_many(
+    inputs: Iterable[Source],
+    recover: bool = False,
+    lazy: bool = False,
+    parser: AsyncParser | None = None,
+) -> list[Program]:
+    """
+    Parse several inputs at once on parser, by default on the event loop's
+    default executor.
+    """
+    return await (parser or default_parser()).parse_many(inputs, recover, lazy)
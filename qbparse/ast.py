@@ -2,13 +2,30 @@ from __future__ import annotations
 
 from collections.abc import Generator, Iterable
 from itertools import chain
-from typing import Any
+from typing import TYPE_CHECKING, Any, SupportsIndex
 
 from qbparse.datatypes import BUILTIN_TYPES, Type
-from qbparse.symbols import Variable
+from qbparse.symbols import SymbolStore, Variable
+
+if TYPE_CHECKING:
+    from qbparse.cfg import CFG
+    from qbparse.inference import ExprTypes
 
 
 class Node:
+    # Source span as offsets into the input, end exclusive. Nodes that do not come
+    # from the source directly have a span of (-1, -1).
+    __slots__ = ("start", "end")
+
+    def __init__(self):
+        self.start = -1
+        self.end = -1
+
+    def at(self, start: int, end: int):
+        self.start = start
+        self.end = end
+        return self
+
     def children(self) -> Iterable[Node]:
         return ()
 
@@ -36,35 +53,69 @@ class Node:
 
 
 class Statement(Node):
-    pass
+    __slots__ = ()
 
 
 class ProcDefinition(Node):
-    def __init__(self):
-        self.statements: list[Statement] = []
+    __slots__ = ("_statements", "symbols", "params", "labels", "cfg", "types")
+
+    def __init__(
+        self, symbols: SymbolStore | None = None, params: list[Variable] | None = None
+    ):
+        super().__init__()
+        # Cached by qbparse.cfg.control_flow()
+        self.cfg: CFG | None = None
+        # Cached by qbparse.inference.expression_types()
+        self.types: ExprTypes | None = None
+        self.statements = []
+        # Scope the body was parsed in
+        self.symbols = symbols
+        self.params = params or []
+        # Every label and line number in the body, to the statement it names
+        self.labels: dict[str, Label] = {}
+
+    @property
+    def statements(self) -> list[Statement]:
+        return self._statements
+
+    @statements.setter
+    def statements(self, statements: list[Statement]):
+        self._statements = statements
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Drop analyses cached on the body. Code that changes the statements in
+        place, rather than by assigning a new list, must call this.
+        """
+        self.cfg = None
+        self.types = None
 
     def __repr__(self):
-        return f"[ProcDefinition statements={self.statements}]"
+        return f"[ProcDefinition params={self.params} statements={self.statements}]"
 
     def __eq__(self, other: Any):
         if type(self) is not type(other):
             return NotImplemented
-        return self.statements == other.statements
+        return self.params == other.params and self.statements == other.statements
 
     def children(self):
         return self.statements
 
 
 class Expr(Node):
-    pass
+    __slots__ = ()
 
 
 class LValue(Expr):
-    pass
+    __slots__ = ()
 
 
 class Var(LValue):
+    __slots__ = ("target",)
+
     def __init__(self, target: Variable):
+        super().__init__()
         self.target = target
 
     def __repr__(self):
@@ -77,7 +128,10 @@ class Var(LValue):
 
 
 class BinOp(Expr):
+    __slots__ = ("name", "left", "right")
+
     def __init__(self, name: str, left: Expr, right: Expr):
+        super().__init__()
         self.name = name
         self.left = left
         self.right = right
@@ -99,7 +153,10 @@ class BinOp(Expr):
 
 
 class UniOp(Expr):
+    __slots__ = ("name", "param")
+
     def __init__(self, name: str, param: Expr):
+        super().__init__()
         self.name = name
         self.param = param
 
@@ -116,11 +173,14 @@ class UniOp(Expr):
 
 
 class Call(Expr, Statement):
-    pass
+    __slots__ = ()
 
 
 class Assignment(Statement):
+    __slots__ = ("lval", "rval")
+
     def __init__(self, lval: LValue, rval: Expr):
+        super().__init__()
         self.lval = lval
         self.rval = rval
 
@@ -137,7 +197,10 @@ class Assignment(Statement):
 
 
 class Constant(Expr):
-    def __init__(self, value: str | int | float, type: Type):
+    __slots__ = ("value", "type")
+
+    def __init__(self, value: str | int | float | tuple[int, int], type: Type):
+        super().__init__()
         self.value = value
         self.type = type
 
@@ -149,12 +212,25 @@ class Constant(Expr):
             return NotImplemented
         return self.value == other.value and self.type == other.type
 
+    def __reduce_ex__(self, protocol: SupportsIndex) -> str | tuple[Any, ...]:
+        # Print's shared constants are compared by identity, so must unpickle to
+        # themselves
+        if self is Print.TAB_SEPARATOR:
+            return (getattr, (Print, "TAB_SEPARATOR"))
+        if self is Print.FINAL_NEWLINE:
+            return (getattr, (Print, "FINAL_NEWLINE"))
+        return super().__reduce_ex__(protocol)
+
 
 class Print(Statement):
+    __slots__ = ("params",)
+
+    # Shared by every Print, so these never get a source span
     TAB_SEPARATOR = Constant("\t", BUILTIN_TYPES["string"])
     FINAL_NEWLINE = Constant("\n", BUILTIN_TYPES["string"])
 
     def __init__(self, params: list[Expr] | None = None):
+        super().__init__()
         self.params = params if params else []
 
     def __repr__(self):
@@ -170,6 +246,8 @@ class Print(Statement):
 
 
 class If(Statement):
+    __slots__ = ("guard", "true_branch", "elseifs", "false_branch")
+
     def __init__(
         self,
         guard: Expr,
@@ -177,6 +255,7 @@ class If(Statement):
         elseifs: list[tuple[Expr, list[Statement]]],
         false_branch: list[Statement],
     ):
+        super().__init__()
         self.guard = guard
         self.true_branch = true_branch
         self.elseifs = elseifs
@@ -206,3 +285,38 @@ class If(Statement):
             *[e[1] for e in self.elseifs],
             self.false_branch,
         )
+
+
+class Label(Statement):
+    # A line number and label on the same line are both names for one position
+    __slots__ = ("names",)
+
+    def __init__(self, names: list[str]):
+        super().__init__()
+        self.names = names
+
+    def __repr__(self):
+        return f"[Label names={self.names}]"
+
+    def __eq__(self, other: Any):
+        if type(self) is not type(other):
+            return NotImplemented
+        return self.names == other.names
+
+
+class Goto(Statement):
+    __slots__ = ("name", "target")
+
+    def __init__(self, name: str, target: Label | None = None):
+        super().__init__()
+        self.name = name
+        # Resolved by the parser once the label has been seen
+        self.target = target
+
+    def __repr__(self):
+        return f"[Goto name={self.name}]"
+
+    def __eq__(self, other: Any):
+        if type(self) is not type(other):
+            return NotImplemented
+        return self.name == other.name
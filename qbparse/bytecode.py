@@ -0,0 +1,353 @@
+"""
+Compiles the main block of a program to Python bytecode.
+
+The block is lowered to a Python ast.Module holding one function, which is
+compiled with the builtin compile(). Variables become local variables of that
+function, IF chains become if/elif/else and PRINT writes to a buffer. Run-time
+helpers are bound as default arguments, so they are fast locals too.
+
+Numeric operators whose operands cannot be strings are emitted as Python
+operators; the rest call the helpers in qbparse.runtime. Values are made to fit
+their variable's type on assignment, as by the interpreter.
+"""
+
+import ast
+import sys
+from collections import OrderedDict
+from collections.abc import Callable
+from threading import Lock
+from typing import Any, TextIO
+
+from qbparse import Program, parse
+from qbparse.ast import (
+    Assignment,
+    BinOp,
+    Constant,
+    Expr,
+    Goto,
+    If,
+    Label,
+    Print,
+    Statement,
+    UniOp,
+    Var,
+)
+from qbparse.interpreter import uses_double
+from qbparse.runtime import (
+    BINARY_OPS,
+    UNARY_OPS,
+    Output,
+    QBError,
+    constant_value,
+    converter,
+    format_value,
+    initial_value,
+    is_string,
+    truth,
+)
+from qbparse.source import Source, source_hash
+from qbparse.symbols import Variable
+
+# Operators emitted as Python operators when both operands are numbers, or for
+# + both strings
+ARITHMETIC: dict[str, type[ast.operator]] = {
+    "+": ast.Add,
+    "-": ast.Sub,
+    "*": ast.Mult,
+    "/": ast.Div,
+}
+COMPARISONS: dict[str, type[ast.cmpop]] = {
+    "=": ast.Eq,
+    "<>": ast.NotEq,
+    "<": ast.Lt,
+    ">": ast.Gt,
+    "<=": ast.LtE,
+    ">=": ast.GtE,
+}
+
+# Number of compiled programs kept by compile_source()
+CACHE_SIZE = 64
+
+
+def name(id: str) -> ast.Name:
+    return ast.Name(id, ast.Load())
+
+
+def store(id: str) -> ast.Name:
+    return ast.Name(id, ast.Store())
+
+
+def call(function: str, *args: ast.expr) -> ast.Call:
+    return ast.Call(name(function), list(args), [])
+
+
+def is_text(expr: Expr) -> bool:
+    """
+    Whether expr might have a string value.
+    """
+    match expr:
+        case Constant():
+            return is_string(expr.type)
+        case Var():
+            return is_string(expr.target.type)
+        case BinOp(name="+"):
+            return is_text(expr.left) or is_text(expr.right)
+        case _:
+            return False
+
+
+class CodeGen:
+    def __init__(self):
+        # Local variable name of each variable, by identity
+        self.locals: dict[int, str] = {}
+        self.variables: list[Variable] = []
+        # Helpers by argument name, and the argument name for each helper key
+        self.helpers: dict[str, Any] = {}
+        self.helper_names: dict[Any, str] = {}
+        # Segment that each top-level label starts
+        self.segments: dict[int, int] = {}
+
+    def local(self, var: Variable) -> str:
+        local = self.locals.get(id(var))
+        if local is None:
+            local = self.locals[id(var)] = f"v{len(self.variables)}"
+            self.variables.append(var)
+        return local
+
+    def helper(self, key: Any, make: Callable[[], Any], prefix: str) -> str:
+        helper = self.helper_names.get(key)
+        if helper is None:
+            helper = self.helper_names[key] = f"_{prefix}{len(self.helpers)}"
+            self.helpers[helper] = make()
+        return helper
+
+    def operator(self, op: str, binary: bool = True) -> str:
+        ops = BINARY_OPS if binary else UNARY_OPS
+        return self.helper(("op", op), lambda: ops[op], "op")
+
+    def expr(self, expr: Expr) -> ast.expr:
+        match expr:
+            case Constant():
+                return ast.Constant(constant_value(expr.value, expr.type))
+            case Var():
+                return name(self.local(expr.target))
+            case BinOp():
+                left, right = self.expr(expr.left), self.expr(expr.right)
+                if self.same_kind(expr):
+                    if expr.name in ARITHMETIC and (
+                        expr.name == "+" or not is_text(expr.left)
+                    ):
+                        return ast.BinOp(left, ARITHMETIC[expr.name](), right)
+                    if expr.name in COMPARISONS:
+                        # QB64 true is -1
+                        return ast.UnaryOp(ast.USub(), self.compare(expr))
+                return call(self.operator(expr.name), left, right)
+            case UniOp():
+                param = self.expr(expr.param)
+                if expr.name == "negation" and not is_text(expr.param):
+                    return ast.UnaryOp(ast.USub(), param)
+                return call(self.operator(expr.name, binary=False), param)
+            case _:
+                raise QBError(f"Cannot compile {type(expr).__name__}")
+
+    def same_kind(self, expr: BinOp) -> bool:
+        """
+        Whether the operands are both numbers or both strings, so a Python
+        operator gives the QB64 result.
+        """
+        return is_text(expr.left) == is_text(expr.right)
+
+    def compare(self, expr: BinOp) -> ast.Compare:
+        return ast.Compare(
+            self.expr(expr.left), [COMPARISONS[expr.name]()], [self.expr(expr.right)]
+        )
+
+    def condition(self, expr: Expr) -> ast.expr:
+        if (
+            isinstance(expr, BinOp)
+            and expr.name in COMPARISONS
+            and self.same_kind(expr)
+        ):
+            return self.compare(expr)
+        if is_text(expr):
+            return call(self.helper("truth", lambda: truth, "truth"), self.expr(expr))
+        return self.expr(expr)
+
+    def statement(self, stmt: Statement) -> list[ast.stmt]:
+        match stmt:
+            case Assignment():
+                if not isinstance(stmt.lval, Var):
+                    raise QBError(f"Cannot assign to {type(stmt.lval).__name__}")
+                target = stmt.lval.target
+                convert = self.helper(
+                    ("convert", target.type), lambda: converter(target.type), "convert"
+                )
+                value = call(convert, self.expr(stmt.rval))
+                return [ast.Assign([store(self.local(target))], value)]
+            case Print():
+                return self.print(stmt)
+            case If():
+                return [self.branch(stmt)]
+            case Goto():
+                if stmt.target is None or id(stmt.target) not in self.segments:
+                    raise QBError(f"Cannot compile GOTO {stmt.name}")
+                segment = ast.Constant(self.segments[id(stmt.target)])
+                return [ast.Assign([store("pc")], segment), ast.Continue()]
+            case _:
+                raise QBError(f"Cannot compile {type(stmt).__name__}")
+
+    def print(self, stmt: Print) -> list[ast.stmt]:
+        result: list[ast.stmt] = []
+        # Text written since the last zone move, joined into one write
+        pending: list[ast.expr] = []
+
+        def write():
+            if pending:
+                joined = pending[0]
+                for part in pending[1:]:
+                    joined = ast.BinOp(joined, ast.Add(), part)
+                result.append(ast.Expr(call("_write", joined)))
+                pending.clear()
+
+        def text(value: str):
+            last = pending[-1] if pending else None
+            if isinstance(last, ast.Constant) and isinstance(last.value, str):
+                last.value += value
+            else:
+                pending.append(ast.Constant(value))
+
+        for param in stmt.params:
+            if param is Print.TAB_SEPARATOR:
+                write()
+                result.append(ast.Expr(call("_zone")))
+            elif param is Print.FINAL_NEWLINE:
+                text("\n")
+            elif isinstance(param, Constant):
+                value = constant_value(param.value, param.type)
+                text(format_value(value, uses_double(param)))
+            elif is_text(param):
+                pending.append(self.expr(param))
+            else:
+                format = self.helper("format", lambda: format_value, "format")
+                double = ast.Constant(uses_double(param))
+                pending.append(call(format, self.expr(param), double))
+        write()
+        return result
+
+    def branch(self, stmt: If) -> ast.If:
+        orelse: list[ast.stmt] = []
+        if stmt.false_branch:
+            orelse = self.block(stmt.false_branch)
+        for guard, body in reversed(stmt.elseifs):
+            orelse = [ast.If(self.condition(guard), self.block(body), orelse)]
+        return ast.If(self.condition(stmt.guard), self.block(stmt.true_branch), orelse)
+
+    def block(self, statements: list[Statement]) -> list[ast.stmt]:
+        result: list[ast.stmt] = []
+        for stmt in statements:
+            if isinstance(stmt, Label):
+                raise QBError("Labels inside blocks cannot be compiled")
+            result.extend(self.statement(stmt))
+        return result or [ast.Pass()]
+
+    def body(self, statements: list[Statement]) -> list[ast.stmt]:
+        """
+        Statements of the main block. If it has labels it is split into
+        segments at each label, run in a loop; GOTO sets the segment to resume
+        at and continues the loop.
+        """
+        segments: list[list[Statement]] = [[]]
+        for stmt in statements:
+            if isinstance(stmt, Label):
+                self.segments[id(stmt)] = len(segments)
+                segments.append([])
+            else:
+                segments[-1].append(stmt)
+        if len(segments) == 1:
+            return self.block(statements)
+        loop: list[ast.stmt] = []
+        for n, segment in enumerate(segments):
+            # Each segment runs if control started at or before it
+            test = ast.Compare(name("pc"), [ast.LtE()], [ast.Constant(n)])
+            loop.append(ast.If(test, self.block(segment), []))
+        loop.append(ast.Break())
+        return [
+            ast.Assign([store("pc")], ast.Constant(0)),
+            ast.While(ast.Constant(True), loop, []),
+        ]
+
+    def module(self, statements: list[Statement]) -> ast.Module:
+        body = self.body(statements)
+        setup: list[ast.stmt] = [
+            ast.Assign(
+                [store("_write")], ast.Attribute(name("_out"), "write", ast.Load())
+            ),
+            ast.Assign(
+                [store("_zone")], ast.Attribute(name("_out"), "next_zone", ast.Load())
+            ),
+        ]
+        for var in self.variables:
+            value = ast.Constant(initial_value(var.type))
+            setup.append(ast.Assign([store(self.local(var))], value))
+        args = ast.arguments(
+            posonlyargs=[],
+            args=[ast.arg("_out")] + [ast.arg(helper) for helper in self.helpers],
+            kwonlyargs=[],
+            kw_defaults=[],
+            defaults=[name(helper) for helper in self.helpers],
+        )
+        function = ast.FunctionDef("main", args, setup + body, decorator_list=[])
+        return ast.fix_missing_locations(ast.Module([function], []))
+
+
+class CompiledProgram:
+    """
+    The main block of a program as a Python function. tree is the generated
+    Python AST, which ast.unparse() turns back into readable source.
+    """
+
+    def __init__(self, program: Program):
+        impl = program.globals.procedures["_main"].impl
+        assert impl is not None
+        gen = CodeGen()
+        self.tree = gen.module(impl.statements)
+        self.code = compile(self.tree, "<qbparse>", "exec")
+        namespace = dict(gen.helpers)
+        exec(self.code, namespace)
+        self.function: Callable[[Output], None] = namespace["main"]
+
+    def run(self, out: TextIO = sys.stdout):
+        output = Output(out)
+        try:
+            self.function(output)
+        except ZeroDivisionError:
+            raise QBError("Division by zero") from None
+        except OverflowError:
+            raise QBError("Overflow") from None
+        finally:
+            output.flush()
+
+
+_cache: OrderedDict[bytes, CompiledProgram] = OrderedDict()
+_cache_lock = Lock()
+
+
+def compile_source(input: Source) -> CompiledProgram:
+    """
+    Parse and compile a program. The last CACHE_SIZE results are kept by hash
+    of the source, so compiling the same text again is a dictionary lookup.
+    """
+    key = source_hash(input)
+    with _cache_lock:
+        compiled = _cache.get(key)
+        if compiled is not None:
+            _cache.move_to_end(key)
+            return compiled
+    # Compiled outside the lock; a thread that loses the race uses the winner's
+    compiled = CompiledProgram(parse(input))
+    with _cache_lock:
+        compiled = _cache.setdefault(key, compiled)
+        _cache.move_to_end(key)
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
@@ -0,0 +1,173 @@
+"""
+Catalogue of QB64's builtin SUBs and FUNCTIONs.
+
+Each line is a name, the sigil of the return type (- for a SUB) and the sigils
+of the parameter types, separated by spaces. Parameters that can be left out
+are not listed, and a function that takes any numeric type is given its
+widest form. The text is only split into lines when first needed, by
+symbols.BuiltinCatalogue, and a line only becomes a Procedure when its name is
+looked up.
+
+The _MEM procedures, such as _MEMGET, are left out: they take and return the
+_MEM type, and _MEMGET takes a type name as an argument, neither of which a
+sigil can express.
+"""
+
+CATALOGUE = """\
+abs # #
+asc % $
+atn # #
+cdbl # #
+chr $ &
+cint % #
+clng & #
+cos # #
+csng ! #
+csrlin %
+cvd # $
+cvi % $
+cvl & $
+cvs ! $
+date $
+environ $ $
+eof % %
+erl &
+err %
+exp # #
+fix # #
+freefile %
+hex $ &&
+inkey $
+instr & $ $
+int # #
+lcase $ $
+left $ $ &
+len & $
+loc & %
+lof & %
+log # #
+ltrim $ $
+mid $ $ &
+mkd $ #
+mki $ %
+mkl $ &
+mks $ !
+oct $ &&
+peek % &
+point & % %
+pos % %
+right $ $ &
+rnd !
+rtrim $ $
+sgn % #
+sin # #
+space $ &
+sqr # #
+str $ #
+tan # #
+time $
+timer #
+ucase $ $
+val # $
+beep -
+cls -
+color - &
+locate - %
+randomize - #
+sleep -
+sound - # #
+swap - # #
+_acos # #
+_acosh # #
+_alpha & ~&
+_alpha32 & ~&
+_asin # #
+_asinh # #
+_atan2 # # #
+_atanh # #
+_autodisplay -
+_blue & ~&
+_blue32 & ~&
+_ceil # #
+_clipboard $
+_commandcount &
+_copyimage & &
+_cosh # #
+_cot # #
+_csc # #
+_cwd $
+_d2g # #
+_d2r # #
+_deflate $ $
+_desktopheight &
+_desktopwidth &
+_dest &
+_dir $ $
+_direxists & $
+_display -
+_fileexists & $
+_font & &
+_fontheight & &
+_fontwidth & &
+_freefont - &
+_freeimage - &
+_g2d # #
+_g2r # #
+_green & ~&
+_green32 & ~&
+_height & &
+_hypot # # #
+_icon -
+_inflate $ $
+_instrrev & $ $
+_keyclear -
+_keydown & &
+_keyhit &
+_limit - #
+_loadfont & $ &
+_loadimage & $
+_mousebutton & &
+_mouseinput &
+_mousewheel &
+_mousex #
+_mousey #
+_newimage & & & &
+_os $
+_pi #
+_printstring - # # $
+_printwidth & $
+_putimage -
+_r2d # #
+_r2g # #
+_red & ~&
+_red32 & ~&
+_resize &
+_resizeheight &
+_resizewidth &
+_rgb ~& & & &
+_rgb32 ~& & & &
+_rgba ~& & & & &
+_rgba32 ~& & & & &
+_round && #
+_screenexists &
+_screenheight &
+_screenwidth &
+_sec # #
+_setalpha - &
+_sinh # #
+_sndclose - &
+_sndlen # &
+_sndopen & $
+_sndplay - &
+_sndplaying & &
+_sndstop - &
+_sndvol - & !
+_source &
+_startdir $
+_strcmp & $ $
+_stricmp & $ $
+_tanh # #
+_title $
+_trim $ $
+_width & &
+"""
@@ -0,0 +1,192 @@
+"""
+Control-flow graphs over procedure bodies.
+"""
+
+from array import array
+
+from qbparse.ast import Goto, If, Label, Node, ProcDefinition, Statement
+
+
+class CFG:
+    """
+    Basic blocks of a procedure body, in compact integer arrays.
+
+    The items of block b are items[block_starts[b] : block_starts[b + 1]]. Items
+    are statements, in source order. An If ends its block, standing for the
+    branch on its guard, and each ELSEIF guard expression is a block of its own.
+    Successors of block b are succs[succ_starts[b] : succ_starts[b + 1]], and
+    likewise for predecessors. Block 0 is the entry; the last block is the exit,
+    and is empty. Blocks that cannot be reached from the entry, such as the
+    one after a GOTO, have no edges, so they are no one's predecessors.
+    """
+
+    def __init__(self):
+        self.items: list[Node] = []
+        self.block_starts = array("i")
+        # Block of each item
+        self.block_of = array("i")
+        self.succ_starts = array("i")
+        self.succs = array("i")
+        self.pred_starts = array("i")
+        self.preds = array("i")
+        # Item index by node identity
+        self.positions: dict[int, int] = {}
+
+    def __repr__(self):
+        return f"[CFG blocks={len(self)} items={len(self.items)}]"
+
+    def __len__(self):
+        return len(self.block_starts) - 1
+
+    @property
+    def entry(self):
+        return 0
+
+    @property
+    def exit(self):
+        return len(self) - 1
+
+    def block(self, b: int) -> list[Node]:
+        return self.items[self.block_starts[b] : self.block_starts[b + 1]]
+
+    def successors(self, b: int) -> array[int]:
+        return self.succs[self.succ_starts[b] : self.succ_starts[b + 1]]
+
+    def predecessors(self, b: int) -> array[int]:
+        return self.preds[self.pred_starts[b] : self.pred_starts[b + 1]]
+
+    def block_containing(self, node: Node) -> int:
+        return self.block_of[self.positions[id(node)]]
+
+
+class Builder:
+    def __init__(self):
+        self.cfg = CFG()
+        self.edges: list[tuple[int, int]] = []
+        self.gotos: list[tuple[int, Goto]] = []
+        self.label_blocks: dict[int, int] = {}
+
+    def new_block(self) -> int:
+        self.cfg.block_starts.append(len(self.cfg.items))
+        return len(self.cfg.block_starts) - 1
+
+    def add(self, block: int, node: Node):
+        self.cfg.positions[id(node)] = len(self.cfg.items)
+        self.cfg.items.append(node)
+        self.cfg.block_of.append(block)
+
+    def is_empty(self, block: int):
+        return self.cfg.block_starts[block] == len(self.cfg.items)
+
+    def statements(self, statements: list[Statement], block: int) -> int:
+        """
+        Add statements to the CFG, starting in block. Returns the block that
+        control falls through to afterwards.
+        """
+        for stmt in statements:
+            match stmt:
+                case Label():
+                    # A jump target starts a block
+                    if not self.is_empty(block):
+                        following = self.new_block()
+                        self.edges.append((block, following))
+                        block = following
+                    self.add(block, stmt)
+                    self.label_blocks[id(stmt)] = block
+                case Goto():
+                    self.add(block, stmt)
+                    self.gotos.append((block, stmt))
+                    # Anything after is unreachable until the next label
+                    block = self.new_block()
+                case If():
+                    block = self.branch(stmt, block)
+                case _:
+                    self.add(block, stmt)
+        return block
+
+    def branch(self, stmt: If, block: int) -> int:
+        self.add(block, stmt)
+        ends: list[int] = []
+        then = self.new_block()
+        self.edges.append((block, then))
+        ends.append(self.statements(stmt.true_branch, then))
+        for guard, branch in stmt.elseifs:
+            test = self.new_block()
+            self.add(test, guard)
+            self.edges.append((block, test))
+            block = test
+            then = self.new_block()
+            self.edges.append((test, then))
+            ends.append(self.statements(branch, then))
+        if stmt.false_branch:
+            otherwise = self.new_block()
+            self.edges.append((block, otherwise))
+            ends.append(self.statements(stmt.false_branch, otherwise))
+        else:
+            ends.append(block)
+        join = self.new_block()
+        for end in ends:
+            self.edges.append((end, join))
+        return join
+
+    def build(self, impl: ProcDefinition) -> CFG:
+        last = self.statements(impl.statements, self.new_block())
+        exit = self.new_block()
+        self.edges.append((last, exit))
+        for block, goto in self.gotos:
+            if goto.target is not None:
+                self.edges.append((block, self.label_blocks[id(goto.target)]))
+        cfg = self.cfg
+        cfg.block_starts.append(len(cfg.items))
+        blocks = len(cfg)
+        edges = reachable_edges(blocks, self.edges)
+        cfg.succ_starts, cfg.succs = adjacency(blocks, edges)
+        cfg.pred_starts, cfg.preds = adjacency(blocks, [(b, a) for a, b in edges])
+        return cfg
+
+
+def adjacency(
+    blocks: int, edges: list[tuple[int, int]]
+) -> tuple[array[int], array[int]]:
+    """
+    Compressed sparse rows for edges: the targets of each source, in order.
+    """
+    counts = [0] * (blocks + 1)
+    for source, _ in edges:
+        counts[source + 1] += 1
+    for b in range(blocks):
+        counts[b + 1] += counts[b]
+    starts = array("i", counts)
+    targets = array("i", [0]) * len(edges)
+    fill = counts[:-1]
+    for source, target in edges:
+        targets[fill[source]] = target
+        fill[source] += 1
+    return starts, targets
+
+
+def reachable_edges(blocks: int, edges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """
+    The edges from blocks reachable from block 0.
+    """
+    starts, targets = adjacency(blocks, edges)
+    reached = bytearray(blocks)
+    reached[0] = 1
+    stack = [0]
+    while stack:
+        block = stack.pop()
+        for target in targets[starts[block] : starts[block + 1]]:
+            if not reached[target]:
+                reached[target] = 1
+                stack.append(target)
+    return [(source, target) for source, target in edges if reached[source]]
+
+
+def control_flow(impl: ProcDefinition) -> CFG:
+    """
+    The CFG of a procedure body. It is built on first use and cached on impl
+    until impl.invalidate() is called.
+    """
+    if impl.cfg is None:
+        impl.cfg = Builder().build(impl)
+    return impl.cfg
@@ -0,0 +1,101 @@
+"""
+Lexing of large sources in parallel.
+
+No token spans a line break except a _ line join, so a source can be cut into
+chunks after any newline that does not end a joined line. Each chunk is lexed
+in a worker process from the start of a line, as the whole source would be, and
+the tokens are shifted back to their offsets and line numbers in the source.
+
+Tokens do not depend on any symbols, so the result is the same as lexing the
+whole source sequentially.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+from ply.lex import LexToken
+
+from qbparse.lexer import Lexer, Tokens
+from qbparse.source import Source
+
+# Smallest chunk handed to a worker, so per-chunk overhead stays small
+MIN_CHUNK_SIZE = 256 * 1024
+
+# A token as sent back from a worker: type, value, lineno, lexpos, endpos
+type TokenTuple = tuple[str, Any, int, int, int]
+
+
+def chunk_bounds(input: Source, chunks: int) -> list[int]:
+    """
+    Offsets that cut input into about the given number of chunks, each cut
+    just after a newline that does not end a joined line. Starts with 0 and
+    ends with len(input).
+    """
+    newline = "\n" if isinstance(input, str) else b"\n"
+    join = "_" if isinstance(input, str) else b"_"
+    blank = " \t\r" if isinstance(input, str) else b" \t\r"
+    length = len(input)
+    bounds = [0]
+    for n in range(1, chunks):
+        pos = max(length * n // chunks, bounds[-1])
+        while True:
+            pos = input.find(newline, pos)  # pyright: ignore[reportArgumentType]
+            if pos < 0:
+                break
+            # The last character before the newline, ignoring blanks
+            end = pos
+            while end > 0 and input[end - 1 : end] in blank:  # pyright: ignore
+                end -= 1
+            if input[end - 1 : end] != join:
+                break
+            pos += 1
+        if pos < 0 or pos + 1 >= length:
+            break
+        bounds.append(pos + 1)
+    bounds.append(length)
+    return bounds
+
+
+def lex_chunk(chunk: str | bytes) -> list[TokenTuple]:
+    lexer = Lexer(binary=isinstance(chunk, bytes))
+    lexer.input(chunk)
+    return [(t.type, t.value, t.lineno, t.lexpos, lexer.lexpos) for t in lexer]
+
+
+def lex_parallel(input: Source, jobs: int | None = None) -> Tokens:
+    """
+    Lex input in up to jobs worker processes, by default one per CPU. The result
+    is the same as Tokens(input). Inputs too small to be worth splitting are
+    lexed in this process.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    chunks = max(1, min(jobs, len(input) // MIN_CHUNK_SIZE))
+    return lex_chunks(input, chunk_bounds(input, chunks), jobs)
+
+
+def lex_chunks(input: Source, bounds: list[int], jobs: int) -> Tokens:
+    """
+    Lex the chunks of input between consecutive bounds, and stitch the tokens
+    together.
+    """
+    pieces = [input[start:end] for start, end in zip(bounds, bounds[1:])]
+    if len(pieces) == 1 or jobs == 1:
+        results = map(lex_chunk, pieces)
+    else:
+        with ProcessPoolExecutor(min(jobs, len(pieces))) as pool:
+            results = list(pool.map(lex_chunk, pieces))
+    tokens: list[LexToken] = []
+    lineno = 0
+    for start, piece, result in zip(bounds, pieces, results):
+        for type, value, line, lexpos, endpos in result:
+            tok = LexToken()
+            tok.type = type
+            tok.value = value
+            tok.lineno = line + lineno
+            tok.lexpos = lexpos + start
+            tok.endpos = endpos + start
+            tokens.append(tok)
+        lineno += piece.count("\n") if isinstance(piece, str) else piece.count(b"\n")
+    # The lexer counts lines from 1
+    return Tokens.from_list(tokens, len(input), lineno + 1)
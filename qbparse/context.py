@@ -1,42 +1,193 @@
 import os
+from time import monotonic
 
+from ply.lex import Lexer as PlyLexer
 from ply.lex import LexToken
 
-from qbparse.errors import ParseError
-from qbparse.lexer import Lexer
-from qbparse.symbols import SymbolStore
+from qbparse.ast import Goto, Label
+from qbparse.errors import Cancelled, DeadlineExceeded, ParseError
+from qbparse.lexer import Lexer, Tokens
+from qbparse.source import LineIndex, Source
+from qbparse.symbols import SymbolStore, Variable
 
 TRACE_TOKENS = "TRACE_TOKENS" in os.environ
 
+# Tokens read between checks for cancellation
+CHECK_INTERVAL = 1024
+
+
+class CancelToken:
+    """
+    Stops the parses it is given to, from any thread. They notice within
+    CHECK_INTERVAL tokens.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
 
 class ParseContext:
-    def __init__(self, input: str, symbols: SymbolStore):
+    def __init__(
+        self,
+        input: Source | Tokens,
+        symbols: SymbolStore,
+        recover: bool = False,
+        lazy: bool = False,
+        lexpos: int = 0,
+        lineno: int = 1,
+    ):
         self.symbols = symbols
-        self.token_stream = Lexer(self.symbols)
-        self.token_stream.input(input)
+        # In recovery mode errors are collected here instead of aborting the parse
+        self.recover = recover
+        self.errors: list[ParseError] = []
+        # If set, errors are given their line and column as they are reported
+        self.lines: LineIndex | None = None
+        # Defer parsing SUB and FUNCTION bodies until they are needed
+        self.lazy = lazy
+        # Return value of the FUNCTION whose body is being parsed
+        self.result: Variable | None = None
+        # Stop the parse once cancel is cancelled or time.monotonic() passes
+        # deadline; checked every CHECK_INTERVAL tokens
+        self.cancel: CancelToken | None = None
+        self.deadline: float | None = None
+        self.countdown = 0
+        # Labels seen so far, and GOTOs waiting for a label further on
+        self.labels: dict[str, Label] = {}
+        self.unresolved: dict[str, list[Goto]] = {}
+        # Source text is lexed as it is read. Tokens already carry their line
+        # numbers, so lineno is only used for source text.
+        self.input = input
+        self.token_stream: PlyLexer | None = None
+        self.position = 0
+        if isinstance(input, Tokens):
+            self.position = input.index(lexpos)
+        else:
+            self.token_stream = Lexer(binary=not isinstance(input, str))
+            self.token_stream.input(input)
+            self.token_stream.lexpos = lexpos
+            self.token_stream.lineno = lineno
         self.reversed_tokens: list[LexToken] = []
-        next(self)
+        # Offset just past the most recently consumed token
+        self.end = 0
+        self.tok = self.read()
+        if TRACE_TOKENS:
+            print(">", self.tok)
+
+    def spawn(self, symbols: SymbolStore, lexpos: int, lineno: int) -> "ParseContext":
+        """
+        Create a context that parses the same input from lexpos with other
+        symbols. Errors are collected with this context's.
+        """
+        ctx = ParseContext(self.input, symbols, self.recover, self.lazy, lexpos, lineno)
+        ctx.errors = self.errors
+        ctx.lines = self.lines
+        if not self.lazy:
+            # Lazy bodies are parsed after this parse is over
+            ctx.watch(self.cancel, self.deadline)
+        return ctx
+
+    def watch(self, cancel: CancelToken | None, deadline: float | None):
+        """
+        Raise Cancelled from __next__ once cancel is cancelled, or
+        DeadlineExceeded once time.monotonic() passes deadline.
+        """
+        self.cancel = cancel
+        self.deadline = deadline
+        if cancel is not None or deadline is not None:
+            self.check()
+
+    def check(self):
+        self.countdown = CHECK_INTERVAL
+        if self.cancel is not None and self.cancel.cancelled:
+            raise Cancelled("Parse cancelled")
+        if self.deadline is not None and monotonic() >= self.deadline:
+            raise DeadlineExceeded("Parse deadline exceeded")
 
     def __next__(self):
+        if self.countdown:
+            self.countdown -= 1
+            if not self.countdown:
+                self.check()
+        self.end = self.tok.endpos
         if len(self.reversed_tokens):
             self.tok = self.reversed_tokens.pop()
-            if TRACE_TOKENS:
-                print(">", self.tok)
-            return self.tok
-        try:
-            self.tok = next(self.token_stream)
-        except StopIteration:
-            eof = LexToken()
-            eof.lexer = self.tok.lexer
-            eof.lexpos = self.tok.lexer.lexlen
-            eof.lineno = self.tok.lineno
-            eof.type = "EOF"
-            eof.value = ""
-            self.tok = eof
+        else:
+            self.tok = self.read()
         if TRACE_TOKENS:
             print(">", self.tok)
         return self.tok
 
+    def read(self) -> LexToken:
+        """
+        Fetch the next token from the input, or EOF. Each token is given an
+        endpos to go with its lexpos, and identifiers are resolved.
+        """
+        tokens = self.input
+        if isinstance(tokens, Tokens):
+            if self.position < len(tokens):
+                tok = tokens.tokens[self.position]
+                self.position += 1
+            else:
+                tok = self.eof(tokens.length, tokens.lineno)
+        else:
+            assert self.token_stream is not None
+            try:
+                tok = next(self.token_stream)
+                tok.endpos = self.token_stream.lexpos
+            except StopIteration:
+                tok = self.eof(self.token_stream.lexlen, self.token_stream.lineno)
+        if tok.type == "ID":
+            tok = self.resolve(tok)
+        return tok
+
+    def eof(self, lexpos: int, lineno: int) -> LexToken:
+        tok = LexToken()
+        tok.lexpos = tok.endpos = lexpos
+        tok.lineno = lineno
+        tok.type = "EOF"
+        tok.value = ""
+        return tok
+
+    def resolve(self, tok: LexToken) -> LexToken:
+        """
+        Classify an identifier from the lexer by looking it up in the current
+        symbols: a PROCEDURE or VARIABLE with the symbol as value, or else an ID
+        with its name and type. The lexer's token may be shared, so a new token
+        is returned.
+        """
+        name, sigil = tok.value
+        symbols = self.symbols
+        result = LexToken()
+        result.lineno = tok.lineno
+        result.lexpos = tok.lexpos
+        result.endpos = tok.endpos
+        try:
+            if proc := symbols.find_procedure(name):
+                result.type = "PROCEDURE"
+                result.value = proc
+                if sigil is not None:
+                    # The sigil must match the existing procedure, if present
+                    typ = symbols.lookup_sigil(sigil)
+                    if proc.signature and typ != proc.signature.ret:
+                        result.type = "ERROR"
+                        result.value = name + sigil
+            elif var := symbols.find_variable(name, sigil):
+                result.type = "VARIABLE"
+                result.value = var
+            else:
+                result.type = "ID"
+                result.value = (name, symbols.lookup_sigil(sigil))
+        except ParseError:
+            # A sigil the lexer accepts, but for a type that is not supported.
+            # As an ERROR token it is reported where it is met, like a lexer
+            # error, and recovery mode can carry on past it.
+            result.type = "ERROR"
+            result.value = name + sigil
+        return result
+
     def reverse(self, tok: LexToken):
         if TRACE_TOKENS:
             print("<<<", self.tok)
@@ -52,12 +203,24 @@ class ParseContext:
     def consume(self, tok_type: str, tok_value: str | None = None):
         if tok_value is None:
             if self.tok.type != tok_type:
-                raise ParseError("Expected " + tok_type)
+                raise ParseError("Expected " + tok_type, self.tok.lexpos)
         else:
-            if self.tok.type != tok_type and self.tok.value != tok_value:
-                raise ParseError(f"Expected {tok_type} {tok_value}")
+            if self.tok.type != tok_type or self.tok.value != tok_value:
+                raise ParseError(f"Expected {tok_type} {tok_value}", self.tok.lexpos)
         return next(self)
 
+    def report(self, error: ParseError):
+        """
+        Record an error in recovery mode, or raise it otherwise.
+        """
+        if error.lexpos is None:
+            error.lexpos = self.tok.lexpos
+        if self.lines is not None and error.line is None:
+            error.locate(self.lines)
+        if not self.recover:
+            raise error
+        self.errors.append(error)
+
     def at_line_terminator(self):
         """
         Is current token a newline/:, else or EOF?
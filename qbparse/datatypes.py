@@ -1,4 +1,5 @@
 import struct
+from types import MappingProxyType
 from typing import Any
 
 
@@ -11,6 +12,12 @@ class Type:
     def __repr__(self):
         return f"[Type {self.name}]"
 
+    def __reduce__(self) -> tuple[Any, ...]:
+        # Builtin types are compared by identity, so must unpickle to themselves
+        if BUILTIN_TYPES.get(self.name) is self:
+            return (builtin_type, (self.name,))
+        return (Type, (self.name, self.min, self.max))
+
 
 class FixedWidthType(Type):
     @staticmethod
@@ -32,6 +39,17 @@ class FixedWidthType(Type):
         self.base_type = base_type
         self.width = width
 
+    def __eq__(self, other: Any):
+        if type(self) is not type(other):
+            return NotImplemented
+        return self.base_type is other.base_type and self.width == other.width
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (FixedWidthType, (self.base_type, self.width, self.min, self.max))
+
 
 class TypeSignature:
     def __init__(self, ret: Type, params: list[Type]):
@@ -47,6 +65,10 @@ class TypeSignature:
         return self.ret == other.ret and self.params == other.params
 
 
+def builtin_type(name: str) -> Type:
+    return BUILTIN_TYPES[name]
+
+
 def bits2float(spec1: str, spec2: str, b: int):
     return struct.unpack(">" + spec1, struct.pack(">" + spec2, b))[0]
 
@@ -97,3 +119,8 @@ BUILTIN_SIGILS = {
     "##": BUILTIN_TYPES["_float"],
     "$": BUILTIN_TYPES["string"],
 }
+
+# Read-only, as builtin types are compared by identity and shared by every parse,
+# on any thread
+BUILTIN_TYPES = MappingProxyType(BUILTIN_TYPES)
+BUILTIN_SIGILS = MappingProxyType(BUILTIN_SIGILS)
@@ -1,2 +1,31 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from qbparse.source import LineIndex
+
+
 class ParseError(Exception):
-    pass
+    def __init__(self, message: str, lexpos: int | None = None):
+        super().__init__(message)
+        # Offset into the source where the error was detected, if known
+        self.lexpos = lexpos
+        # Filled in by locate() once the line index is available
+        self.line: int | None = None
+        self.column: int | None = None
+
+    def locate(self, lines: "LineIndex"):
+        if self.lexpos is not None:
+            self.line, self.column = lines.position(self.lexpos)
+
+
+class Cancelled(Exception):
+    """
+    A parse stopped by its CancelToken. Not a ParseError, so recovery mode does
+    not carry on past it.
+    """
+
+
+class DeadlineExceeded(Cancelled):
+    """
+    A parse stopped because its deadline passed.
+    """
@@ -41,30 +41,43 @@ def do_expr(ctx: ParseContext, right_binding: int = 0) -> Expr:
         match token.type, token.value:
             case "PUNCTUATION", "(":
                 result = do_expr(ctx)
-                ctx.consume("PUNCTUATION", "(")
-                return result
+                ctx.consume("PUNCTUATION", ")")
+                # The span of a bracketed expression includes the brackets
+                return result.at(token.lexpos, ctx.end)
             case "PUNCTUATION", "-":
-                return UniOp("negation", do_expr(ctx, PREC_NEGATION))
+                param = do_expr(ctx, PREC_NEGATION)
+                return UniOp("negation", param).at(token.lexpos, param.end)
             case "KEYWORD", "not":
-                return UniOp("not", do_expr(ctx, PRECEDENCE["not"]))
+                param = do_expr(ctx, PRECEDENCE["not"])
+                return UniOp("not", param).at(token.lexpos, param.end)
             case "ID", _:
                 ctx.reverse(token)
                 return do_lvalue(ctx)
             case "STRING_LIT", _:
-                return Constant(token.value, BUILTIN_TYPES["string"])
-            case (("BASE_LIT" | "EXP_LIT" | "DEC_LIT" | "INT_LIT"), _):
-                return Constant(token.value, detect_numeric_type(token.value))
+                return Constant(token.value, BUILTIN_TYPES["string"]).at(
+                    token.lexpos, token.endpos
+                )
+            case (("BASE_LIT" | "EXP_LIT"), (value, typ)):
+                # These literals carry their type
+                return Constant(value, typ).at(token.lexpos, token.endpos)
+            case (("DEC_LIT" | "INT_LIT"), _):
+                return Constant(token.value, detect_numeric_type(token.value)).at(
+                    token.lexpos, token.endpos
+                )
             case "PROCEDURE", _:
-                raise ParseError("Unimplemented procedure call")
+                ctx.reverse(token)
+                raise ParseError("Unimplemented procedure call", token.lexpos)
             case "VARIABLE", var:
-                return Var(var)
+                return Var(var).at(token.lexpos, token.endpos)
             case _:
-                raise ParseError(f"Unexpected {token.type} {token.value}")
+                # Leave the offending token current so error recovery can see it
+                ctx.reverse(token)
+                raise ParseError(f"Unexpected {token.type} {token.value}", token.lexpos)
 
     def binding_power():
         match ctx.tok.type, ctx.tok.value:
             case (("STRING_LIT" | "BASE_LIT" | "EXP_LIT" | "DEC_LIT" | "INT_LIT"), _):
-                raise ParseError("Unexpected literal")
+                raise ParseError("Unexpected literal", ctx.tok.lexpos)
             case "PUNCTUATION", ")":
                 return 0
             case (("PUNCTUATION" | "KEYWORD"), op) if op in PRECEDENCE:
@@ -77,8 +90,8 @@ def do_expr(ctx: ParseContext, right_binding: int = 0) -> Expr:
         next(ctx)
         if token.type in ["KEYWORD", "PUNCTUATION"] and token.value in PRECEDENCE:
             right = do_expr(ctx, PRECEDENCE[token.value])
-            return BinOp(token.value, left, right)
-        raise ParseError(f"Unpexpected {token.type} {token.value}")
+            return BinOp(token.value, left, right).at(left.start, right.end)
+        raise ParseError(f"Unpexpected {token.type} {token.value}", token.lexpos)
 
     left = start()
     while right_binding < binding_power():
@@ -96,6 +109,7 @@ def do_lvalue(ctx: ParseContext) -> LValue:
     elif ctx.tok.type == "ID":
         result = Var(ctx.symbols.create_local(*ctx.tok.value))
     else:
-        raise ParseError(f"Unexpected {ctx.tok.type} {ctx.tok.value}")
+        raise ParseError(f"Unexpected {ctx.tok.type} {ctx.tok.value}", ctx.tok.lexpos)
+    result.at(ctx.tok.lexpos, ctx.tok.endpos)
     next(ctx)
     return result
@@ -0,0 +1,178 @@
+"""
+Result types of expressions.
+"""
+
+from qbparse.ast import BinOp, Constant, Expr, ProcDefinition, UniOp, Var
+from qbparse.datatypes import BUILTIN_TYPES, FixedWidthType, Type
+from qbparse.errors import ParseError
+from qbparse.runtime import base_type, is_integer, is_string
+
+# Widths in bits of the integer types. Floats taken as integers, by the integer
+# division and logical operators, are rounded to LONG.
+INTEGER_BITS = {
+    "_bit": 1,
+    "_byte": 8,
+    "integer": 16,
+    "long": 32,
+    "_integer64": 64,
+}
+FLOATS = ["single", "double", "_float"]
+
+COMPARISONS = {"=", "<>", "<", ">", "<=", ">="}
+# Operators that round their operands to integers
+INTEGER_OPS = {"imp", "eqv", "xor", "or", "and", "\\", "mod"}
+
+
+def integer_bits(typ: Type) -> int:
+    if isinstance(typ, FixedWidthType):
+        return typ.width
+    return INTEGER_BITS[typ.name.removeprefix("_unsigned ")]
+
+
+def is_unsigned(typ: Type) -> bool:
+    return base_type(typ).name.startswith("_unsigned")
+
+
+def as_integer(typ: Type) -> Type:
+    return typ if is_integer(typ) else BUILTIN_TYPES["long"]
+
+
+def wider_integer(a: Type, b: Type) -> Type:
+    """
+    The wider of two integer types. Of a signed and an unsigned type of the same
+    width, the unsigned one wins, as in C.
+    """
+    a_bits, b_bits = integer_bits(a), integer_bits(b)
+    if a_bits != b_bits:
+        return a if a_bits > b_bits else b
+    return b if is_unsigned(b) and not is_unsigned(a) else a
+
+
+def wider_float(a: Type, b: Type) -> Type:
+    a, b = base_type(a), base_type(b)
+    return a if FLOATS.index(a.name) >= FLOATS.index(b.name) else b
+
+
+def as_float(typ: Type) -> Type:
+    """
+    The float type that holds values of typ: SINGLE for integers of up to 16
+    bits, DOUBLE for wider ones.
+    """
+    if not is_integer(typ):
+        return base_type(typ)
+    return BUILTIN_TYPES["single" if integer_bits(typ) <= 16 else "double"]
+
+
+def float_result(a: Type, b: Type) -> Type:
+    """
+    Float result type of an operation on two numbers. As in QBasic, a float
+    operand ranks above any integer, so LONG + SINGLE is SINGLE; two integers
+    give the wider of the floats that hold them.
+    """
+    if is_integer(a) and is_integer(b):
+        return wider_float(as_float(a), as_float(b))
+    if is_integer(a) or is_integer(b):
+        return base_type(b if is_integer(a) else a)
+    return wider_float(a, b)
+
+
+def promote(a: Type, b: Type) -> Type:
+    """
+    Result type of arithmetic on two numbers: the wider of two integer types,
+    otherwise the float result type.
+    """
+    if is_integer(a) and is_integer(b):
+        return wider_integer(a, b)
+    return float_result(a, b)
+
+
+class ExprTypes:
+    """
+    The type of each expression node, inferred on first query and remembered
+    after. Nodes are looked up by identity and kept alive by the map.
+    """
+
+    def __init__(self):
+        self.types: dict[int, Type] = {}
+        self.nodes: list[Expr] = []
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, expr: Expr) -> Type:
+        typ = self.types.get(id(expr))
+        if typ is None:
+            self.infer(expr)
+            typ = self.types[id(expr)]
+        return typ
+
+    def infer(self, expr: Expr):
+        """
+        Type expr and every node below it without one yet. Works bottom up with
+        an explicit stack, so the depth of the tree does not matter.
+        """
+        stack: list[tuple[Expr, bool]] = [(expr, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if id(node) in self.types:
+                continue
+            if children_done:
+                self.types[id(node)] = self.combine(node)
+                self.nodes.append(node)
+                continue
+            stack.append((node, True))
+            for child in node.children():
+                if id(child) not in self.types and isinstance(child, Expr):
+                    stack.append((child, False))
+
+    def combine(self, node: Expr) -> Type:
+        """
+        Type of node, given the types of its children.
+        """
+        match node:
+            case Constant():
+                return node.type
+            case Var():
+                return node.target.type
+            case UniOp(name="not"):
+                return as_integer(self.number(node.param))
+            case UniOp():
+                return self.number(node.param)
+            case BinOp():
+                return self.binary(node)
+            case _:
+                raise ParseError(f"Cannot type {type(node).__name__}", node.start)
+
+    def number(self, expr: Expr) -> Type:
+        typ = self.types[id(expr)]
+        if is_string(typ):
+            raise ParseError("Type mismatch", expr.start)
+        return typ
+
+    def binary(self, node: BinOp) -> Type:
+        left, right = self.types[id(node.left)], self.types[id(node.right)]
+        if is_string(left) or is_string(right):
+            if not (is_string(left) and is_string(right)):
+                raise ParseError("Type mismatch", node.start)
+            if node.name == "+":
+                return BUILTIN_TYPES["string"]
+            if node.name in COMPARISONS:
+                return BUILTIN_TYPES["integer"]
+            raise ParseError("Type mismatch", node.start)
+        if node.name in COMPARISONS:
+            return BUILTIN_TYPES["integer"]
+        if node.name in INTEGER_OPS:
+            return wider_integer(as_integer(left), as_integer(right))
+        if node.name in ("/", "^"):
+            return float_result(left, right)
+        return promote(left, right)
+
+
+def expression_types(impl: ProcDefinition) -> ExprTypes:
+    """
+    Types of the expressions in a procedure body. The map is cached on impl
+    until impl.invalidate() is called, and fills in as expressions are queried.
+    """
+    if impl.types is None:
+        impl.types = ExprTypes()
+    return impl.types
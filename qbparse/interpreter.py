@@ -0,0 +1,286 @@
+"""
+Executes the main block of a parsed program.
+
+Each node is compiled once into a Python closure, so running a statement is a
+chain of calls with no dispatch on node type. Variables live in a list, the
+frame, and are found by an index fixed at compile time.
+"""
+
+import argparse
+import sys
+from collections.abc import Callable
+from operator import itemgetter
+from pathlib import Path
+from typing import TextIO
+
+from qbparse import Program, parse_file
+from qbparse.ast import (
+    Assignment,
+    BinOp,
+    Constant,
+    Expr,
+    Goto,
+    If,
+    Label,
+    Print,
+    Statement,
+    UniOp,
+    Var,
+)
+from qbparse.profiler import Profile, StatementStats
+from qbparse.runtime import (
+    BINARY_OPS,
+    UNARY_OPS,
+    Output,
+    QBError,
+    Value,
+    constant_value,
+    converter,
+    format_value,
+    initial_value,
+    is_double,
+    truth,
+)
+from qbparse.symbols import Variable
+
+type Frame = list[Value]
+type Eval = Callable[[Frame], Value]
+type Exec = Callable[[Frame], None]
+
+
+class Jump(Exception):
+    """
+    Raised by a GOTO, and caught by the block that holds its label.
+    """
+
+    def __init__(self, label: Label):
+        self.label = label
+
+
+class Compiler:
+    def __init__(self, output: Output, profile: Profile | None = None):
+        self.output = output
+        self.profile = profile
+        # Statement being compiled, when profiling
+        self.parent: StatementStats | None = None
+        # Frame index of each variable, by identity
+        self.slots: dict[int, int] = {}
+        # Frame contents before the program runs
+        self.initial: Frame = []
+
+    def slot(self, var: Variable) -> int:
+        index = self.slots.get(id(var))
+        if index is None:
+            index = self.slots[id(var)] = len(self.initial)
+            self.initial.append(initial_value(var.type))
+        return index
+
+    def expr(self, expr: Expr) -> Eval:
+        match expr:
+            case Constant():
+                value = constant_value(expr.value, expr.type)
+                return lambda frame: value
+            case Var():
+                return itemgetter(self.slot(expr.target))
+            case BinOp():
+                binary = BINARY_OPS[expr.name]
+                left, right = self.expr(expr.left), self.expr(expr.right)
+                return lambda frame: binary(left(frame), right(frame))
+            case UniOp():
+                unary = UNARY_OPS[expr.name]
+                param = self.expr(expr.param)
+                return lambda frame: unary(param(frame))
+            case _:
+                raise QBError(f"Cannot execute {type(expr).__name__}")
+
+    def statement(self, stmt: Statement) -> Exec:
+        if self.profile is None:
+            return self.statement_body(stmt)
+        stats = self.profile.add(stmt, self.parent)
+        outer, self.parent = self.parent, stats
+        try:
+            return self.profile.timed(stats, self.statement_body(stmt))
+        finally:
+            self.parent = outer
+
+    def statement_body(self, stmt: Statement) -> Exec:
+        match stmt:
+            case Assignment():
+                if not isinstance(stmt.lval, Var):
+                    raise QBError(f"Cannot assign to {type(stmt.lval).__name__}")
+                index = self.slot(stmt.lval.target)
+                convert = converter(stmt.lval.target.type)
+                rval = self.expr(stmt.rval)
+
+                def assign(frame: Frame):
+                    frame[index] = convert(rval(frame))
+
+                return assign
+            case Print():
+                return self.print(stmt)
+            case If():
+                return self.branch(stmt)
+            case Goto():
+                if stmt.target is None:
+                    raise QBError(f"Label {stmt.name} not defined")
+                target = stmt.target
+
+                def goto(frame: Frame):
+                    # A new Jump each time, as a raised exception keeps its
+                    # traceback and would grow with every pass of a loop
+                    raise Jump(target)
+
+                return goto
+            case _:
+                raise QBError(f"Cannot execute {type(stmt).__name__}")
+
+    def print(self, stmt: Print) -> Exec:
+        output = self.output
+        actions: list[Exec] = []
+        for param in stmt.params:
+            if param is Print.TAB_SEPARATOR:
+                actions.append(lambda frame: output.next_zone())
+            elif param is Print.FINAL_NEWLINE:
+                actions.append(lambda frame: output.write("\n"))
+            else:
+                value = self.expr(param)
+                double = uses_double(param)
+                actions.append(
+                    lambda frame, value=value, double=double: output.write(
+                        format_value(value(frame), double)
+                    )
+                )
+
+        def print_(frame: Frame):
+            for action in actions:
+                action(frame)
+
+        return print_
+
+    def branch(self, stmt: If) -> Exec:
+        branches = [(self.expr(stmt.guard), self.block(stmt.true_branch))]
+        for guard, body in stmt.elseifs:
+            branches.append((self.expr(guard), self.block(body)))
+        otherwise = self.block(stmt.false_branch)
+
+        def if_(frame: Frame):
+            for guard, body in branches:
+                if truth(guard(frame)):
+                    body(frame)
+                    return
+            otherwise(frame)
+
+        return if_
+
+    def block(self, statements: list[Statement]) -> Exec:
+        compiled: list[Exec] = []
+        # Index in compiled that each label's statement starts at
+        positions: dict[int, int] = {}
+        for stmt in statements:
+            if isinstance(stmt, Label):
+                positions[id(stmt)] = len(compiled)
+            else:
+                compiled.append(self.statement(stmt))
+        if not positions:
+
+            def run(frame: Frame):
+                for stmt in compiled:
+                    stmt(frame)
+
+            return run
+
+        count = len(compiled)
+
+        def run_with_labels(frame: Frame):
+            i = 0
+            while i < count:
+                try:
+                    while i < count:
+                        compiled[i](frame)
+                        i += 1
+                except Jump as jump:
+                    position = positions.get(id(jump.label))
+                    if position is None:
+                        # Belongs to an enclosing block
+                        raise
+                    i = position
+
+        return run_with_labels
+
+
+def uses_double(expr: Expr) -> bool:
+    for node in expr.find_all(Expr, nesting=True):
+        if isinstance(node, Var) and is_double(node.target.type):
+            return True
+        if isinstance(node, Constant) and is_double(node.type):
+            return True
+    return False
+
+
+class Interpreter:
+    """
+    A program compiled for execution. It can be run any number of times, each
+    run starting with freshly initialised variables.
+
+    Given a Profile, every statement is instrumented to record its hit count
+    and time there, accumulating over runs.
+    """
+
+    def __init__(self, program: Program, profile: Profile | None = None):
+        impl = program.globals.procedures["_main"].impl
+        assert impl is not None
+        self.output = Output(sys.stdout)
+        if profile is not None:
+            profile.lines = program.lines
+        compiler = Compiler(self.output, profile)
+        self.body = compiler.block(impl.statements)
+        self.initial = compiler.initial
+
+    def run(self, out: TextIO = sys.stdout):
+        self.output.out = out
+        self.output.column = 0
+        try:
+            self.body(list(self.initial))
+        except Jump:
+            raise QBError("GOTO into a nested block is not supported") from None
+        finally:
+            self.output.flush()
+
+
+def run(program: Program, out: TextIO = sys.stdout):
+    """
+    Execute the main block of a program, writing PRINT output to out. Raises
+    QBError for run-time errors, and for statements that cannot be executed yet.
+    """
+    Interpreter(program).run(out)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m qbparse.interpreter",
+        description="Run a .bas file.",
+    )
+    parser.add_argument("file", type=Path)
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="write a flat statement profile to standard error",
+    )
+    parser.add_argument(
+        "--collapsed",
+        type=Path,
+        help="write a profile in collapsed stack format, for flame graphs",
+    )
+    args = parser.parse_args(argv)
+    profile = Profile() if args.profile or args.collapsed else None
+    Interpreter(parse_file(args.file), profile).run(sys.stdout)
+    if profile is not None:
+        if args.profile:
+            profile.write_flat(sys.stderr)
+        if args.collapsed:
+            with open(args.collapsed, "w") as out:
+                profile.write_collapsed(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
 import re
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Sequence
+from threading import Lock
 
+from ply.lex import Lexer as PlyLexer
 from ply.lex import LexToken, Token, lex
 
-from qbparse.datatypes import BUILTIN_TYPES, Type
-from qbparse.symbols import SymbolStore
+from qbparse.datatypes import BUILTIN_SIGILS, BUILTIN_TYPES, Type
+from qbparse.errors import ParseError
+from qbparse.source import Source, source_hash
+from qbparse.symbols import KEYWORDS, sigil_type
 
 # pyright: reportUnusedFunction=false, reportUnusedVariable=false
 # ruff: noqa: F841
@@ -46,10 +53,188 @@ id_body = rf"""
             """
 
 
-def Lexer(symbols: SymbolStore):
+# Lexers that Lexer() clones, by whether they are binary. PLY builds a lexer by
+# inspecting the rules and compiling their regexes, which is slow, so it is done
+# once; the compiled rules are only read afterwards, and are shared by clones.
+_templates: dict[bool, PlyLexer] = {}
+_templates_lock = Lock()
+
+# Number of tokens, over all sources, kept by tokenize()
+CACHE_TOKENS = 256 * 1024
+
+
+def Lexer(binary: bool = False) -> PlyLexer:
+    """
+    Create a lexer. A binary lexer takes CP437-encoded bytes (or an mmap of them)
+    as input, and only decodes the parts of the source that become token values.
+
+    Tokens do not depend on any symbols: an identifier that is not a keyword is
+    an ID whose value is its name and sigil, and is classified by ParseContext.
+
+    Lexers can be created and used on any thread, but each must only be used by
+    one thread at a time.
+    """
+    template = _templates.get(binary)
+    if template is None:
+        with _templates_lock:
+            template = _templates.get(binary)
+            if template is None:
+                template = _templates[binary] = build_lexer(binary)
+    lexer = template.clone()
+    lexer.lexstatestack = []
+    lexer.begin("linestart")
+    return lexer
+
+
+class Tokens:
+    """
+    All the tokens of a source, each with an endpos to go with its lexpos. As
+    tokens do not depend on symbols, the same Tokens can be parsed any number of
+    times, from any position; they are shared, so must not be modified.
+    """
+
+    def __init__(self, input: Source):
+        lexer = Lexer(binary=not isinstance(input, str))
+        lexer.input(input)
+        tokens: list[LexToken] = []
+        for tok in lexer:
+            tok.endpos = lexer.lexpos
+            tokens.append(tok)
+        self.tokens: Sequence[LexToken] = tokens
+        # Offset and line number of the end of input, for EOF
+        self.length = lexer.lexlen
+        self.lineno = lexer.lineno
+        self.starts: Sequence[int] = [tok.lexpos for tok in tokens]
+        # Tokens refer to the lexer; don't let it keep the input alive
+        lexer.input(input[:0])
+
+    @staticmethod
+    def from_list(
+        tokens: Sequence[LexToken],
+        length: int,
+        lineno: int,
+        starts: Sequence[int] | None = None,
+    ) -> "Tokens":
+        """
+        Tokens from elsewhere. starts, the lexpos of each token, is worked out
+        from tokens if not given.
+        """
+        result = Tokens("")
+        result.tokens = tokens
+        result.length = length
+        result.lineno = lineno
+        result.starts = [tok.lexpos for tok in tokens] if starts is None else starts
+        return result
+
+    def __repr__(self):
+        return f"[Tokens count={len(self.tokens)}]"
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def index(self, lexpos: int) -> int:
+        """
+        Index of the first token that starts at or after lexpos.
+        """
+        return bisect_left(self.starts, lexpos)
+
+
+class TokenCache:
+    """
+    Tokens of recently lexed sources by hash of the source, least recently used
+    first, holding at most limit tokens in total. Sources with more tokens than
+    that are not kept.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.entries: OrderedDict[bytes, Tokens] = OrderedDict()
+        # Total number of tokens in entries
+        self.size = 0
+        self.lock = Lock()
+
+    def __repr__(self):
+        return (
+            f"[TokenCache sources={len(self.entries)} size={self.size} "
+            f"limit={self.limit}]"
+        )
+
+    def get(self, key: bytes) -> Tokens | None:
+        with self.lock:
+            tokens = self.entries.get(key)
+            if tokens is not None:
+                self.entries.move_to_end(key)
+            return tokens
+
+    def put(self, key: bytes, tokens: Tokens) -> Tokens:
+        """
+        Keep tokens, unless another thread kept tokens for the same source
+        first, which are returned instead.
+        """
+        with self.lock:
+            existing = self.entries.get(key)
+            if existing is not None:
+                self.entries.move_to_end(key)
+                return existing
+            if len(tokens) <= self.limit:
+                self.entries[key] = tokens
+                self.size += len(tokens)
+                self.evict()
+            return tokens
+
+    def resize(self, limit: int):
+        with self.lock:
+            self.limit = limit
+            self.evict()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def evict(self):
+        while self.size > self.limit:
+            _, tokens = self.entries.popitem(last=False)
+            self.size -= len(tokens)
+
+
+cache = TokenCache(CACHE_TOKENS)
+
+
+def lex_source(input: Source, jobs: int = 1) -> Tokens:
+    if jobs != 1:
+        from qbparse.chunked import lex_parallel
+
+        return lex_parallel(input, jobs)
+    return Tokens(input)
+
+
+def tokenize(input: Source, cached: bool = False, jobs: int = 1) -> Tokens:
+    """
+    Lex a whole source. With jobs other than 1, it is lexed by
+    chunked.lex_parallel() in up to that many worker processes, or one per CPU
+    if jobs is 0. With cached set, results are kept in cache by hash of the
+    source, so parsing the same text again does not lex it again. Otherwise the
+    cache is neither read nor added to.
+    """
+    if not cached:
+        return lex_source(input, jobs)
+    key = source_hash(input)
+    tokens = cache.get(key)
+    if tokens is None:
+        tokens = cache.put(key, lex_source(input, jobs))
+    return tokens
+
+
+def build_lexer(binary: bool) -> PlyLexer:
+    # Labels and line numbers are only recognised as the first token of a line,
+    # which is lexed in the linestart state. A line continued with _ is not a new
+    # line, and neither is a statement after a :.
+    states = (("linestart", "exclusive"),)
     t_ignore = ws
+    t_linestart_ignore = ws
 
-    def t_error(t: LexToken):
+    def t_ANY_error(t: LexToken):
         t.type = "ERROR"
         t.lexer.skip(len(t.value))
         return t
@@ -57,39 +242,67 @@ def Lexer(symbols: SymbolStore):
     @Token(nl)
     def t_NEWLINE(t: LexToken):
         t.lexer.lineno += 1
+        t.lexer.begin("linestart")
         t.value = "\n"
         return t
 
     @Token(r"'.*(\n|$)")
     def t_COMMENT(t: LexToken):
+        if t.value[-1:] in ("\n", b"\n"):
+            t.lexer.lineno += 1
+        t.lexer.begin("linestart")
         t.type = "NEWLINE"
         t.value = "'"
         return t
 
     @Token(rf"REM({ws}+.*)?(\n|$)")
     def t_REMARK(t: LexToken):
+        if t.value[-1:] in ("\n", b"\n"):
+            t.lexer.lineno += 1
+        t.lexer.begin("linestart")
         t.type = "NEWLINE"
         t.value = "rem"
         return t
 
-    @Token(f"^{ws}*(?P<n>{digit}+){ws}*(?P<l>{id_body}){ws}*:")
-    def t_LINE_NUM_LABEL(t: LexToken):
-        t.value = t.lexer.lexmatch.group("n", "l")
+    @Token(f"(?P<n>{digit}+){ws}*(?P<l>{id_body}){ws}*:")
+    def t_linestart_LINE_NUM_LABEL(t: LexToken):
+        t.lexer.begin("INITIAL")
+        num, label = (decode(g) for g in t.lexer.lexmatch.group("n", "l"))
+        if label.lower() in KEYWORDS:
+            # A line number, then a statement such as `10 else:`
+            t.lexer.lexpos = t.lexer.lexmatch.end("n")
+            t.type = "LINE_NUM"
+            t.value = num
+        else:
+            t.value = (num, label)
         return t
 
-    @Token(f"^{ws}*(?P<a>{digit}+)")
-    def t_LINE_NUM(t: LexToken):
-        t.value = t.lexer.lexmatch.group("a")
+    @Token(f"(?P<line_num>{digit}+)")
+    def t_linestart_LINE_NUM(t: LexToken):
+        t.lexer.begin("INITIAL")
+        t.value = decode(t.lexer.lexmatch.group("line_num"))
         return t
 
-    @Token(f"^{ws}*(?P<a>{id_body}){ws}*:")
-    def t_LINE_LABEL(t: LexToken):
-        t.value = t.lexer.lexmatch.group("a")
+    @Token(f"(?P<label>{id_body}){ws}*:")
+    def t_linestart_LINE_LABEL(t: LexToken):
+        t.lexer.begin("INITIAL")
+        label = decode(t.lexer.lexmatch.group("label"))
+        if label.lower() in KEYWORDS:
+            # Not a label, but a statement such as `else:`; lex it again
+            t.lexer.lexpos = t.lexpos
+            return None
+        t.value = label
         return t
 
+    # Anything else: lex it again as an ordinary token
+    @Token(r"(?=[\s\S])")
+    def t_linestart_other(t: LexToken):
+        t.lexer.begin("INITIAL")
+
     @Token(":")
     def t_LINE_SPLIT(t: LexToken):
         t.type = "NEWLINE"
+        t.value = ":"
         return t
 
     @Token(f"_{ws}*{nl}")
@@ -99,32 +312,37 @@ def Lexer(symbols: SymbolStore):
 
     @Token('"(?P<s>[^"\r\n]*)"')
     def t_STRING_LIT(t: LexToken):
-        t.value = t.lexer.lexmatch.group("s")
+        t.value = decode(t.lexer.lexmatch.group("s"), "cp437")
         return t
 
     @Token(
         rf"""(?P<man>\.{digit}+        # Decimal leading, or
                 | {digit}+             # integer leading
-                    \.?{digit}*)       # with optional decimal part.
+                    (?:\.{digit}*)?)   # with optional decimal part.
                 (?P<flag>D|E|F|d|e|f)  # Mandatory exponent flag.
                 (?P<sign>\+|-)?        # Optional exponent sign.
                 (?P<exp>{digit}*)      # Optional exponent
         """
     )
     def t_EXP_LIT(t: LexToken):
-        match = t.lexer.lexmatch
-        mantissa = match.group("man")
-        exp_sign = match.group("sign") or "+"
-        exp = match.group("exp") or "0"
-        if match.group("flag") in ["e", "E"]:
-            type = symbols.lookup_sigil("!")
-        elif match.group("flag") in ["d", "D"]:
-            type = symbols.lookup_sigil("#")
+        man, flag, sign, exp = t.lexer.lexmatch.group("man", "flag", "sign", "exp")
+        mantissa = decode(man)
+        exp_sign = decode(sign) if sign else "+"
+        exp = decode(exp) or "0"
+        flag = decode(flag)
+        if flag in ["e", "E"]:
+            type = BUILTIN_SIGILS["!"]
+        elif flag in ["d", "D"]:
+            type = BUILTIN_SIGILS["#"]
         else:
-            t.value = (
-                build_float_literal(mantissa, exp_sign, exp),
-                symbols.lookup_sigil("##"),
-            )
+            try:
+                t.value = (
+                    build_float_literal(mantissa, exp_sign, exp),
+                    BUILTIN_SIGILS["##"],
+                )
+            except ValueError:
+                t.type = "ERROR"
+                t.value = "Literal too long"
             return t
         value = float(f"{mantissa}e{exp_sign}{exp}")
         if type.min <= value <= type.max:
@@ -135,14 +353,14 @@ def Lexer(symbols: SymbolStore):
         return t
 
     @Token(
-        rf"""(?P<num>&H[0-9A-Fa-f]+
+        rf"""(?P<base_num>&H[0-9A-Fa-f]+
                     |&O[0-7]+
                     |&B[01]+)
-              (?P<sigil>~?(`{digit}*|%%|&&|%&|%|&))?
+              (?P<base_sigil>~?(`{digit}*|%%|&&|%&|%|&))?
         """
     )
     def t_BASE_LIT(t: LexToken):
-        num_part = t.lexer.lexmatch.group("num")
+        num_part = decode(t.lexer.lexmatch.group("base_num"))
         match num_part[1].upper():
             case "H":
                 base = 16
@@ -153,15 +371,19 @@ def Lexer(symbols: SymbolStore):
             case _:
                 base = 10
         value = int(num_part[2:], base)
-        sigil = t.lexer.lexmatch.group("sigil")
+        sigil = t.lexer.lexmatch.group("base_sigil")
+        sigil = sigil and decode(sigil)
         try:
             if sigil is None:
                 t.value = detect_base_int_type(value)
             else:
-                t.value = constrain_base_int_value(value, symbols.lookup_sigil(sigil))
+                t.value = constrain_base_int_value(value, sigil_type(sigil))
         except ValueError:
             t.type = "ERROR"
             t.value = "Literal outside range of requested type"
+        except ParseError:
+            t.type = "ERROR"
+            t.value = f"Unknown type {sigil}"
         return t
 
     @Token(rf"\.{digit}+|{digit}+\.{digit}*")
@@ -171,7 +393,12 @@ def Lexer(symbols: SymbolStore):
 
     @Token(f"{digit}+")
     def t_INT_LIT(t: LexToken):
-        t.value = int(t.value)
+        try:
+            t.value = int(t.value)
+        except ValueError:
+            # Python refuses to convert very long digit strings
+            t.type = "ERROR"
+            t.value = "Literal too long"
         return t
 
     @Token(
@@ -186,9 +413,10 @@ def Lexer(symbols: SymbolStore):
         """
     )
     def t_ID(t: LexToken):
-        name = t.lexer.lexmatch.group("name").lower()
+        name = decode(t.lexer.lexmatch.group("name")).lower()
         sigil = t.lexer.lexmatch.group("sigil")
-        if symbols.is_keyword(name):
+        sigil = sigil and decode(sigil)
+        if name in KEYWORDS:
             # Keywords with a $ are no longer keywords, hence `if$ = ""` and
             # `if$3 = ""` are acceptable but `if% = 3` is not.
             if sigil is None:
@@ -197,25 +425,9 @@ def Lexer(symbols: SymbolStore):
                 return t
             elif not sigil.startswith("$"):
                 t.type = "ERROR"
-                t.lexer.skip(len(t.value))
+                t.value = decode(t.value)
                 return t
-            # case of sigil "$" falls through below
-        if proc := symbols.find_procedure(name):
-            if sigil is not None:
-                # The sigil must match the existing procedure, if present
-                typ = symbols.lookup_sigil(sigil)
-                if proc.signature and typ != proc.signature.ret:
-                    t.type = "ERROR"
-                    return t
-            t.type = "PROCEDURE"
-            t.value = proc
-            return t
-        elif var := symbols.find_variable(name, sigil):
-            t.type = "VARIABLE"
-            t.value = var
-            return t
-        # otherwise remain as ID
-        t.value = (name, symbols.lookup_sigil(sigil))
+        t.value = (name, sigil)
         return t
 
     @Token(r"""<= | >= | <>
@@ -228,9 +440,46 @@ def Lexer(symbols: SymbolStore):
                         | \. | [#]
     """)
     def t_PUNCTUATION(t: LexToken):
+        t.value = decode(t.value)
+        return t
+
+    # Must be the last rule. Reporting bad characters in small runs lets the parser
+    # recover after them, and avoids PLY's t_error() which copies the rest of the
+    # input for every error. Underscores are taken as a run so that t_ID does not
+    # rescan them from every position.
+    @Token("_+|.")
+    def t_ERROR(t: LexToken):
+        t.value = decode(t.value, "cp437")
         return t
 
-    return lex(reflags=re.VERBOSE | re.IGNORECASE)
+    lexer = lex(reflags=re.VERBOSE | re.IGNORECASE)
+    if binary:
+        encode_rules(lexer)
+    return lexer
+
+
+def encode_rules(lexer: PlyLexer):
+    """
+    Switch a lexer over to matching bytes. The rules are pure ASCII, so each master
+    regex can be recompiled as a bytes pattern with the same meaning.
+    """
+    for state, master in lexer.lexstatere.items():
+        lexer.lexstatere[state] = [
+            (re.compile(regex.pattern.encode("ascii"), regex.flags & ~re.UNICODE), f)
+            for regex, f in master
+        ]
+    for state, ignore in lexer.lexstateignore.items():
+        lexer.lexstateignore[state] = ignore.encode("ascii")
+    lexer.lexliterals = b""
+    lexer.begin(lexer.current_state())
+
+
+def decode(text: str | bytes, encoding: str = "ascii") -> str:
+    """
+    Token text from a binary lexer is bytes. QB64 sources are CP437, but only
+    string literals can hold anything outside ASCII, and the ASCII codec is faster.
+    """
+    return text.decode(encoding) if isinstance(text, bytes) else text
 
 
 def build_float_literal(mantissa: str, exp_sign: str, exp: str) -> tuple[int, int]:
@@ -0,0 +1,215 @@
+"""
+Newline-delimited JSON output of the AST, for tools not written in Python.
+
+Each statement becomes one JSON object on its own line, with its expressions
+and nested statements inline. Nodes are objects with a "kind" (the AST class
+name), "start" and "end" source offsets, and the fields of that kind. Types
+are given by name. Constants too large for a double, which JSON has no number
+for, have the value "Infinity".
+
+Run as a module to convert a directory tree of .bas files:
+
+    python -m qbparse.ndjson DIR [-o OUTPUT] [-j JOBS]
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from io import StringIO
+from pathlib import Path
+from typing import Any, TextIO
+
+from qbparse import Program, parse_file
+from qbparse.ast import (
+    Assignment,
+    BinOp,
+    Constant,
+    Goto,
+    If,
+    Label,
+    Node,
+    Print,
+    Statement,
+    UniOp,
+    Var,
+)
+from qbparse.errors import ParseError
+
+ENCODER = json.JSONEncoder(separators=(",", ":"), allow_nan=False)
+
+
+def to_json(node: Node) -> dict[str, Any]:
+    convert = CONVERTERS.get(type(node))
+    if convert is None:
+        raise ValueError(f"Cannot convert node {type(node).__name__}")
+    result: dict[str, Any] = {
+        "kind": type(node).__name__,
+        "start": node.start,
+        "end": node.end,
+    }
+    result.update(convert(node))
+    return result
+
+
+def to_json_list(nodes: Iterable[Node]) -> list[dict[str, Any]]:
+    return [to_json(node) for node in nodes]
+
+
+def constant_value(value: Any) -> Any:
+    # Named as in JavaScript
+    if not isinstance(value, float) or math.isfinite(value):
+        return value
+    if math.isnan(value):
+        return "NaN"
+    return "Infinity" if value > 0 else "-Infinity"
+
+
+CONVERTERS: dict[type, Callable[[Any], dict[str, Any]]] = {
+    Assignment: lambda n: {"lval": to_json(n.lval), "rval": to_json(n.rval)},
+    Print: lambda n: {"params": to_json_list(n.params)},
+    If: lambda n: {
+        "guard": to_json(n.guard),
+        "then": to_json_list(n.true_branch),
+        "elseifs": [
+            {"guard": to_json(guard), "body": to_json_list(body)}
+            for guard, body in n.elseifs
+        ],
+        "else": to_json_list(n.false_branch),
+    },
+    Var: lambda n: {"name": n.target.name, "type": n.target.type.name},
+    BinOp: lambda n: {
+        "op": n.name,
+        "left": to_json(n.left),
+        "right": to_json(n.right),
+    },
+    UniOp: lambda n: {"op": n.name, "param": to_json(n.param)},
+    Constant: lambda n: {"value": constant_value(n.value), "type": n.type.name},
+    Label: lambda n: {"names": n.names},
+    Goto: lambda n: {"target": n.name},
+}
+
+
+def write_statements(
+    statements: Iterable[Statement], out: TextIO, **fields: Any
+) -> None:
+    """
+    Write one line per statement. Extra fields are added to each object.
+    """
+    for stmt in statements:
+        out.write(ENCODER.encode({**fields, **to_json(stmt)}))
+        out.write("\n")
+
+
+def write_program(program: Program, out: TextIO, **fields: Any) -> None:
+    """
+    Write every statement of a program, procedure by procedure, each tagged
+    with the "procedure" it belongs to. Collected errors follow as objects of
+    kind "error".
+    """
+    for proc in program.globals.procedures.values():
+        if proc.impl is not None:
+            write_statements(proc.impl.statements, out, **fields, procedure=proc.name)
+    write_errors(program.errors, out, **fields)
+
+
+def write_errors(errors: Iterable[ParseError], out: TextIO, **fields: Any) -> None:
+    for error in errors:
+        record = {
+            **fields,
+            "kind": "error",
+            "message": str(error),
+            "start": error.lexpos,
+            "line": error.line,
+            "column": error.column,
+        }
+        out.write(ENCODER.encode(record))
+        out.write("\n")
+
+
+def convert_file(path: Path, root: Path, out: TextIO) -> None:
+    """
+    Write a file's statements and errors, each tagged with its "file". The file
+    is parsed whole, then written procedure by procedure. A file that cannot be
+    read or parsed at all, such as one nested too deeply, gives one "error"
+    object with no position.
+    """
+    name = path.relative_to(root).as_posix()
+    try:
+        write_program(parse_file(path, recover=True), out, file=name)
+    except Exception as error:
+        # One bad file should not stop the rest of a directory
+        record = {
+            "file": name,
+            "kind": "error",
+            "message": f"{type(error).__name__}: {error}",
+            "start": None,
+            "line": None,
+            "column": None,
+        }
+        out.write(ENCODER.encode(record))
+        out.write("\n")
+
+
+def convert_file_text(path: Path, root: Path) -> str:
+    # Output is sent back from worker processes as one string, so a worker
+    # holds one file's output at a time
+    out = StringIO()
+    convert_file(path, root, out)
+    return out.getvalue()
+
+
+def job_count(text: str) -> int:
+    jobs = int(text)
+    if jobs < 0:
+        raise argparse.ArgumentTypeError("must be 0 or more")
+    return jobs or os.cpu_count() or 1
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m qbparse.ndjson",
+        description="Convert a directory of .bas files to NDJSON.",
+    )
+    parser.add_argument("directory", type=Path)
+    parser.add_argument(
+        "-o", "--output", type=Path, help="output file (default: standard output)"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=job_count,
+        default=0,
+        help="worker processes, or 0 for one per CPU (the default)",
+    )
+    args = parser.parse_args(argv)
+    root: Path = args.directory
+    paths = sorted(p for p in root.rglob("*") if p.suffix.lower() == ".bas")
+    with open(args.output, "w") if args.output else nullcontext(sys.stdout) as out:
+        convert_files(paths, root, out, args.jobs)
+
+
+def convert_files(paths: list[Path], root: Path, out: TextIO, jobs: int):
+    """
+    Convert files in parallel, writing each file's output in the order given.
+    With one job, output is written as it is made; otherwise each file's output
+    is buffered in its worker.
+    """
+    if jobs == 1:
+        for path in paths:
+            convert_file(path, root, out)
+        return
+    with ProcessPoolExecutor(jobs) as pool:
+        # Batch small files to cut down on inter-process traffic
+        chunksize = max(1, len(paths) // (4 * jobs))
+        roots = [root] * len(paths)
+        for text in pool.map(convert_file_text, paths, roots, chunksize=chunksize):
+            out.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,23 @@
-from collections.abc import Callable
+from collections.abc import Callable, Generator
 
-from qbparse.ast import Assignment, Expr, If, Print, Statement
+from ply.lex import LexToken
+
+from qbparse.ast import (
+    Assignment,
+    Expr,
+    Goto,
+    If,
+    Label,
+    Print,
+    ProcDefinition,
+    Statement,
+    Var,
+)
 from qbparse.context import ParseContext
+from qbparse.datatypes import BUILTIN_TYPES, Type, TypeSignature
 from qbparse.errors import ParseError
 from qbparse.expression import do_expr, do_lvalue
+from qbparse.symbols import Procedure, SymbolStore
 
 
 def do_print(ctx: ParseContext):
@@ -41,6 +55,11 @@ def do_if(ctx: ParseContext):
     def single_line_block(then_section: bool) -> list[Statement]:
         stmts: list[Statement] = []
         ctx.skip("NEWLINE", ":")
+        if ctx.at_a("INT_LIT"):
+            # THEN 10 and ELSE 10 are short for GOTO 10
+            goto = Goto(label_name(ctx)).at(ctx.tok.lexpos, ctx.tok.endpos)
+            stmts.append(resolve_goto(ctx, goto))
+            next(ctx)
         while not (
             ctx.at_a("NEWLINE", "\n")
             or ctx.at_a("EOF")
@@ -86,14 +105,104 @@ def do_if(ctx: ParseContext):
     return If(guard, thens, elseifs, elses)
 
 
+def do_goto(ctx: ParseContext):
+    """
+    Expects: GOTO
+    Results: token after label
+    Format: GOTO label|line number
+    """
+    next(ctx)
+    result = Goto(label_name(ctx))
+    next(ctx)
+    return resolve_goto(ctx, result)
+
+
+def label_name(ctx: ParseContext) -> str:
+    match ctx.tok.type, ctx.tok.value:
+        case "INT_LIT", number:
+            return str(number)
+        case "ID", (name, _):
+            return name
+        case (("VARIABLE" | "PROCEDURE"), symbol):
+            # Labels have their own namespace
+            return symbol.name
+        case _:
+            raise ParseError("Expected label or line number", ctx.tok.lexpos)
+
+
+def resolve_goto(ctx: ParseContext, goto: Goto) -> Goto:
+    goto.target = ctx.labels.get(goto.name)
+    if goto.target is None:
+        # Patched by do_label()
+        ctx.unresolved.setdefault(goto.name, []).append(goto)
+    return goto
+
+
+def do_label(ctx: ParseContext):
+    """
+    Expects: LINE_NUM, LINE_LABEL or LINE_NUM_LABEL
+    Results: token after label
+    """
+    match ctx.tok.type, ctx.tok.value:
+        case "LINE_NUM_LABEL", (number, name):
+            names = [str(int(number)), name.lower()]
+        case "LINE_NUM", number:
+            names = [str(int(number))]
+        case _, name:
+            names = [name.lower()]
+    result = Label(names)
+    for name in names:
+        if name in ctx.labels:
+            raise ParseError(f"Duplicate label {name}", ctx.tok.lexpos)
+    for name in names:
+        ctx.labels[name] = result
+        for goto in ctx.unresolved.pop(name, ()):
+            goto.target = result
+    next(ctx)
+    return result
+
+
+def check_labels(ctx: ParseContext):
+    """
+    Report GOTOs to labels that never appeared. Called at the end of a body.
+    """
+    for gotos in ctx.unresolved.values():
+        for goto in gotos:
+            ctx.report(ParseError(f"Label {goto.name} not defined", goto.start))
+    ctx.unresolved.clear()
+
+
 KEYWORD_PARSERS: dict[str, Callable[[ParseContext], Statement]] = {
     "print": do_print,
     "?": do_print,
     "if": do_if,
+    "goto": do_goto,
+}
+
+
+# Keywords that end the block they appear in; see do_block()
+END_OF_BLOCK_KEYWORDS = {
+    "else",
+    "elseif",
+    "endif",
+    "loop",
+    "next",
+    "wend",
+    "case",
+    "sub",
+    "function",
 }
 
 
 def do_block(ctx: ParseContext) -> list[Statement]:
+    """
+    Expects: start of statement
+    Results: End of block marker
+    """
+    return list(iter_block(ctx))
+
+
+def iter_block(ctx: ParseContext) -> Generator[Statement]:
     """
     Expects: start of statement
     Results: End of block marker
@@ -108,17 +217,7 @@ def do_block(ctx: ParseContext) -> list[Statement]:
         match ctx.tok.type, ctx.tok.value:
             case "EOF", _:
                 return True
-            case "KEYWORD", (
-                "else"
-                | "elseif"
-                | "endif"
-                | "loop"
-                | "next"
-                | "wend"
-                | "case"
-                | "sub"
-                | "function"
-            ):
+            case "KEYWORD", keyword if keyword in END_OF_BLOCK_KEYWORDS:
                 return True
             case "KEYWORD", "end":
                 end = ctx.tok
@@ -131,24 +230,218 @@ def do_block(ctx: ParseContext) -> list[Statement]:
             case _:
                 return False
 
-    block: list[Statement] = []
     ctx.skip("NEWLINE")
     while not is_eob():
-        stmt = do_stmt(ctx)
+        start = ctx.tok
+        try:
+            stmt = do_stmt(ctx)
+        except ParseError as error:
+            ctx.report(error)
+            synchronize(ctx, start)
+            stmt = None
         if stmt:
-            block.append(stmt)
+            yield stmt
         ctx.skip("NEWLINE")
-    return block
+
+
+def iter_program(ctx: ParseContext) -> Generator[Statement]:
+    """
+    Expects: start of input
+    Results: EOF
+    Note: Yields the statements of the main block. SUB and FUNCTION definitions
+          are added to the symbol store and parsing of the main block continues
+          after them. In recovery mode, stray end of block markers are reported
+          and skipped.
+    """
+    yield from iter_block(ctx)
+    while not ctx.at_a("EOF"):
+        start = ctx.tok
+        try:
+            if ctx.at_a("KEYWORD", "sub") or ctx.at_a("KEYWORD", "function"):
+                do_procedure(ctx)
+            else:
+                # A block terminator with no block to close
+                raise ParseError(f"Unexpected {start.type} {start.value}", start.lexpos)
+        except ParseError as error:
+            ctx.report(error)
+            synchronize(ctx, start)
+        yield from iter_block(ctx)
+    check_labels(ctx)
+
+
+def iter_body(ctx: ParseContext, end: int) -> Generator[Statement]:
+    """
+    Expects: start of a SUB or FUNCTION body
+    Results: SUB or FUNCTION of the END statement at offset end
+    Note: As iter_program(), end of block markers before the END are stray.
+    """
+    yield from iter_block(ctx)
+    while ctx.tok.lexpos < end:
+        start = ctx.tok
+        ctx.report(ParseError(f"Unexpected {start.type} {start.value}", start.lexpos))
+        synchronize(ctx, start)
+        yield from iter_block(ctx)
+    check_labels(ctx)
+
+
+def do_procedure(ctx: ParseContext):
+    """
+    Expects: SUB or FUNCTION
+    Results: token after END SUB or END FUNCTION
+    Format: SUB|FUNCTION name [( [param {, param}] )] NEWLINE body END SUB|FUNCTION
+    Note: The body is only skimmed to find its end; it is parsed again in a
+          local scope, from the same tokens if the input was lexed up front.
+          In lazy mode that is deferred until the first access to
+          Procedure.impl.
+    """
+    start = ctx.tok.lexpos
+    kind = ctx.tok.value
+    next(ctx)
+    try:
+        name, ret, params = do_procedure_header(ctx, kind)
+    except ParseError:
+        # Skip the body too, so that it is not taken for main block statements
+        if skim_body(ctx) is not None:
+            next(ctx)
+        raise
+    proc = Procedure(name, TypeSignature(ret, [typ for _, typ, _ in params]))
+    ctx.symbols.add_procedure(proc)
+    body_start, body_lineno = ctx.end, ctx.tok.lineno
+
+    end_tok = skim_body(ctx)
+    if end_tok is None:
+        raise ParseError(f"Missing END {kind.upper()}", start)
+    body_end = end_tok.lexpos
+    ctx.consume("KEYWORD", kind)
+    end = ctx.end
+
+    def load() -> ProcDefinition:
+        symbols = SymbolStore(parent=ctx.symbols)
+        impl = ProcDefinition(
+            symbols,
+            [
+                symbols.declare(name, typ)
+                if as_type
+                else symbols.create_local(name, typ)
+                for name, typ, as_type in params
+            ],
+        ).at(start, end)
+        body = ctx.spawn(symbols, body_start, body_lineno)
+        if kind == "function":
+            body.result = symbols.create_local(name, ret)
+        impl.statements = list(iter_body(body, body_end))
+        impl.labels = body.labels
+        return impl
+
+    if ctx.lazy:
+        proc.loader = load
+    else:
+        proc.impl = load()
+
+
+def do_procedure_header(
+    ctx: ParseContext, kind: str
+) -> tuple[str, Type, list[tuple[str, Type, bool]]]:
+    """
+    Expects: SUB or FUNCTION name
+    Results: newline at end of header
+    Format: name [( [param {, param}] )]
+    """
+    if ctx.at_a("PROCEDURE"):
+        raise ParseError("Duplicate definition", ctx.tok.lexpos)
+    if not ctx.at_a("ID"):
+        raise ParseError(f"Expected {kind} name", ctx.tok.lexpos)
+    name, ret = ctx.tok.value
+    if kind == "sub":
+        ret = BUILTIN_TYPES["_none"]
+    next(ctx)
+    params: list[tuple[str, Type, bool]] = []
+    if ctx.at_a("PUNCTUATION", "("):
+        next(ctx)
+        while not ctx.at_a("PUNCTUATION", ")"):
+            if params:
+                ctx.consume("PUNCTUATION", ",")
+            params.append(do_param(ctx))
+        next(ctx)
+    if not ctx.at_a("NEWLINE"):
+        raise ParseError("Expected end of line", ctx.tok.lexpos)
+    return name, ret, params
+
+
+def skim_body(ctx: ParseContext) -> LexToken | None:
+    """
+    Expects: token in a SUB or FUNCTION header or body
+    Results: SUB or FUNCTION of the next END SUB or END FUNCTION, or EOF
+    Note: Returns the END token, or None if EOF was reached first.
+    """
+    while not ctx.at_a("EOF"):
+        if ctx.at_a("KEYWORD", "end"):
+            end_tok = ctx.tok
+            next(ctx)
+            # END IF and the like are part of the body
+            if ctx.at_a("KEYWORD", "sub") or ctx.at_a("KEYWORD", "function"):
+                return end_tok
+        else:
+            next(ctx)
+    return None
+
+
+def do_param(ctx: ParseContext) -> tuple[str, Type, bool]:
+    """
+    Expects: parameter name
+    Results: token after parameter
+    Format: name[sigil] [AS type]
+    Note: The result says whether the type was given with AS.
+    """
+    match ctx.tok.type, ctx.tok.value:
+        case "ID", (name, typ):
+            pass
+        case "VARIABLE", var:
+            # Shadows a global of the same name
+            name, typ = var.name, var.type
+        case _:
+            raise ParseError("Expected parameter name", ctx.tok.lexpos)
+    next(ctx)
+    as_type = ctx.at_a("KEYWORD", "as")
+    if as_type:
+        next(ctx)
+        words: list[str] = []
+        while ctx.at_a("ID"):
+            words.append(ctx.tok.value[0])
+            next(ctx)
+        type_name = " ".join(words)
+        typ = BUILTIN_TYPES.get(type_name) or ctx.symbols.types.get(type_name)
+        if typ is None:
+            raise ParseError("Unknown type", ctx.tok.lexpos)
+    return name, typ, as_type
+
+
+def synchronize(ctx: ParseContext, start: LexToken):
+    """
+    Expects: token at or after the start of a failed statement
+    Results: next newline, block keyword or EOF
+    Note: at least one token is always skipped so that recovery makes progress.
+    """
+    if ctx.tok is start:
+        next(ctx)
+    while not (
+        ctx.at_a("NEWLINE")
+        or ctx.at_a("EOF")
+        or ctx.at_a("KEYWORD", "end")
+        or (ctx.at_a("KEYWORD") and ctx.tok.value in END_OF_BLOCK_KEYWORDS)
+    ):
+        next(ctx)
 
 
 def do_stmt(ctx: ParseContext) -> Statement | None:
     result = None
     ctx.skip("NEWLINE")
+    start = ctx.tok.lexpos
     match ctx.tok.type:
         case "KEYWORD":
             handler = KEYWORD_PARSERS.get(ctx.tok.value)
             if handler is None:
-                raise ParseError("Unexpected keyword " + ctx.tok.value)
+                raise ParseError("Unexpected keyword " + ctx.tok.value, ctx.tok.lexpos)
             result = handler(ctx)
         case "VARIABLE":
             # Asignment to existing variable
@@ -160,8 +453,14 @@ def do_stmt(ctx: ParseContext) -> Statement | None:
             # May be assignment to new variable, or call
             # to not-yet-defined procedure
             result = do_unknown_var_or_procedure(ctx)
+        case "LINE_NUM" | "LINE_LABEL" | "LINE_NUM_LABEL":
+            result = do_label(ctx)
         case _:
-            raise ParseError(f"Unexpected {ctx.tok.type} {ctx.tok.value}")
+            raise ParseError(
+                f"Unexpected {ctx.tok.type} {ctx.tok.value}", ctx.tok.lexpos
+            )
+    if result:
+        result.at(start, ctx.end)
     return result
 
 
@@ -175,9 +474,9 @@ def do_unknown_var_or_procedure(ctx: ParseContext) -> Statement:
     elif ctx.at_a("PUNCTUATION", "("):
         # This could be either an implicit array declaration or a
         # call to an unknown subprocedure.
-        raise ParseError("Unimplemented implicit array")
+        raise ParseError("Unimplemented implicit array", tok.lexpos)
     else:
-        raise ParseError("Unimplemented procedure call")
+        raise ParseError("Unimplemented procedure call", tok.lexpos)
 
 
 def do_assignment(ctx: ParseContext):
@@ -192,4 +491,18 @@ def do_assignment(ctx: ParseContext):
 
 
 def do_procedure_call(ctx: ParseContext):
-    pass
+    """
+    Expects: PROCEDURE
+    Results: token after the statement
+    Note: Only assignment to the return value of the FUNCTION being defined is
+          handled so far.
+    """
+    tok = ctx.tok
+    proc = tok.value
+    next(ctx)
+    result = ctx.result
+    if result is not None and result.name == proc.name and ctx.at_a("PUNCTUATION", "="):
+        lval = Var(result).at(tok.lexpos, tok.endpos)
+        next(ctx)
+        return Assignment(lval, do_expr(ctx))
+    raise ParseError("Unimplemented procedure call", tok.lexpos)
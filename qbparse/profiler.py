@@ -0,0 +1,111 @@
+"""
+Statement-level profiles of interpreted programs.
+
+A Profile is passed to the Interpreter, which then wraps every compiled
+statement to count its executions and time them. Without one the compiled code
+is unchanged, so profiling costs nothing when not in use.
+"""
+
+from collections.abc import Callable
+from time import perf_counter_ns
+from typing import Any, TextIO
+
+from qbparse.ast import Statement
+from qbparse.source import LineIndex
+
+
+class StatementStats:
+    __slots__ = ("statement", "parent", "hits", "time")
+
+    def __init__(self, statement: Statement, parent: "StatementStats | None"):
+        self.statement = statement
+        # Statement this one is nested in, such as an IF
+        self.parent = parent
+        self.hits = 0
+        # Nanoseconds spent in the statement, including nested statements
+        self.time = 0
+
+    def __repr__(self):
+        return f"[StatementStats {self.statement} hits={self.hits} time={self.time}]"
+
+
+class Profile:
+    """
+    Hit counts and times for each statement, in the order they were compiled.
+    Times are cumulative: an IF includes the statements in its branches.
+    """
+
+    def __init__(self):
+        self.stats: list[StatementStats] = []
+        # Locates statements for reports; set by the Interpreter
+        self.lines: LineIndex | None = None
+
+    def add(self, stmt: Statement, parent: StatementStats | None) -> StatementStats:
+        stats = StatementStats(stmt, parent)
+        self.stats.append(stats)
+        return stats
+
+    @staticmethod
+    def timed(
+        stats: StatementStats, run: Callable[[Any], None]
+    ) -> Callable[[Any], None]:
+        clock = perf_counter_ns
+
+        def timed_run(frame: Any):
+            start = clock()
+            try:
+                run(frame)
+            finally:
+                stats.hits += 1
+                stats.time += clock() - start
+
+        return timed_run
+
+    def self_times(self) -> dict[int, int]:
+        """
+        Time spent in each statement itself, leaving out nested statements, by
+        identity of the StatementStats.
+        """
+        result = {id(stats): stats.time for stats in self.stats}
+        for stats in self.stats:
+            if stats.parent is not None:
+                result[id(stats.parent)] -= stats.time
+        return result
+
+    def name(self, stats: StatementStats) -> str:
+        stmt = stats.statement
+        if self.lines is None or stmt.start < 0:
+            return type(stmt).__name__
+        return f"{type(stmt).__name__}:{self.lines.position(stmt.start)[0]}"
+
+    def write_flat(self, out: TextIO):
+        """
+        One line per statement, slowest first by self time. Times are in
+        milliseconds.
+        """
+        self_times = self.self_times()
+        out.write(f"{'hits':>10} {'total ms':>10} {'self ms':>10}  statement\n")
+        for stats in sorted(self.stats, key=lambda s: -self_times[id(s)]):
+            out.write(
+                f"{stats.hits:>10} {stats.time / 1e6:>10.3f} "
+                f"{self_times[id(stats)] / 1e6:>10.3f}  {self.name(stats)}\n"
+            )
+
+    def write_collapsed(self, out: TextIO, root: str = "_main"):
+        """
+        Folded stacks, as read by flamegraph.pl and compatible tools: the chain
+        of nested statements separated by semicolons, then the self time in
+        microseconds.
+        """
+        self_times = self.self_times()
+        for stats in self.stats:
+            time = self_times[id(stats)] // 1000
+            if time <= 0:
+                continue
+            frames: list[str] = []
+            node: StatementStats | None = stats
+            while node is not None:
+                frames.append(self.name(node))
+                node = node.parent
+            frames.append(root)
+            out.write(f"{';'.join(reversed(frames))} {time}\n")
@@ -0,0 +1,226 @@
+"""
+Recordings of the tokens of a source, which can be replayed in place of lexing.
+
+Layout, with integers as in qbparse.serialize unless noted:
+
+    magic "QBTK", version byte
+    source digest: the 16 bytes of source_hash()
+    source length, line number at the end of the source
+    string table: count, then (byte length, UTF-8 bytes) per string
+    token type table: count, then the string ID of each type name
+    derived type table: count, then (base type ID, width) per type
+    value table: count, then a tagged value each
+    token count, then zlib-compressed columns of little-endian unsigned 32 bit
+        integers: type, value ID, lexpos, length and line number per token
+
+Each distinct token value is stored once, and the columns are read with
+array.frombytes(). Replaying does no work per token: each token is only made
+from the columns when it is read. Recordings are only read back by the same
+VERSION; it is bumped whenever the tokens produced by the lexer change.
+"""
+
+import sys
+import zlib
+from array import array
+from collections.abc import Sequence
+from typing import Any, overload
+
+from ply.lex import LexToken
+
+from qbparse.datatypes import Type
+from qbparse.lexer import Tokens, tokenize
+from qbparse.serialize import (
+    BUILTIN_TYPE_LIST,
+    DERIVED_TYPES,
+    DOUBLE,
+    Reader,
+    Writer,
+)
+from qbparse.source import Source, source_hash
+
+MAGIC = b"QBTK"
+VERSION = 2
+
+VALUE_STR, VALUE_INT, VALUE_FLOAT, VALUE_TUPLE, VALUE_TYPE, VALUE_NONE = range(6)
+
+# Columns of the token table, in order
+COLUMNS = 5
+
+
+def write_value(w: Writer, value: Any):
+    match value:
+        case str():
+            w.uint(VALUE_STR)
+            w.string(value)
+        case None:
+            w.uint(VALUE_NONE)
+        case int():
+            w.uint(VALUE_INT)
+            # Zigzag, so small negative numbers stay small
+            w.uint(value * 2 if value >= 0 else -value * 2 - 1)
+        case float():
+            w.uint(VALUE_FLOAT)
+            w.out += DOUBLE.pack(value)
+        case tuple():
+            w.uint(VALUE_TUPLE)
+            w.uint(len(value))
+            for item in value:
+                write_value(w, item)
+        case Type():
+            w.uint(VALUE_TYPE)
+            w.type(value)
+        case _:
+            raise ValueError(f"Cannot record token value {value!r}")
+
+
+def read_value(r: Reader) -> Any:
+    tag = r.uint()
+    if tag == VALUE_STR:
+        return r.string()
+    if tag == VALUE_INT:
+        value = r.uint()
+        return value >> 1 if value & 1 == 0 else -((value + 1) >> 1)
+    if tag == VALUE_FLOAT:
+        (value,) = DOUBLE.unpack_from(r.data, r.pos)
+        r.pos += DOUBLE.size
+        return value
+    if tag == VALUE_TUPLE:
+        return tuple(read_value(r) for _ in range(r.uint()))
+    if tag == VALUE_TYPE:
+        return r.type()
+    return None
+
+
+def record(input: Source) -> bytes:
+    """
+    Lex input, or take its tokens from tokenize()'s cache, and record them.
+    """
+    return dumps(tokenize(input), source_hash(input))
+
+
+def dumps(tokens: Tokens, digest: bytes) -> bytes:
+    """
+    Record tokens lexed from the source with the given source_hash().
+    """
+    w = Writer()
+    types: dict[str, int] = {}
+    # Values by token type and value, as 1 and 1.0 are equal in a dict
+    values: dict[tuple[str, Any], int] = {}
+    columns = [array("I") for _ in range(COLUMNS)]
+    kinds, ids, starts, lengths, linenos = columns
+    for tok in tokens.tokens:
+        kind = types.get(tok.type)
+        if kind is None:
+            kind = types[tok.type] = len(types)
+        key = (tok.type, tok.value)
+        id = values.get(key)
+        if id is None:
+            id = values[key] = len(values)
+            write_value(w, tok.value)
+        kinds.append(kind)
+        ids.append(id)
+        starts.append(tok.lexpos)
+        lengths.append(tok.endpos - tok.lexpos)
+        linenos.append(tok.lineno)
+    if sys.byteorder == "big":
+        for column in columns:
+            column.byteswap()
+
+    # The tables are only complete once the values are written
+    tables = Writer()
+    tables.strings = w.strings
+    tables.uint(len(types))
+    for name in types:
+        tables.string(name)
+    tables.uint(len(w.derived))
+    for typ in w.derived:
+        tables.uint(BUILTIN_TYPE_LIST.index(typ.base_type))
+        tables.uint(typ.width)
+    tables.uint(len(values))
+    strings = Writer()
+    strings.uint(tokens.length)
+    strings.uint(tokens.lineno)
+    strings.uint(len(w.strings))
+    for string in w.strings:
+        encoded = string.encode()
+        strings.uint(len(encoded))
+        strings.out += encoded
+    w.uint(len(tokens))
+    w.out += zlib.compress(b"".join(column.tobytes() for column in columns))
+    return b"".join([MAGIC, bytes([VERSION]), digest, strings.out, tables.out, w.out])
+
+
+def replay(data: bytes, input: Source | None = None) -> Tokens:
+    """
+    Tokens recorded by record(), for ParseContext to parse in place of lexing.
+    If input is given, the recording must be of that source. Raises ValueError
+    for recordings of another source or by another version.
+    """
+    if data[: len(MAGIC)] != MAGIC:
+        raise ValueError("Not a token recording")
+    if data[len(MAGIC)] != VERSION:
+        raise ValueError(f"Unsupported token recording version {data[len(MAGIC)]}")
+    pos = len(MAGIC) + 1
+    digest = data[pos : pos + 16]
+    if input is not None and digest != source_hash(input):
+        raise ValueError("Token recording is of a different source")
+    r = Reader(data)
+    r.pos = pos + 16
+    length = r.uint()
+    lineno = r.uint()
+    for _ in range(r.uint()):
+        size = r.uint()
+        r.strings.append(data[r.pos : r.pos + size].decode())
+        r.pos += size
+    types = [r.string() for _ in range(r.uint())]
+    for _ in range(r.uint()):
+        base = BUILTIN_TYPE_LIST[r.uint()]
+        width = r.uint()
+        r.types.append(DERIVED_TYPES[base.name](width))
+    values = [read_value(r) for _ in range(r.uint())]
+
+    count = r.uint()
+    raw = zlib.decompress(data[r.pos :])
+    columns: list[array[int]] = []
+    size = array("I").itemsize * count
+    for n in range(COLUMNS):
+        column = array("I")
+        column.frombytes(raw[n * size : (n + 1) * size])
+        if sys.byteorder == "big":
+            column.byteswap()
+        columns.append(column)
+    return Tokens.from_list(
+        RecordedTokens(types, values, columns), length, lineno, columns[2]
+    )
+
+
+class RecordedTokens(Sequence[LexToken]):
+    """
+    The tokens of a recording, each made from the columns as it is read. A new
+    token is made for each read, so they are no more shared than a lexer's.
+    """
+
+    def __init__(self, types: list[str], values: list[Any], columns: list[array[int]]):
+        self.types = types
+        self.values = values
+        self.kinds, self.ids, self.starts, self.lengths, self.linenos = columns
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @overload
+    def __getitem__(self, index: int) -> LexToken: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[LexToken]: ...
+
+    def __getitem__(self, index: int | slice) -> LexToken | list[LexToken]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        tok = LexToken()
+        tok.type = self.types[self.kinds[index]]
+        tok.value = self.values[self.ids[index]]
+        tok.lexpos = lexpos = self.starts[index]
+        tok.endpos = lexpos + self.lengths[index]
+        tok.lineno = self.linenos[index]
+        return tok
@@ -0,0 +1,293 @@
+"""
+QB64 semantics shared by the execution backends: operators, conversion of values
+on assignment to a typed variable, and PRINT formatting.
+
+Numbers are Python ints and floats, strings are str. Values are only made to fit
+their type when stored in a variable, as QB64 does for intermediate results.
+"""
+
+import math
+import operator
+import struct
+from collections.abc import Callable
+from typing import Any, TextIO
+
+from qbparse.datatypes import BUILTIN_TYPES, FixedWidthType, Type
+
+type Value = int | float | str
+
+INTEGER_TYPES = {
+    "_bit",
+    "_byte",
+    "integer",
+    "long",
+    "_integer64",
+    "_unsigned _bit",
+    "_unsigned _byte",
+    "_unsigned integer",
+    "_unsigned long",
+    "_unsigned _integer64",
+}
+
+SINGLE = struct.Struct("f")
+
+# Width of a PRINT zone, which a comma moves to the start of
+ZONE_WIDTH = 14
+# Most characters of a line that Output holds before the line is complete
+LINE_BUFFER = 8192
+
+
+class QBError(Exception):
+    """
+    A QB64 run-time error.
+    """
+
+
+def base_type(typ: Type) -> Type:
+    return typ.base_type if isinstance(typ, FixedWidthType) else typ
+
+
+def is_integer(typ: Type) -> bool:
+    return base_type(typ).name in INTEGER_TYPES
+
+
+def is_double(typ: Type) -> bool:
+    return base_type(typ).name in ("double", "_float")
+
+
+def is_string(typ: Type) -> bool:
+    return base_type(typ) is BUILTIN_TYPES["string"]
+
+
+def to_integer(value: Value) -> int:
+    """
+    QB64 rounds to the nearest integer, with halves going to even.
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        raise QBError("Type mismatch")
+    try:
+        return round(value)
+    except (OverflowError, ValueError):
+        raise QBError("Overflow") from None
+
+
+def to_single(value: Value) -> float:
+    try:
+        return SINGLE.unpack(SINGLE.pack(value))[0]  # pyright: ignore[reportArgumentType]
+    except OverflowError:
+        raise QBError("Overflow") from None
+    except struct.error:
+        raise QBError("Type mismatch") from None
+
+
+def to_number(value: Value) -> int | float:
+    if isinstance(value, str):
+        raise QBError("Type mismatch")
+    return value
+
+
+def converter(typ: Type) -> Callable[[Any], Value]:
+    """
+    Function to make a value fit a variable of the given type. Integers wrap
+    around within the type's range, as the compiled C code does.
+    """
+    if is_integer(typ):
+        low = int(typ.min)
+        span = int(typ.max) - low + 1
+
+        def to_int(value: Value) -> int:
+            result = to_integer(value)
+            if low <= result < low + span:
+                return result
+            return (result - low) % span + low
+
+        return to_int
+    if is_string(typ):
+        if isinstance(typ, FixedWidthType):
+            width = typ.width
+
+            def to_fixed(value: Value) -> str:
+                if not isinstance(value, str):
+                    raise QBError("Type mismatch")
+                return value[:width].ljust(width)
+
+            return to_fixed
+
+        def to_str(value: Value) -> str:
+            if not isinstance(value, str):
+                raise QBError("Type mismatch")
+            return value
+
+        return to_str
+    if base_type(typ) is BUILTIN_TYPES["single"]:
+        return to_single
+
+    def to_float(value: Value) -> float:
+        return float(to_number(value))
+
+    return to_float
+
+
+def initial_value(typ: Type) -> Value:
+    if is_integer(typ):
+        return 0
+    if is_string(typ):
+        return " " * typ.width if isinstance(typ, FixedWidthType) else ""
+    return 0.0
+
+
+def constant_value(value: Any, typ: Type) -> Value:
+    """
+    The run-time value of a Constant. _FLOAT literals are (mantissa, exponent)
+    pairs, which lose precision here.
+    """
+    if isinstance(value, tuple):
+        mantissa, exponent = value
+        value = mantissa * 10.0**exponent
+    return converter(typ)(value)
+
+
+def truth(value: Value) -> bool:
+    return to_number(value) != 0
+
+
+def boolean(condition: bool) -> int:
+    # QB64 true is -1
+    return -1 if condition else 0
+
+
+def divide(a: Value, b: Value) -> float:
+    try:
+        return to_number(a) / to_number(b)
+    except ZeroDivisionError:
+        raise QBError("Division by zero") from None
+
+
+def int_divide(a: Value, b: Value) -> int:
+    a, b = to_integer(a), to_integer(b)
+    if b == 0:
+        raise QBError("Division by zero")
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+def modulo(a: Value, b: Value) -> int:
+    return to_integer(a) - to_integer(b) * int_divide(a, b)
+
+
+def power(a: Value, b: Value) -> float:
+    try:
+        result = float(to_number(a)) ** to_number(b)
+    except ZeroDivisionError:
+        raise QBError("Division by zero") from None
+    except OverflowError:
+        raise QBError("Overflow") from None
+    # A negative base with a fractional exponent has no real result
+    if isinstance(result, complex):
+        raise QBError("Illegal function call")
+    return result
+
+
+def add(a: Value, b: Value) -> Value:
+    if isinstance(a, str) != isinstance(b, str):
+        raise QBError("Type mismatch")
+    return a + b  # pyright: ignore[reportOperatorIssue]
+
+
+def comparison(compare: Callable[[Any, Any], bool]) -> Callable[[Value, Value], int]:
+    def op(a: Value, b: Value) -> int:
+        if isinstance(a, str) != isinstance(b, str):
+            raise QBError("Type mismatch")
+        return boolean(compare(a, b))
+
+    return op
+
+
+BINARY_OPS: dict[str, Callable[[Value, Value], Value]] = {
+    "imp": lambda a, b: ~to_integer(a) | to_integer(b),
+    "eqv": lambda a, b: ~(to_integer(a) ^ to_integer(b)),
+    "xor": lambda a, b: to_integer(a) ^ to_integer(b),
+    "or": lambda a, b: to_integer(a) | to_integer(b),
+    "and": lambda a, b: to_integer(a) & to_integer(b),
+    "=": comparison(operator.eq),
+    "<>": comparison(operator.ne),
+    "<": comparison(operator.lt),
+    ">": comparison(operator.gt),
+    "<=": comparison(operator.le),
+    ">=": comparison(operator.ge),
+    "+": add,
+    "-": lambda a, b: to_number(a) - to_number(b),
+    "mod": modulo,
+    "\\": int_divide,
+    "*": lambda a, b: to_number(a) * to_number(b),
+    "/": divide,
+    "^": power,
+}
+
+UNARY_OPS: dict[str, Callable[[Value], Value]] = {
+    "negation": lambda a: -to_number(a),
+    "not": lambda a: ~to_integer(a),
+}
+
+
+def format_value(value: Value, double: bool = False) -> str:
+    """
+    Text PRINT shows for a value. Numbers get a leading space for the sign if
+    not negative, and a trailing space. Floats are shown to single precision
+    unless double is set, which it is for expressions involving DOUBLE or _FLOAT
+    values.
+    """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        text = str(value)
+    elif math.isinf(value) or math.isnan(value):
+        raise QBError("Overflow")
+    else:
+        text = f"{value:.16G}" if double else f"{to_single(value):.7G}"
+        if "E" in text:
+            mantissa, exponent = text.split("E")
+            if "." in mantissa:
+                mantissa = mantissa.rstrip("0").rstrip(".")
+            text = f"{mantissa}E{exponent[0]}{exponent[1:].zfill(2)}"
+        if text.startswith("0."):
+            text = text[1:]
+        elif text.startswith("-0."):
+            text = "-" + text[2:]
+    return (text if text.startswith("-") else " " + text) + " "
+
+
+class Output:
+    """
+    PRINT destination. Tracks the column for comma separated items, and buffers
+    writes up to the end of a line, or until LINE_BUFFER characters of a line
+    are waiting, so a long-running program shows its output as it goes.
+    """
+
+    def __init__(self, out: TextIO):
+        self.out = out
+        self.parts: list[str] = []
+        self.column = 0
+        # Characters in parts
+        self.size = 0
+
+    def write(self, text: str):
+        self.parts.append(text)
+        self.size += len(text)
+        newline = text.rfind("\n")
+        if newline >= 0:
+            self.column = len(text) - newline - 1
+        else:
+            self.column += len(text)
+        if newline >= 0 or self.size >= LINE_BUFFER:
+            self.flush()
+
+    def next_zone(self):
+        self.write(" " * (ZONE_WIDTH - self.column % ZONE_WIDTH))
+
+    def flush(self):
+        self.out.write("".join(self.parts))
+        self.parts.clear()
+        self.size = 0
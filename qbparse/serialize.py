@@ -0,0 +1,508 @@
+"""
+Compact binary serialization of a parsed Program.
+
+Layout, with every integer an unsigned LEB128 varint unless noted:
+
+    magic "QBPA", version byte
+    string table: count, then (byte length, UTF-8 bytes) per string
+    node kind table: count, then the string ID of each kind name
+    derived type table: count, then (base type ID, width) per type
+    line starts: count, then the gap from the previous start
+    errors: count, then (message string ID, lexpos + 1) per error
+    global scope, then the procedures of the program
+
+Types are referred to by canonical ID: builtin types by their position in
+BUILTIN_TYPES, then derived (fixed width) types in table order. Nodes are a
+kind tag, a span and the fields of that kind. Variables are numbered in the
+order their scopes are written and referred to by that number.
+"""
+
+import struct
+from array import array
+from collections.abc import Callable
+from typing import Any
+
+from qbparse import Program
+from qbparse.ast import (
+    Assignment,
+    BinOp,
+    Constant,
+    Goto,
+    If,
+    Label,
+    Node,
+    Print,
+    ProcDefinition,
+    UniOp,
+    Var,
+)
+from qbparse.datatypes import BUILTIN_TYPES, FixedWidthType, Type, TypeSignature
+from qbparse.errors import ParseError
+from qbparse.source import LineIndex
+from qbparse.symbols import Procedure, SymbolStore, Variable
+
+MAGIC = b"QBPA"
+VERSION = 2
+
+BUILTIN_TYPE_LIST = list(BUILTIN_TYPES.values())
+
+# Constants shared between nodes, so their identity is kept
+SHARED_CONSTANTS = {
+    "TAB_SEPARATOR": Print.TAB_SEPARATOR,
+    "FINAL_NEWLINE": Print.FINAL_NEWLINE,
+}
+
+# CONST_DECIMAL is a _FLOAT literal, kept as a (mantissa, exponent) pair
+CONST_INT, CONST_FLOAT, CONST_STR, CONST_DECIMAL = range(4)
+
+DOUBLE = struct.Struct("<d")
+
+
+class Writer:
+    def __init__(self):
+        self.out = bytearray()
+        self.strings: dict[str, int] = {}
+        self.kinds: dict[str, int] = {}
+        # Builtin types compare by identity, and fixed width types by value, so
+        # equal derived types share one table entry
+        self.type_ids: dict[Type, int] = {t: i for i, t in enumerate(BUILTIN_TYPE_LIST)}
+        self.derived: list[FixedWidthType] = []
+        self.variables: dict[int, int] = {}
+
+    def uint(self, value: int):
+        out = self.out
+        while value > 0x7F:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+
+    def sint(self, value: int):
+        # Zigzag encoding keeps small negative numbers short
+        self.uint(value * 2 if value >= 0 else -value * 2 - 1)
+
+    def string(self, value: str):
+        id = self.strings.get(value)
+        if id is None:
+            id = self.strings[value] = len(self.strings)
+        self.uint(id)
+
+    def type(self, typ: Type):
+        id = self.type_ids.get(typ)
+        if id is None:
+            if not isinstance(typ, FixedWidthType):
+                raise ValueError(f"Cannot serialize type {typ.name}")
+            id = self.type_ids[typ] = len(BUILTIN_TYPE_LIST) + len(self.derived)
+            self.derived.append(typ)
+        self.uint(id)
+
+    def kind(self, name: str):
+        id = self.kinds.get(name)
+        if id is None:
+            id = self.kinds[name] = len(self.kinds)
+        self.uint(id)
+
+    def node(self, node: Node):
+        for name, shared in SHARED_CONSTANTS.items():
+            if node is shared:
+                self.kind(name)
+                return
+        write = NODE_WRITERS.get(type(node))
+        if write is None:
+            raise ValueError(f"Cannot serialize node {type(node).__name__}")
+        self.kind(type(node).__name__)
+        self.uint(node.start + 1)
+        self.uint(node.end - node.start)
+        write(self, node)
+
+    def nodes(self, nodes: list[Any]):
+        self.uint(len(nodes))
+        for node in nodes:
+            self.node(node)
+
+    def scope(self, symbols: SymbolStore):
+        variables = list(symbols.variables.values())
+        self.uint(len(variables))
+        for var in variables:
+            self.variables[id(var)] = len(self.variables)
+            self.string(var.name)
+            self.type(var.type)
+            self.uint(symbols.declared.get(var.name) is var)
+
+    def variable(self, var: Variable):
+        self.uint(self.variables[id(var)])
+
+    def procedure(self, proc: Procedure, globals: SymbolStore):
+        self.string(proc.name)
+        if proc.signature is None:
+            self.uint(0)
+        else:
+            self.uint(len(proc.signature.params) + 1)
+            self.type(proc.signature.ret)
+            for typ in proc.signature.params:
+                self.type(typ)
+        impl = proc.impl
+        if impl is None:
+            self.uint(0)
+            return
+        # 1: body in the global scope, 2: body with a local scope
+        local = impl.symbols is not None and impl.symbols is not globals
+        self.uint(2 if local else 1)
+        if local:
+            assert impl.symbols is not None
+            self.scope(impl.symbols)
+        self.uint(impl.start + 1)
+        self.uint(impl.end - impl.start)
+        self.uint(len(impl.params))
+        for var in impl.params:
+            self.variable(var)
+        self.nodes(impl.statements)
+
+
+def write_assignment(w: Writer, node: Assignment):
+    w.node(node.lval)
+    w.node(node.rval)
+
+
+def write_print(w: Writer, node: Print):
+    w.nodes(node.params)
+
+
+def write_if(w: Writer, node: If):
+    w.node(node.guard)
+    w.nodes(node.true_branch)
+    w.uint(len(node.elseifs))
+    for guard, branch in node.elseifs:
+        w.node(guard)
+        w.nodes(branch)
+    w.nodes(node.false_branch)
+
+
+def write_var(w: Writer, node: Var):
+    w.variable(node.target)
+
+
+def write_binop(w: Writer, node: BinOp):
+    w.string(node.name)
+    w.node(node.left)
+    w.node(node.right)
+
+
+def write_uniop(w: Writer, node: UniOp):
+    w.string(node.name)
+    w.node(node.param)
+
+
+def write_label(w: Writer, node: Label):
+    w.uint(len(node.names))
+    for name in node.names:
+        w.string(name)
+
+
+def write_goto(w: Writer, node: Goto):
+    w.string(node.name)
+
+
+def write_constant(w: Writer, node: Constant):
+    w.type(node.type)
+    match node.value:
+        case int() as value:
+            w.uint(CONST_INT)
+            w.sint(value)
+        case float() as value:
+            w.uint(CONST_FLOAT)
+            w.out += DOUBLE.pack(value)
+        case str() as value:
+            w.uint(CONST_STR)
+            w.string(value)
+        case (int() as mantissa, int() as exponent):
+            w.uint(CONST_DECIMAL)
+            w.sint(mantissa)
+            w.sint(exponent)
+        case value:
+            raise ValueError(f"Cannot serialize constant {value!r}")
+
+
+NODE_WRITERS: dict[type, Callable[[Writer, Any], None]] = {
+    Assignment: write_assignment,
+    Print: write_print,
+    If: write_if,
+    Var: write_var,
+    BinOp: write_binop,
+    UniOp: write_uniop,
+    Constant: write_constant,
+    Label: write_label,
+    Goto: write_goto,
+}
+
+
+class Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+        self.strings: list[str] = []
+        self.kinds: list[Callable[[Reader], Any]] = []
+        self.types = list(BUILTIN_TYPE_LIST)
+        self.variables: list[Variable] = []
+        # Of the procedure being read; GOTOs are resolved at its end
+        self.labels: dict[str, Label] = {}
+        self.gotos: list[Goto] = []
+
+    def uint(self) -> int:
+        data = self.data
+        pos = self.pos
+        byte = data[pos]
+        pos += 1
+        value = byte & 0x7F
+        shift = 7
+        while byte & 0x80:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+        self.pos = pos
+        return value
+
+    def sint(self) -> int:
+        value = self.uint()
+        return -((value + 1) >> 1) if value & 1 else value >> 1
+
+    def string(self) -> str:
+        return self.strings[self.uint()]
+
+    def type(self) -> Type:
+        return self.types[self.uint()]
+
+    def node(self) -> Any:
+        return self.kinds[self.uint()](self)
+
+    def nodes(self) -> list[Any]:
+        return [self.node() for _ in range(self.uint())]
+
+    def span[T: Node](self, node: T) -> T:
+        start = self.uint() - 1
+        node.start = start
+        node.end = start + self.uint()
+        return node
+
+    def scope(self, symbols: SymbolStore):
+        for _ in range(self.uint()):
+            var = Variable(self.string(), self.type())
+            symbols.variables[var.name, var.type] = var
+            if self.uint():
+                symbols.declared[var.name] = var
+            self.variables.append(var)
+
+    def procedure(self, globals: SymbolStore) -> Procedure:
+        name = self.string()
+        signature = None
+        if count := self.uint():
+            ret = self.type()
+            signature = TypeSignature(ret, [self.type() for _ in range(count - 1)])
+        proc = Procedure(name, signature)
+        match self.uint():
+            case 0:
+                return proc
+            case 1:
+                symbols = globals
+            case _:
+                symbols = SymbolStore(parent=globals)
+                self.scope(symbols)
+        impl = self.span(ProcDefinition(symbols))
+        impl.params = [self.variables[self.uint()] for _ in range(self.uint())]
+        self.labels, self.gotos = {}, []
+        impl.statements = self.nodes()
+        for goto in self.gotos:
+            goto.target = self.labels.get(goto.name)
+        impl.labels = self.labels
+        proc.impl = impl
+        return proc
+
+
+def read_assignment(r: Reader):
+    node = r.span(Assignment.__new__(Assignment))
+    node.lval = r.node()
+    node.rval = r.node()
+    return node
+
+
+def read_print(r: Reader):
+    node = r.span(Print.__new__(Print))
+    node.params = r.nodes()
+    return node
+
+
+def read_if(r: Reader):
+    node = r.span(If.__new__(If))
+    node.guard = r.node()
+    node.true_branch = r.nodes()
+    node.elseifs = [(r.node(), r.nodes()) for _ in range(r.uint())]
+    node.false_branch = r.nodes()
+    return node
+
+
+def read_var(r: Reader):
+    node = r.span(Var.__new__(Var))
+    node.target = r.variables[r.uint()]
+    return node
+
+
+def read_binop(r: Reader):
+    node = r.span(BinOp.__new__(BinOp))
+    node.name = r.string()
+    node.left = r.node()
+    node.right = r.node()
+    return node
+
+
+def read_uniop(r: Reader):
+    node = r.span(UniOp.__new__(UniOp))
+    node.name = r.string()
+    node.param = r.node()
+    return node
+
+
+def read_label(r: Reader):
+    node = r.span(Label.__new__(Label))
+    node.names = [r.string() for _ in range(r.uint())]
+    for name in node.names:
+        r.labels[name] = node
+    return node
+
+
+def read_goto(r: Reader):
+    node = r.span(Goto.__new__(Goto))
+    node.name = r.string()
+    r.gotos.append(node)
+    return node
+
+
+def read_constant(r: Reader):
+    node = r.span(Constant.__new__(Constant))
+    node.type = r.type()
+    kind = r.uint()
+    if kind == CONST_INT:
+        node.value = r.sint()
+    elif kind == CONST_FLOAT:
+        (node.value,) = DOUBLE.unpack_from(r.data, r.pos)
+        r.pos += DOUBLE.size
+    elif kind == CONST_DECIMAL:
+        node.value = (r.sint(), r.sint())
+    else:
+        node.value = r.string()
+    return node
+
+
+def shared_reader(node: Node) -> Callable[[Reader], Any]:
+    return lambda _: node
+
+
+NODE_READERS: dict[str, Callable[[Reader], Any]] = {
+    "Assignment": read_assignment,
+    "Print": read_print,
+    "If": read_if,
+    "Var": read_var,
+    "BinOp": read_binop,
+    "UniOp": read_uniop,
+    "Constant": read_constant,
+    "Label": read_label,
+    "Goto": read_goto,
+    **{name: shared_reader(node) for name, node in SHARED_CONSTANTS.items()},
+}
+
+
+def dumps(program: Program) -> bytes:
+    """
+    Serialize a program. Lazily parsed procedure bodies are parsed first.
+    """
+    w = Writer()
+    starts = program.lines.starts
+    w.uint(len(starts))
+    previous = 0
+    for start in starts:
+        w.uint(start - previous)
+        previous = start
+    w.uint(len(program.errors))
+    for error in program.errors:
+        w.string(str(error))
+        w.uint(0 if error.lexpos is None else error.lexpos + 1)
+    globals = program.globals
+    w.type(globals.default_type)
+    w.uint(len(globals.types))
+    for typ in globals.types.values():
+        w.type(typ)
+    w.scope(globals)
+    w.uint(len(globals.procedures))
+    for proc in globals.procedures.values():
+        w.procedure(proc, globals)
+
+    # The tables are only complete once everything else is written
+    tables = Writer()
+    tables.strings = w.strings
+    tables.uint(len(w.kinds))
+    for kind in w.kinds:
+        tables.string(kind)
+    tables.uint(len(w.derived))
+    for typ in w.derived:
+        tables.uint(BUILTIN_TYPE_LIST.index(typ.base_type))
+        tables.uint(typ.width)
+    strings = Writer()
+    strings.uint(len(w.strings))
+    for string in w.strings:
+        encoded = string.encode()
+        strings.uint(len(encoded))
+        strings.out += encoded
+    return b"".join([MAGIC, bytes([VERSION]), strings.out, tables.out, w.out])
+
+
+def loads(data: bytes) -> Program:
+    """
+    Reconstruct a program serialized by dumps(). Builtin types are restored as
+    the BUILTIN_TYPES objects themselves.
+    """
+    if data[: len(MAGIC)] != MAGIC:
+        raise ValueError("Not a serialized program")
+    if data[len(MAGIC)] != VERSION:
+        raise ValueError(f"Unsupported serialization version {data[len(MAGIC)]}")
+    r = Reader(data)
+    r.pos = len(MAGIC) + 1
+    for _ in range(r.uint()):
+        length = r.uint()
+        r.strings.append(data[r.pos : r.pos + length].decode())
+        r.pos += length
+    r.kinds = [NODE_READERS[r.string()] for _ in range(r.uint())]
+    for _ in range(r.uint()):
+        base = BUILTIN_TYPE_LIST[r.uint()]
+        width = r.uint()
+        r.types.append(DERIVED_TYPES[base.name](width))
+
+    program = Program(LineIndex.from_starts(array("q", accumulate(r))))
+    for _ in range(r.uint()):
+        message = r.string()
+        lexpos = r.uint() - 1
+        error = ParseError(message, None if lexpos < 0 else lexpos)
+        error.locate(program.lines)
+        program.errors.append(error)
+    globals = program.globals
+    globals.default_type = r.type()
+    for _ in range(r.uint()):
+        typ = r.type()
+        globals.types[typ.name] = typ
+    r.scope(globals)
+    for _ in range(r.uint()):
+        proc = r.procedure(globals)
+        globals.procedures[proc.name] = proc
+    return program
+
+
+def accumulate(r: Reader):
+    start = 0
+    for _ in range(r.uint()):
+        start += r.uint()
+        yield start
+
+
+DERIVED_TYPES: dict[str, Callable[[int], FixedWidthType]] = {
+    "string": FixedWidthType.of_string,
+    "_bit": FixedWidthType.of_bit,
+    "_unsigned _bit": FixedWidthType.of_unsigned_bit,
+}
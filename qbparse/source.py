@@ -0,0 +1,86 @@
+import hashlib
+import os
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterator
+from contextlib import contextmanager
+from mmap import ACCESS_READ, mmap
+from typing import BinaryIO
+
+# Program text: decoded, or the raw CP437 bytes of a file
+type Source = str | bytes | mmap
+
+
+def open_source(file: str | os.PathLike[str] | BinaryIO) -> Source:
+    """
+    Memory-map a source file, given by path or as a file opened in binary mode,
+    for reading. The mapping stays valid after the file is closed and is released
+    when it is garbage collected.
+    """
+    if isinstance(file, str | os.PathLike):
+        with open(file, "rb") as opened:
+            return open_source(opened)
+    if os.fstat(file.fileno()).st_size == 0:
+        # Empty files cannot be mapped
+        return b""
+    return mmap(file.fileno(), 0, access=ACCESS_READ)
+
+
+def source_hash(text: Source) -> bytes:
+    """
+    Digest of program text, for caching results derived from it. Text and bytes
+    are hashed apart, as bytes are CP437 rather than UTF-8.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(text, str):
+        digest.update(b"s")
+        digest.update(text.encode("utf-8", "surrogatepass"))
+    else:
+        digest.update(b"b")
+        digest.update(text)
+    return digest.digest()
+
+
+@contextmanager
+def map_file(file: str | os.PathLike[str] | BinaryIO) -> Iterator[Source]:
+    """
+    As open_source(), but the mapping is closed on exit.
+    """
+    data = open_source(file)
+    try:
+        yield data
+    finally:
+        if isinstance(data, mmap):
+            data.close()
+
+
+class LineIndex:
+    """
+    Converts offsets into the source to (line, column) positions. Only the offset
+    of each line start is kept, so lookups are a binary search. Lines and columns
+    count from 1.
+    """
+
+    def __init__(self, text: Source):
+        newline = "\n" if isinstance(text, str) else b"\n"
+        self.starts = array("q", [0])
+        pos = text.find(newline)  # pyright: ignore[reportArgumentType]
+        while pos >= 0:
+            self.starts.append(pos + 1)
+            pos = text.find(newline, pos + 1)  # pyright: ignore[reportArgumentType]
+
+    @staticmethod
+    def from_starts(starts: array[int]) -> "LineIndex":
+        lines = LineIndex("")
+        lines.starts = starts
+        return lines
+
+    def __repr__(self):
+        return f"[LineIndex lines={len(self.starts)}]"
+
+    def position(self, offset: int) -> tuple[int, int]:
+        line = bisect_right(self.starts, offset)
+        return (line, offset - self.starts[line - 1] + 1)
+
+    def line_start(self, line: int) -> int:
+        return self.starts[line - 1]
@@ -1,3 +1,6 @@
+import sys
+from collections.abc import Callable, Mapping
+from threading import Lock
 from typing import TYPE_CHECKING, Any
 
 from qbparse.datatypes import (
@@ -12,7 +15,7 @@ from qbparse.errors import ParseError
 if TYPE_CHECKING:
     from qbparse.ast import ProcDefinition
 
-KEYWORDS = set(
+KEYWORDS = frozenset(
     [
         # Declarations
         "dim",
@@ -51,6 +54,8 @@ KEYWORDS = set(
 
 
 class Variable:
+    __slots__ = ("name", "type")
+
     def __init__(self, name: str, type: Type):
         self.name = name
         self.type = type
@@ -63,17 +68,53 @@ class Variable:
             return NotImplemented
         return self.name == other.name and self.type == other.type
 
+    def __hash__(self):
+        return hash((self.name, self.type))
+
 
 class Procedure:
     def __init__(self, name: str, signature: TypeSignature | None):
         self.name = name
         # signature & impl may be None for special cased procedures
         self.signature = signature
-        self.impl: ProcDefinition | None = None
+        self._impl: ProcDefinition | None = None
+        # Parses the body on first access to impl, when it was skipped by a
+        # lazy parse
+        self.loader: Callable[[], ProcDefinition] | None = None
+        self._lock = Lock()
+
+    @property
+    def impl(self) -> "ProcDefinition | None":
+        if self.loader is not None:
+            # Only one thread runs the loader, so that errors in the body are
+            # reported once
+            with self._lock:
+                loader = self.loader
+                if loader is not None:
+                    self._impl = loader()
+                    self.loader = None
+        return self._impl
+
+    @impl.setter
+    def impl(self, impl: "ProcDefinition | None"):
+        self._impl = impl
+        self.loader = None
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Locks cannot be pickled
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]):
+        self.__dict__.update(state)
+        self._lock = Lock()
 
     def __repr__(self):
+        # Not impl, which would load the body, and deadlock if called while the
+        # body is loading
         return (
-            f"[Procedure name={self.name} signature={self.signature} impl={self.impl}]"
+            f"[Procedure name={self.name} signature={self.signature} impl={self._impl}]"
         )
 
     def __eq__(self, other: Any):
@@ -82,15 +123,99 @@ class Procedure:
         return self.name == other.name and self.signature == other.signature
 
 
-BUILTIN_PROCS: dict[str, Procedure] = {}
+def sigil_type(sigil: str) -> Type:
+    """
+    The type a sigil stands for. Fixed width types are created anew; use
+    SymbolStore.lookup_sigil() to get a program's own instance.
+    """
+    if builtin := BUILTIN_SIGILS.get(sigil):
+        return builtin
+    if sigil.startswith("`"):
+        return FixedWidthType.of_bit(int(sigil[1:]))
+    if sigil.startswith("~`"):
+        return FixedWidthType.of_unsigned_bit(int(sigil[2:]))
+    if sigil.startswith("$"):
+        return FixedWidthType.of_string(int(sigil[1:]))
+    raise ParseError("Unknown type " + sigil)
 
 
-class SymbolStore:
+class BuiltinCatalogue(Mapping[str, Procedure]):
+    """
+    QB64's builtin procedures, from qbparse.catalogue. The catalogue is read
+    on first use and each Procedure is made when it is first looked up, so
+    importing and most lookups stay cheap: a name that is not a builtin costs
+    one set probe.
+    """
+
     def __init__(self):
-        self.variables: dict[str, dict[Type, Variable]] = {}
+        self.lines: dict[str, str] | None = None
+        self.names: frozenset[str] = frozenset()
+        self.procs: dict[str, Procedure] = {}
+        self.lock = Lock()
+
+    def load(self) -> dict[str, str]:
+        with self.lock:
+            if self.lines is None:
+                from qbparse.catalogue import CATALOGUE
+
+                lines = {line.split(" ", 1)[0]: line for line in CATALOGUE.splitlines()}
+                self.names = frozenset(lines)
+                self.lines = lines
+        return self.lines
+
+    def __contains__(self, name: object) -> bool:
+        if self.lines is None:
+            self.load()
+        return name in self.names
+
+    def __getitem__(self, name: str) -> Procedure:
+        proc = self.procs.get(name)
+        if proc is None:
+            lines = self.lines if self.lines is not None else self.load()
+            ret, *params = lines[name].split(" ")[1:]
+            signature = TypeSignature(
+                BUILTIN_TYPES["_none"] if ret == "-" else BUILTIN_SIGILS[ret],
+                [BUILTIN_SIGILS[param] for param in params],
+            )
+            with self.lock:
+                proc = self.procs.setdefault(name, Procedure(name, signature))
+        return proc
+
+    def __iter__(self):
+        return iter(self.lines if self.lines is not None else self.load())
+
+    def __len__(self):
+        return len(self.lines if self.lines is not None else self.load())
+
+
+BUILTIN_PROCS: Mapping[str, Procedure] = BuiltinCatalogue()
+
+
+class SymbolStore:
+    def __init__(self, parent: "SymbolStore | None" = None):
+        """
+        A store with a parent is a local scope: it has its own variables but
+        sees the parent's procedures and shares its types.
+        """
+        self.parent = parent
+        # Keyed by name and type; fixed width types must be the program's own
+        # instance, from lookup_sigil()
+        self.variables: dict[tuple[str, Type], Variable] = {}
+        # Variables by name alone, made by named() when first needed
+        self.by_name: dict[str, list[Variable]] | None = None
+        # Variables declared with AS, which their name alone refers to
+        self.declared: dict[str, Variable] = {}
         self.procedures: dict[str, Procedure] = {}
-        self.types: dict[str, Type] = {}
-        self.default_type = BUILTIN_TYPES["single"]
+        # Local scopes use their parent's; see types
+        self._types: dict[str, Type] = {}
+        if parent is None:
+            self.default_type = BUILTIN_TYPES["single"]
+        else:
+            self.default_type = parent.default_type
+        # Tables still shared with a store forked from or off this one, which
+        # must be copied before they are changed
+        self.shared: set[str] = set()
+        self.frozen = False
 
     def __repr__(self):
         return (
@@ -98,39 +223,130 @@ class SymbolStore:
             f"types={self.types}]"
         )
 
+    @property
+    def types(self) -> dict[str, Type]:
+        if self.parent is not None:
+            return self.parent.types
+        return self._types
+
+    def freeze(self) -> "SymbolStore":
+        """
+        Make the store read-only, so it can be shared by forks. Lazily parsed
+        procedure bodies are parsed first, as that adds to the types.
+        """
+        for proc in self.procedures.values():
+            proc.impl
+        self.frozen = True
+        return self
+
+    def fork(self) -> "SymbolStore":
+        """
+        A store with the same symbols as this one, and the same parent. The
+        tables are shared until one of the two stores changes them, so forking
+        is cheap however many symbols there are. Forking a frozen store gives
+        an independent copy; forking any other store and dropping one of the
+        two gives a checkpoint to roll back to.
+        """
+        fork = SymbolStore(self.parent)
+        fork.variables = self.variables
+        fork.declared = self.declared
+        fork.procedures = self.procedures
+        fork._types = self._types
+        fork.default_type = self.default_type
+        fork.shared = {"variables", "declared", "procedures", "_types"}
+        if not self.frozen:
+            self.shared = set(fork.shared)
+        return fork
+
+    def own(self, table: str):
+        """
+        Get ready to change one of the tables, copying it if it is shared.
+        """
+        if self.frozen:
+            raise ValueError("Frozen symbols cannot be changed")
+        if table in self.shared:
+            self.shared.discard(table)
+            setattr(self, table, dict(getattr(self, table)))
+            if table == "variables":
+                self.by_name = None
+
+    def add_procedure(self, proc: Procedure):
+        self.own("procedures")
+        self.procedures[proc.name] = proc
+
     def is_keyword(self, name: str):
         return name in KEYWORDS
 
-    def find_procedure(self, ident: str):
-        return self.procedures.get(ident) or BUILTIN_PROCS.get(ident)
+    def find_procedure(self, ident: str) -> Procedure | None:
+        """
+        A procedure of the program, or else one of QB64's builtin procedures.
+        """
+        if proc := self.procedures.get(ident):
+            return proc
+        if self.parent is not None:
+            return self.parent.find_procedure(ident)
+        if ident in BUILTIN_PROCS:
+            return BUILTIN_PROCS[ident]
+        return None
 
     def find_variable(self, ident: str, sigil: str | None = None):
-        if ident not in self.variables:
-            return None
-        vars = self.variables[ident]
-        typ = self.lookup_sigil(sigil)
-        return vars.get(typ)
+        if sigil is None:
+            # A variable declared AS a type takes the name over from the one
+            # of the default type
+            return self.declared.get(ident) or self.variables.get(
+                (ident, self.default_type)
+            )
+        # Fixed width types are equal by value, so need not be the interned one
+        return self.variables.get((ident, sigil_type(sigil)))
+
+    def named(self, name: str) -> list[Variable]:
+        """
+        The variables called name, of any type.
+        """
+        if self.by_name is None:
+            by_name: dict[str, list[Variable]] = {}
+            for var in self.variables.values():
+                by_name.setdefault(var.name, []).append(var)
+            self.by_name = by_name
+        return self.by_name.get(name, [])
 
     def lookup_sigil(self, sigil: str | None):
         if sigil is None:
             return self.default_type
-        if builtin := BUILTIN_SIGILS.get(sigil):
-            return builtin
-        if sigil.startswith("`"):
-            new_type = FixedWidthType.of_bit(int(sigil[1:]))
-        elif sigil.startswith("~`"):
-            new_type = FixedWidthType.of_unsigned_bit(int(sigil[2:]))
-        elif sigil.startswith("$"):
-            new_type = FixedWidthType.of_string(int(sigil[1:]))
-        else:
-            raise ParseError("Unknown type " + sigil)
-        return self.types.setdefault(new_type.name, new_type)
+        typ = sigil_type(sigil)
+        if isinstance(typ, FixedWidthType):
+            # Fixed width types are made once per program
+            return self.intern(typ)
+        return typ
+
+    def intern(self, typ: Type) -> Type:
+        if self.parent is not None:
+            return self.parent.intern(typ)
+        existing = self._types.get(typ.name)
+        if existing is None:
+            self.own("_types")
+            existing = self._types[typ.name] = typ
+        return existing
 
     def create_local(self, name: str, type: Type | None):
         if type is None:
             type = self.default_type
-        typeset = self.variables.setdefault(name, {})
-        if type in typeset:
+        self.own("variables")
+        var = Variable(sys.intern(name), type)
+        if self.variables.setdefault((var.name, type), var) is not var:
+            raise ParseError("Duplicate variable")
+        if self.by_name is not None:
+            self.by_name.setdefault(var.name, []).append(var)
+        return var
+
+    def declare(self, name: str, type: Type):
+        """
+        Create a variable declared AS type, so that name without a sigil
+        refers to it.
+        """
+        if name in self.declared:
             raise ParseError("Duplicate variable")
-        typeset[type] = Variable(name, type)
-        return typeset[type]
+        var = self.create_local(name, type)
+        self.own("declared")
+        self.declared[name] = var
+        return self.declared[name]
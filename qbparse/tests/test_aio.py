@@ -0,0 +1,99 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Event
+
+from pytest import raises
+
+import qbparse
+from qbparse import parse
+from qbparse.aio import AsyncParser, aparse, aparse_many
+from qbparse.serialize import dumps
+
+SOURCES = ["x = 1\n", "? 2\n", 'y$ = "a"\nsub s\nend sub\n']
+
+
+def test_aparse():
+    async def main():
+        return await aparse(SOURCES[0]), await aparse_many(SOURCES, recover=True)
+
+    program, programs = asyncio.run(main())
+    assert dumps(program) == dumps(parse(SOURCES[0]))
+    assert [dumps(p) for p in programs] == [dumps(parse(s)) for s in SOURCES]
+    assert qbparse.aparse is aparse
+
+
+def test_coalesced():
+    async def main():
+        parser = AsyncParser(limit=1)
+        programs = await asyncio.gather(
+            parser.parse(SOURCES[0]), parser.parse(SOURCES[0]), parser.parse("z = 3")
+        )
+        assert not parser.jobs
+        return programs
+
+    first, second, third = asyncio.run(main())
+    assert first is second
+    assert third is not first
+
+
+def test_cancelled():
+    started = Event()
+    release = Event()
+
+    class Blocking(ThreadPoolExecutor):
+        def submit(self, fn, /, *args, **kwargs):  # type: ignore[override]
+            def run():
+                started.set()
+                release.wait(5)
+                return fn(*args, **kwargs)
+
+            return super().submit(run)
+
+    async def main():
+        parser = AsyncParser(Blocking(1))
+        waiter = asyncio.ensure_future(parser.parse(SOURCES[0]))
+        other = asyncio.ensure_future(parser.parse(SOURCES[0]))
+        await asyncio.to_thread(started.wait, 5)
+        (job,) = parser.jobs.values()
+        waiter.cancel()
+        await asyncio.sleep(0)
+        # Another task still waits, so the parse carries on
+        assert job.cancel is not None and not job.cancel.cancelled
+        other.cancel()
+        await asyncio.sleep(0)
+        assert job.cancel.cancelled
+        release.set()
+        for task in other, job.task:
+            with raises(asyncio.CancelledError):
+                await task
+        assert not parser.jobs
+
+    asyncio.run(main())
+
+
+def test_request_after_cancel():
+    async def main():
+        parser = AsyncParser()
+        waiter = asyncio.ensure_future(parser.parse(SOURCES[0]))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        assert waiter.cancelled()
+        # Not joined to the stopped parse
+        program = await parser.parse(SOURCES[0])
+        assert not parser.jobs
+        return program
+
+    assert dumps(asyncio.run(main())) == dumps(parse(SOURCES[0]))
+
+
+def test_process_pool():
+    async def main():
+        with ProcessPoolExecutor(1) as pool:
+            parser = AsyncParser(pool)
+            with raises(ValueError):
+                await parser.parse(SOURCES[2], lazy=True)
+            return await parser.parse_many(SOURCES)
+
+    programs = asyncio.run(main())
+    assert [dumps(p) for p in programs] == [dumps(parse(s)) for s in SOURCES]
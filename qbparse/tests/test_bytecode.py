@@ -0,0 +1,88 @@
+import ast
+from io import StringIO
+
+from pytest import mark, raises
+
+from qbparse import parse
+from qbparse.bytecode import CompiledProgram, compile_source
+from qbparse.interpreter import Interpreter
+from qbparse.runtime import QBError
+
+PROGRAMS = [
+    "? 1 + 2 * 3; 7 \\ 2; -7 mod 3; 2 ^ 10; 1 / 3; 1d0 / 3; -0.5; 1e20",
+    '? 3 > 2; not 0; 5 and 3 or 8; 1 imp 0; 1 eqv 0; "a" + "b"; "a" < "b"',
+    "a% = 32767\na% = a% + 1\nb~%% = -1\nc& = 2.5\nd& = 3.5\n? a%; b~%%; c&; d&",
+    'a$ = "x"\nif a$ = "x" then ? a$, 1, "zones"',
+    "if x = 1 then\n? 1\nelseif x = 0 then\n? 0\nelse\n? 3\nend if",
+    "10 i = i + 1\nif i < 5 then goto 10\nif 1 then goto 20\n? 0\n20 ? i * 2",
+]
+
+
+def run(input: str) -> str:
+    out = StringIO()
+    CompiledProgram(parse(input)).run(out)
+    return out.getvalue()
+
+
+@mark.parametrize("source", PROGRAMS)
+def test_matches_interpreter(source: str):
+    out = StringIO()
+    Interpreter(parse(source)).run(out)
+    assert run(source) == out.getvalue()
+
+
+def test_generated_code():
+    compiled = CompiledProgram(parse("x& = 1\nif x& > 0 then y = x& else y = -x&"))
+    (function,) = compiled.tree.body
+    assert isinstance(function, ast.FunctionDef)
+    code = ast.unparse(function)
+    assert "v0 > 0" in code
+    assert "else:" in code
+    # Variables are plain locals
+    assert {"v0", "v1"} <= set(compiled.function.__code__.co_varnames)
+
+
+def test_integer_wrapping():
+    assert run("a~%% = 255\na~%% = a~%% + 2\n? a~%%") == " 1 \n"
+    assert run("a%% = -128\na%% = a%% - 1\n? a%%") == " 127 \n"
+    assert run("a& = &H7FFFFFFF&\na& = a& + 1\n? a&") == "-2147483648 \n"
+
+
+def test_errors():
+    raises(QBError, run, "? 1 / 0")
+    raises(QBError, run, '? 1 + "a"')
+    raises(QBError, run, 'x = "a" * 2')
+    raises(QBError, CompiledProgram, parse("if 1 then\n10 ? 1\nend if"))
+
+
+def test_internal_errors_propagate():
+    # Type mismatches are raised by the operators; any other TypeError is a
+    # bug in the generated code, and is not hidden as one
+    compiled = CompiledProgram(parse("? 1"))
+
+    def broken(output: object):
+        raise TypeError("broken")
+
+    compiled.function = broken
+    with raises(TypeError, match="broken"):
+        compiled.run(StringIO())
+    with raises(QBError, match="Type mismatch"):
+        run('x = "a" * 2')
+
+
+def test_cache():
+    source = "? 1"
+    compiled = compile_source(source)
+    assert compile_source("? 1") is compiled
+    assert compile_source(source.encode()) is not compiled
+    out = StringIO()
+    compiled.run(out)
+    assert out.getvalue() == " 1 \n"
+
+
+def test_fractional_power_of_negative():
+    source = "? (-8) ^ (1 / 3)"
+    with raises(QBError, match="Illegal function call"):
+        run(source)
+    with raises(QBError, match="Illegal function call"):
+        Interpreter(parse(source)).run(StringIO())
@@ -0,0 +1,66 @@
+from time import monotonic
+
+from pytest import raises
+
+from qbparse import parse
+from qbparse.context import CHECK_INTERVAL, CancelToken, ParseContext
+from qbparse.errors import Cancelled, DeadlineExceeded
+from qbparse.symbols import SymbolStore
+
+# Four tokens a line
+SOURCE = "x = 1\n" * CHECK_INTERVAL
+
+
+class CancelAfter(CancelToken):
+    """
+    Cancelled once checked a number of times.
+    """
+
+    def __init__(self, checks: int):
+        super().__init__()
+        self.checks = checks
+
+    @property
+    def cancelled(self) -> bool:
+        self.checks -= 1
+        return self.checks < 0
+
+    @cancelled.setter
+    def cancelled(self, value: bool):
+        pass
+
+
+def test_cancelled():
+    token = CancelToken()
+    token.cancel()
+    with raises(Cancelled):
+        parse(SOURCE, cancel=token)
+    with raises(DeadlineExceeded):
+        parse(SOURCE, deadline=monotonic() - 1)
+
+
+def test_not_cancelled():
+    program = parse(SOURCE, cancel=CancelToken(), deadline=monotonic() + 60)
+    assert not program.cancelled
+    impl = program.globals.procedures["_main"].impl
+    assert impl is not None and len(impl.statements) == CHECK_INTERVAL
+
+
+def test_partial_in_recovery_mode():
+    with raises(Cancelled):
+        parse(SOURCE, cancel=CancelAfter(2))
+    program = parse(SOURCE, recover=True, cancel=CancelAfter(2))
+    assert program.cancelled
+    impl = program.globals.procedures["_main"].impl
+    assert impl is not None
+    # Checked on starting, then every CHECK_INTERVAL tokens
+    assert 0 < len(impl.statements) < CHECK_INTERVAL
+
+
+def test_sub_bodies_are_watched():
+    token = CancelToken()
+    ctx = ParseContext("sub s\nend sub\n", SymbolStore())
+    ctx.watch(token, None)
+    assert ctx.spawn(SymbolStore(), 6, 2).cancel is token
+    ctx.lazy = True
+    assert ctx.spawn(SymbolStore(), 6, 2).cancel is None
@@ -0,0 +1,108 @@
+from qbparse import parse
+from qbparse.ast import Assignment, Expr, Goto, If, Label, Node, Print
+from qbparse.cfg import control_flow
+
+
+def run(input: str):
+    impl = parse(input).globals.procedures["_main"].impl
+    assert impl is not None
+    return impl
+
+
+def kinds(nodes: list[Node]):
+    return [type(n).__name__ for n in nodes]
+
+
+def edges(input: str):
+    cfg = control_flow(run(input))
+    return {b: list(cfg.successors(b)) for b in range(len(cfg))}
+
+
+def test_straight_line():
+    cfg = control_flow(run("x = 1\n? x\n"))
+    assert len(cfg) == 2
+    assert kinds(cfg.block(cfg.entry)) == ["Assignment", "Print"]
+    assert cfg.block(cfg.exit) == []
+    assert list(cfg.successors(cfg.entry)) == [cfg.exit]
+    assert list(cfg.predecessors(cfg.exit)) == [cfg.entry]
+
+
+def test_if_elseif_else():
+    source = "if x then\n? 1\nelseif y then\n? 2\nelse\n? 3\nend if\n? 4"
+    cfg = control_flow(run(source))
+    # entry(If), then, elseif guard, elseif body, else, join(? 4), exit
+    assert [kinds(cfg.block(b)) for b in range(len(cfg))] == [
+        ["If"],
+        ["Print"],
+        ["Var"],
+        ["Print"],
+        ["Print"],
+        ["Print"],
+        [],
+    ]
+    assert isinstance(cfg.block(2)[0], Expr)
+    assert edges(source) == {
+        0: [1, 2],
+        1: [5],
+        2: [3, 4],
+        3: [5],
+        4: [5],
+        5: [6],
+        6: [],
+    }
+
+
+def test_if_without_else():
+    assert edges("if x then ? 1\n? 2") == {0: [1, 2], 1: [2], 2: [3], 3: []}
+
+
+def test_goto():
+    source = "10 x = 1\nif x then goto 20\ngoto 10\n20 ? x"
+    impl = run(source)
+    cfg = control_flow(impl)
+    label_10, label_20 = impl.labels["10"], impl.labels["20"]
+    b10 = cfg.block_containing(label_10)
+    b20 = cfg.block_containing(label_20)
+    (goto_back,) = [s for s in impl.statements if isinstance(s, Goto)]
+    back = cfg.block_containing(goto_back)
+    assert b10 in cfg.successors(back)
+    # The forward GOTO inside the IF
+    inner = cfg.block_containing(impl.find(If).find(Goto))
+    assert b20 in cfg.successors(inner)
+    assert isinstance(cfg.block(b20)[0], Label)
+    assert kinds(cfg.block(b10)) == ["Label", "Assignment", "If"]
+
+
+def test_goto_in_branch():
+    source = "10 ? 1\nif x then goto 10 else y = 1\n? y"
+    cfg = control_flow(run(source))
+    # entry(Label, Print, If), then(Goto), after the GOTO, else, join, exit
+    assert [kinds(cfg.block(b)) for b in range(len(cfg))] == [
+        ["Label", "Print", "If"],
+        ["Goto"],
+        [],
+        ["Assignment"],
+        ["Print"],
+        [],
+    ]
+    # The empty block after the GOTO is unreachable, so the join is only
+    # entered from the ELSE branch
+    assert list(cfg.predecessors(4)) == [3]
+    assert list(cfg.predecessors(2)) == []
+    assert list(cfg.successors(2)) == []
+    assert list(cfg.successors(1)) == [0]
+
+
+def test_unreachable_code():
+    assert edges("goto 10\n? 1\n10 ? 2") == {0: [2], 1: [], 2: [3], 3: []}
+
+
+def test_cached_until_invalidated():
+    impl = run("x = 1")
+    cfg = control_flow(impl)
+    assert control_flow(impl) is cfg
+    impl.statements.append(Print())
+    impl.invalidate()
+    assert kinds(control_flow(impl).block(0)) == ["Assignment", "Print"]
+    impl.statements = [impl.statements[0]]
+    assert control_flow(impl).block(0) == [impl.find(Assignment)]
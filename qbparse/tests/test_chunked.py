@@ -0,0 +1,83 @@
+from pytest import MonkeyPatch
+
+from qbparse import chunked, parse
+from qbparse.chunked import chunk_bounds, lex_chunks, lex_parallel
+from qbparse.lexer import Lexer, Tokens
+from qbparse.serialize import dumps
+
+SOURCE = """10 x = 1 + _
+  2
+? "a"; x ' comment
+rem remark
+label: y$ = "b" _
+ + "c"
+if x then goto 10 else ? &HFF&, 1.5d0
+"""
+
+
+def sequential(input: str | bytes):
+    lexer = Lexer(binary=isinstance(input, bytes))
+    lexer.input(input)
+    return [(t.type, t.value, t.lineno, t.lexpos, lexer.lexpos) for t in lexer]
+
+
+def stitched(input: str | bytes, bounds: list[int], jobs: int):
+    return [
+        (t.type, t.value, t.lineno, t.lexpos, t.endpos)
+        for t in lex_chunks(input, bounds, jobs).tokens
+    ]
+
+
+def test_bounds_avoid_line_joins():
+    source = SOURCE * 10
+    for chunks in range(1, 40):
+        bounds = chunk_bounds(source, chunks)
+        assert bounds[0] == 0 and bounds[-1] == len(source)
+        assert bounds == sorted(set(bounds))
+        for bound in bounds[1:-1]:
+            assert source[bound - 1] == "\n"
+            assert not source[:bound].rstrip().endswith("_")
+
+
+def test_matches_sequential():
+    source = SOURCE * 10
+    expected = sequential(source)
+    for chunks in (2, 7, 30):
+        assert stitched(source, chunk_bounds(source, chunks), 1) == expected
+    binary = source.encode()
+    assert stitched(binary, chunk_bounds(binary, 5), 1) == sequential(binary)
+
+
+def test_worker_processes():
+    source = SOURCE * 10
+    bounds = chunk_bounds(source, 4)
+    assert len(bounds) == 5
+    # Types in token values come back as the builtin objects
+    assert stitched(source, bounds, 2) == sequential(source)
+
+
+def test_small_input():
+    assert [t.type for t in lex_parallel("? 1", jobs=4).tokens] == [
+        "KEYWORD",
+        "INT_LIT",
+    ]
+
+
+def test_same_tokens():
+    source = SOURCE * 10
+    expected = Tokens(source)
+    tokens = lex_chunks(source, chunk_bounds(source, 7), 1)
+    assert (tokens.length, tokens.lineno) == (expected.length, expected.lineno)
+    assert tokens.starts == expected.starts
+
+
+def test_parse_in_parallel(monkeypatch: MonkeyPatch):
+    # Repeated labels are errors, which are compared too
+    source = SOURCE * 10 + "sub s\n? 1\nend sub\n"
+    monkeypatch.setattr(chunked, "lex_chunks", None)
+    # Parsing is sequential unless jobs is given
+    expected = dumps(parse(source, recover=True, cached=False))
+    monkeypatch.undo()
+    monkeypatch.setattr(chunked, "MIN_CHUNK_SIZE", 64)
+    monkeypatch.setattr(chunked.os, "cpu_count", lambda: 3)
+    assert dumps(parse(source, recover=True, cached=False, jobs=0)) == expected
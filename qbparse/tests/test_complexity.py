@@ -0,0 +1,142 @@
+"""
+Adversarial inputs for the lexer and parser. Each case is run at two input
+sizes; a construct whose cost grows faster than linearly fails the ratio check.
+
+Cost is counted as Python and C function calls, which does not depend on the
+machine. The lexer's regular expressions run within a single call, so
+backtracking only shows in the time: lexer cases are also timed, taking the
+best of several runs, against a bound between linear and quadratic growth.
+Processor time is used, so that other processes on a loaded machine do not
+count.
+"""
+
+import sys
+from collections.abc import Callable
+from contextlib import suppress
+from time import process_time
+
+from pytest import mark
+
+from qbparse import parse
+from qbparse.errors import ParseError
+from qbparse.lexer import Lexer
+
+LEX_SIZE = 4000
+PARSE_SIZE = 1000
+SCALE = 4
+# Calls grow by SCALE for a linear construct, plus a little for fixed costs
+MAX_CALL_GROWTH = SCALE * 1.25
+# Time grows by at most TIME_SCALE for a linear construct, and by about 50 for
+# a quadratic one at these sizes; the bound leaves room for timer noise on
+# either side
+TIME_SIZE = 1000
+TIME_SCALE = 8
+MAX_TIME_GROWTH = TIME_SCALE * 3
+REPEATS = 5
+
+
+def lex_all(text: str):
+    lex = Lexer()
+    lex.input(text)
+    for _ in lex:
+        pass
+
+
+def parse_all(text: str):
+    with suppress(ParseError):
+        parse(text)
+
+
+def count_calls(run: Callable[[str], None], text: str) -> int:
+    calls = 0
+
+    def profile(frame, event, arg):
+        nonlocal calls
+        if event == "call" or event == "c_call":
+            calls += 1
+
+    sys.setprofile(profile)
+    try:
+        run(text)
+    finally:
+        sys.setprofile(None)
+    return calls
+
+
+def best_time(text: str) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = process_time()
+        lex_all(text)
+        best = min(best, process_time() - start)
+    return best
+
+
+def check_linear(run: Callable[[str], None], make: Callable[[int], str], size: int):
+    # Warm up regex and lexer construction caches
+    run(make(1))
+    small = count_calls(run, make(size))
+    large = count_calls(run, make(size * SCALE))
+    assert large / small < MAX_CALL_GROWTH
+
+
+def check_linear_time(make: Callable[[int], str]):
+    lex_all(make(1))
+    small = best_time(make(TIME_SIZE))
+    large = best_time(make(TIME_SIZE * TIME_SCALE))
+    assert large / max(small, 1e-6) < MAX_TIME_GROWTH
+
+
+LEX_CASES: dict[str, Callable[[int], str]] = {
+    "long_id": lambda n: "? " + "a" * n,
+    "id_dots": lambda n: "? a" + "." * n + "a",
+    "id_dots_underscores": lambda n: "? a" + "._" * n + "a",
+    "id_trailing_underscores": lambda n: "? a" + "_" * n,
+    "id_trailing_dots": lambda n: "? a" + "." * n,
+    "label_no_colon": lambda n: "a" + "._" * n + "a",
+    "line_num_digits": lambda n: "1" * n + "a",
+    "digit_run": lambda n: "? " + "1" * n,
+    "decimal_run": lambda n: "? ." + "1" * n,
+    "mantissa_run": lambda n: "? 1." + "1" * n,
+    "exponent_run": lambda n: "? 1e" + "1" * n,
+    "float_exponent_run": lambda n: "? 1f" + "1" * n,
+    "hex_run": lambda n: "? &H" + "F" * n,
+    "invalid_chars": lambda n: "? " + "@" * n,
+    "invalid_chars_between_ids": lambda n: "? " + "@x" * n,
+    "underscores": lambda n: "? " + "_" * n,
+    "comment_line": lambda n: "'" + "x" * n,
+    "remark_line": lambda n: "rem " + "x" * n,
+    "string_line": lambda n: '? "' + "x" * n + '"',
+    "unterminated_string": lambda n: '? "' + "x" * n,
+    "punctuation_line": lambda n: "? " + "+-" * n,
+    "line_joins": lambda n: "x = 1" + " _\n+ 1" * n,
+    "empty_line_joins": lambda n: "_\n" * n,
+}
+
+PARSE_CASES: dict[str, Callable[[int], str]] = {
+    "long_sum": lambda n: "? 1" + " + 1" * n,
+    "long_print_list": lambda n: "? 1" + ", 1" * n,
+    "many_statements": lambda n: "x = 1\n" * n,
+    "many_variables": lambda n: "".join(f"v{i} = {i}\n" for i in range(n)),
+    "joined_expression": lambda n: "x = 1" + " _\n+ 1" * n,
+    "single_line_ifs": lambda n: "if 1 then ? 1\n" * n,
+    "long_id_assignment": lambda n: "a" + "._" * n + "a = 1",
+}
+
+
+@mark.parametrize("make", LEX_CASES.values(), ids=LEX_CASES.keys())
+def test_lex_linear(make: Callable[[int], str]):
+    check_linear(lex_all, make, LEX_SIZE)
+    check_linear_time(make)
+
+
+@mark.parametrize("make", PARSE_CASES.values(), ids=PARSE_CASES.keys())
+def test_parse_linear(make: Callable[[int], str]):
+    check_linear(parse_all, make, PARSE_SIZE)
+
+
+def test_long_digit_runs_are_errors():
+    for text in ["1" * 5000, "1" * 5000 + "f", "1f" + "1" * 5000]:
+        lex = Lexer()
+        lex.input("? " + text)
+        assert [t.type for t in lex] == ["KEYWORD", "ERROR"]
@@ -0,0 +1,88 @@
+from pytest import mark, raises
+
+from qbparse import parse
+from qbparse.ast import Assignment, BinOp, Expr, Var
+from qbparse.datatypes import BUILTIN_TYPES, FixedWidthType
+from qbparse.errors import ParseError
+from qbparse.inference import ExprTypes, expression_types
+from qbparse.symbols import Variable
+
+
+def rval(source: str) -> Expr:
+    impl = parse(f"y = {source}").globals.procedures["_main"].impl
+    assert impl is not None
+    assignment = impl.find(Assignment)
+    assert isinstance(assignment, Assignment)
+    return assignment.rval
+
+
+def type_name(source: str) -> str:
+    return ExprTypes()[rval(source)].name
+
+
+@mark.parametrize(
+    "source, expected",
+    [
+        ("a% + b%", "integer"),
+        ("a% + b&", "long"),
+        ("a%% * b~%%", "_unsigned _byte"),
+        ("a& - b~&", "_unsigned long"),
+        ("a% + b!", "single"),
+        # A float operand decides, as in QBasic: LONG + SINGLE is SINGLE
+        ("a& + b!", "single"),
+        ("a&& * b!", "single"),
+        ("a~& - b#", "double"),
+        ("a# * b##", "_float"),
+        ("a% / b%", "single"),
+        ("a&& / b%", "double"),
+        ("a% ^ 2", "single"),
+        ("a& / b!", "single"),
+        ("a& ^ b%", "double"),
+        ("a! \\ b%", "long"),
+        ("a% mod b&&", "_integer64"),
+        ("a! and b%%", "long"),
+        ("not a%%", "_byte"),
+        ("-a~%", "_unsigned integer"),
+        ("a$ + b$", "string"),
+        ("a$ < b$", "integer"),
+        ("a# = b#", "integer"),
+    ],
+)
+def test_promotion(source: str, expected: str):
+    assert type_name(source) == expected
+
+
+def test_fixed_width():
+    bits = Var(Variable("a", FixedWidthType.of_bit(3)))
+    byte = Var(Variable("b", BUILTIN_TYPES["_byte"]))
+    assert ExprTypes()[BinOp("+", bits, byte)].name == "_byte"
+    wide = Var(Variable("c", FixedWidthType.of_unsigned_bit(12)))
+    assert ExprTypes()[BinOp("*", byte, wide)] == FixedWidthType.of_unsigned_bit(12)
+
+
+def test_type_mismatch():
+    raises(ParseError, type_name, "a$ + 1")
+    raises(ParseError, type_name, "a$ * b$")
+    raises(ParseError, type_name, "-a$")
+
+
+def test_memoized_per_body():
+    impl = parse("x% = a% + b% * c%").globals.procedures["_main"].impl
+    assert impl is not None
+    types = expression_types(impl)
+    assert expression_types(impl) is types
+    assignment = impl.find(Assignment)
+    assert isinstance(assignment, Assignment)
+    types[assignment.rval]
+    # Every node below the root was typed by the one query
+    assert len(types) == 5
+    product = assignment.rval.find(BinOp, {"name": "*"})
+    assert isinstance(product, BinOp)
+    assert types[product].name == "integer"
+    assert len(types) == 5
+    impl.invalidate()
+    assert expression_types(impl) is not types
+
+
+def test_deep_tree():
+    assert type_name("a%" + " + a&" * 20000) == "long"
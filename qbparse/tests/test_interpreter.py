@@ -0,0 +1,116 @@
+import tracemalloc
+from io import StringIO
+
+from pytest import mark, raises
+
+from qbparse import parse
+from qbparse.interpreter import Interpreter
+from qbparse.runtime import LINE_BUFFER, Output, QBError
+
+
+def run(input: str) -> str:
+    out = StringIO()
+    Interpreter(parse(input)).run(out)
+    return out.getvalue()
+
+
+@mark.parametrize(
+    "expr, expected",
+    [
+        ("1 + 2 * 3", " 7 "),
+        ("7 \\ 2", " 3 "),
+        ("-7 \\ 2", "-3 "),
+        ("-7 mod 3", "-1 "),
+        ("2 ^ 10", " 1024 "),
+        ("1 / 4", " .25 "),
+        ("1 / 3", " .3333333 "),
+        ("1d0 / 3", " .3333333333333333 "),
+        ("1e20", " 1E+20 "),
+        ("-0.5", "-.5 "),
+        ("3 > 2", "-1 "),
+        ("not 0", "-1 "),
+        ("5 and 3 or 8", " 9 "),
+        ('"a" + "b"', "ab"),
+        ('"a" < "b"', "-1 "),
+    ],
+)
+def test_expressions(expr: str, expected: str):
+    assert run(f"? {expr};") == expected
+
+
+def test_assignment_fits_type():
+    source = 'a% = 32767\na% = a% + 1\nb~%% = -1\nc& = 2.5\nd& = 3.5\ne$ = "x"\n'
+    assert run(source + "? a%; b~%%; c&; d&; e$") == "-32768  255  2  4 x\n"
+
+
+def test_print_zones():
+    assert run('? 1, "ab", 2\n?') == " 1            ab             2 \n\n"
+
+
+def test_if_chain():
+    source = "if x = 1 then\n? 1\nelseif x = 2 then\n? 2\nelse\n? 3\nend if\n"
+    assert run(source) == " 3 \n"
+    assert run("x = 2\n" + source) == " 2 \n"
+    assert run("x = 1\n" + source) == " 1 \n"
+
+
+def test_goto_loop():
+    source = "10 i = i + 1\nif i < 5 then goto 10\n? i\n"
+    # Out of a nested block
+    source += "if 1 then\ngoto 20\nend if\n? 0\n20 ? i * 2"
+    assert run(source) == " 5 \n 10 \n"
+
+
+def test_goto_loop_memory():
+    interpreter = Interpreter(parse("10 i& = i& + 1\nif i& < 20000 then goto 10"))
+    tracemalloc.start()
+    try:
+        interpreter.run(StringIO())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # Not proportional to the number of jumps
+    assert peak < 1_000_000
+
+
+def test_runs_are_independent():
+    interpreter = Interpreter(parse("i = i + 1\n? i"))
+    for _ in range(2):
+        out = StringIO()
+        interpreter.run(out)
+        assert out.getvalue() == " 1 \n"
+
+
+def test_errors():
+    raises(QBError, run, "? 1 / 0")
+    raises(QBError, run, '? 1 + "a"')
+    raises(QBError, run, "if 1 then\n10 ? 1\nend if\ngoto 10")
+    # Output before the error is still written
+    out = StringIO()
+    with raises(QBError):
+        Interpreter(parse("? 1\n? 1 \\ 0")).run(out)
+    assert out.getvalue() == " 1 \n"
+
+
+def test_fractional_power_of_negative():
+    with raises(QBError, match="Illegal function call"):
+        run("? (-8) ^ (1 / 3)")
+    assert run("? (-8) ^ 3") == "-512 \n"
+
+
+def test_output_written_per_line():
+    writes: list[str] = []
+
+    class Recorder(StringIO):
+        def write(self, s: str) -> int:
+            writes.append(s)
+            return super().write(s)
+
+    Interpreter(parse('? 1\n? "a";\n? "b"')).run(Recorder())
+    assert [w for w in writes if w] == [" 1 \n", "ab\n"]
+    out = StringIO()
+    output = Output(out)
+    output.write("x" * (LINE_BUFFER - 1))
+    assert out.getvalue() == ""
+    output.write("x")
+    assert len(out.getvalue()) == LINE_BUFFER
@@ -0,0 +1,49 @@
+import tracemalloc
+from pathlib import Path
+
+from pytest import raises
+
+from qbparse import iter_statements, parse
+from qbparse.ast import Print
+from qbparse.errors import ParseError
+
+SOURCE = 'x = 1\nprint "a", x\nif x then ? 1 else ? 2\n'
+
+
+def test_matches_parse():
+    impl = parse(SOURCE).globals.procedures["_main"].impl
+    assert impl is not None
+    assert list(iter_statements(SOURCE)) == impl.statements
+
+
+def test_files(tmp_path: Path):
+    path = tmp_path / "test.bas"
+    path.write_bytes(SOURCE.encode())
+    expected = list(iter_statements(SOURCE))
+    assert list(iter_statements(path)) == expected
+    with open(path, "rb") as file:
+        assert list(iter_statements(file)) == expected
+
+
+def test_incremental():
+    statements = iter_statements("? 1\n? 2 +\n")
+    assert isinstance(next(statements), Print)
+    with raises(ParseError) as info:
+        next(statements)
+    assert (info.value.line, info.value.column) == (2, 6)
+
+
+def test_bounded_memory(tmp_path: Path):
+    path = tmp_path / "large.bas"
+    path.write_bytes(SOURCE.encode() * 5000)
+    # Warm up lexer construction
+    next(iter_statements(path))
+    tracemalloc.start()
+    try:
+        count = sum(isinstance(s, Print) for s in iter_statements(path))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert count == 5000
+    # Parsing the whole program would hold several megabytes
+    assert peak < 500_000
@@ -1,8 +1,9 @@
 from dataclasses import dataclass
 from typing import Any
 
+from qbparse.context import ParseContext
 from qbparse.datatypes import BUILTIN_TYPES, TypeSignature
-from qbparse.lexer import Lexer
+from qbparse.lexer import Lexer, TokenCache, Tokens, tokenize
 from qbparse.symbols import Procedure, SymbolStore
 
 SINGLE = BUILTIN_TYPES["single"]
@@ -15,10 +16,8 @@ class Token:
     lineno: int | None = None
 
 
-def check(
-    text: str, expecteds: Token | list[Token], symbols: SymbolStore | None = None
-):
-    lex = Lexer(symbols if symbols else SymbolStore())
+def check(text: str, expecteds: Token | list[Token]):
+    lex = Lexer()
     lex.input(text)
     actuals = list(lex)
     if isinstance(expecteds, Token):
@@ -86,7 +85,7 @@ def test_base_lit_type_detection():
 def test_base_lit_explicit_bitn():
     def check_bitn(input: str, value: int, sigil: str):
         symbols = SymbolStore()
-        lex = Lexer(symbols)
+        lex = Lexer()
         lex.input("? " + input)
         actuals = list(lex)
         assert len(actuals) == 2
@@ -208,7 +207,12 @@ def test_keyword():
     check("?", Token("KEYWORD", "?"))
     check("if", Token("KEYWORD", "if"))
     check("if%", Token("ERROR"))
-    check("if$", Token("ID", ("if", BUILTIN_TYPES["string"])))
+    check("if$", Token("ID", ("if", "$")))
+
+
+def resolve(text: str, symbols: SymbolStore | None = None) -> Token:
+    ctx = ParseContext(text, symbols if symbols else SymbolStore())
+    return Token(ctx.tok.type, ctx.tok.value)
 
 
 def test_procedure():
@@ -218,54 +222,100 @@ def test_procedure():
     symbols.procedures["a_sub"] = a_sub
     symbols.procedures["a_function"] = a_function
 
-    check("a_sub", Token("PROCEDURE", a_sub), symbols)
-    check("a_sub!", Token("ERROR"), symbols)
-    check("a_function", Token("PROCEDURE", a_function), symbols)
-    check("a_function$", Token("PROCEDURE", a_function), symbols)
-    check("a_function!", Token("ERROR"), symbols)
+    assert resolve("a_sub", symbols) == Token("PROCEDURE", a_sub)
+    assert resolve("a_sub!", symbols).type == "ERROR"
+    assert resolve("a_function", symbols) == Token("PROCEDURE", a_function)
+    assert resolve("a_function$", symbols) == Token("PROCEDURE", a_function)
+    assert resolve("a_function!", symbols).type == "ERROR"
+    # The lexer itself knows nothing of procedures
+    check("a_sub!", Token("ID", ("a_sub", "!")))
+
+
+def test_variable():
+    symbols = SymbolStore()
+    x = symbols.create_local("x", BUILTIN_TYPES["integer"])
+    assert resolve("x%", symbols) == Token("VARIABLE", x)
+    assert resolve("x", symbols) == Token("ID", ("x", SINGLE))
 
 
 def test_id():
-    check("Foo", Token("ID", ("foo", SINGLE)))
-    check("Foo_bar", Token("ID", ("foo_bar", SINGLE)))
-    check("_foo", Token("ID", ("_foo", SINGLE)))
-    check("foo23x", Token("ID", ("foo23x", SINGLE)))
-    check("foo.bar", Token("ID", ("foo.bar", SINGLE)))
+    check("Foo", Token("ID", ("foo", None)))
+    check("Foo_bar", Token("ID", ("foo_bar", None)))
+    check("_foo", Token("ID", ("_foo", None)))
+    check("foo23x", Token("ID", ("foo23x", None)))
+    check("foo.bar", Token("ID", ("foo.bar", None)))
+    check("foo~&&", Token("ID", ("foo", "~&&")))
+    check("foo$10", Token("ID", ("foo", "$10")))
+    assert resolve("Foo") == Token("ID", ("foo", SINGLE))
 
 
 def test_id_builtin_sigil():
-    check("foo`", Token("ID", ("foo", BUILTIN_TYPES["_bit"])))
-    check("foo%%", Token("ID", ("foo", BUILTIN_TYPES["_byte"])))
-    check("foo%", Token("ID", ("foo", BUILTIN_TYPES["integer"])))
-    check("foo&", Token("ID", ("foo", BUILTIN_TYPES["long"])))
-    check("foo&&", Token("ID", ("foo", BUILTIN_TYPES["_integer64"])))
-    # check("foo%&", Token("ID", ("foo", BUILTIN_TYPES["_offset"])))
-    check("foo~`", Token("ID", ("foo", BUILTIN_TYPES["_unsigned _bit"])))
-    check("foo~%%", Token("ID", ("foo", BUILTIN_TYPES["_unsigned _byte"])))
-    check("foo~%", Token("ID", ("foo", BUILTIN_TYPES["_unsigned integer"])))
-    check("foo~&", Token("ID", ("foo", BUILTIN_TYPES["_unsigned long"])))
-    check("foo~&&", Token("ID", ("foo", BUILTIN_TYPES["_unsigned _integer64"])))
-    # check("foo~%&", Token("ID", ("foo", BUILTIN_TYPES["_unsigned _offset"])))
-    check("foo!", Token("ID", ("foo", BUILTIN_TYPES["single"])))
-    check("foo#", Token("ID", ("foo", BUILTIN_TYPES["double"])))
-    check("foo##", Token("ID", ("foo", BUILTIN_TYPES["_float"])))
-    check("foo$", Token("ID", ("foo", BUILTIN_TYPES["string"])))
+    def check_sigil(input: str, type_name: str):
+        assert resolve(input) == Token("ID", ("foo", BUILTIN_TYPES[type_name]))
+
+    check_sigil("foo`", "_bit")
+    check_sigil("foo%%", "_byte")
+    check_sigil("foo%", "integer")
+    check_sigil("foo&", "long")
+    check_sigil("foo&&", "_integer64")
+    # check_sigil("foo%&", "_offset")
+    check_sigil("foo~`", "_unsigned _bit")
+    check_sigil("foo~%%", "_unsigned _byte")
+    check_sigil("foo~%", "_unsigned integer")
+    check_sigil("foo~&", "_unsigned long")
+    check_sigil("foo~&&", "_unsigned _integer64")
+    # check_sigil("foo~%&", "_unsigned _offset")
+    check_sigil("foo!", "single")
+    check_sigil("foo#", "double")
+    check_sigil("foo##", "_float")
+    check_sigil("foo$", "string")
 
 
 def test_id_custom_sigil():
     def check_custom_sigil(input: str, type_name: str):
         symbols = SymbolStore()
-        lex = Lexer(symbols)
-        lex.input(input)
-        result = list(lex)[0]
+        result = resolve(input, symbols)
         assert result.type == "ID"
-        assert result.value == ("foo", symbols.types[type_name])
+        assert result.value[1] is symbols.types[type_name]
 
     check_custom_sigil("foo`10", "_bit * 10")
     check_custom_sigil("foo~`10", "_unsigned _bit * 10")
     check_custom_sigil("foo$10", "string * 10")
 
 
+def test_tokenize_memoized():
+    text = "x = 1\n? x\n"
+    tokens = tokenize(text, cached=True)
+    assert tokenize(text, cached=True) is tokens
+    assert tokenize(text.encode(), cached=True) is not tokens
+    # The same tokens resolve against whichever symbols they are parsed with
+    symbols = SymbolStore()
+    x = symbols.create_local("x", SINGLE)
+    assert ParseContext(tokens, SymbolStore()).tok.type == "ID"
+    assert ParseContext(tokens, symbols).tok.value is x
+    assert ParseContext(tokens, symbols, lexpos=6).tok.value == "?"
+    assert tokenize(text) is not tokens
+
+
+def test_token_cache_limit():
+    cache = TokenCache(10)
+    small = Tokens("x = 1")
+    large = Tokens("? 1, 2, 3, 4, 5, 6")
+    assert cache.put(b"small", small) is small
+    assert cache.put(b"large", large) is large
+    # Larger than the whole cache, so not kept
+    assert cache.get(b"large") is None
+    assert cache.put(b"small", Tokens("x = 1")) is small
+    for n in range(3):
+        cache.put(bytes([n]), Tokens("x = 1"))
+    assert cache.get(b"small") is None
+    assert cache.size == 9
+    cache.resize(3)
+    assert list(cache.entries) == [bytes([2])]
+    cache.clear()
+    assert cache.size == 0 and not cache.entries
+
+
 def test_check_punctuation():
     for s in [
         "<=",
@@ -309,21 +359,62 @@ def test_remark():
 def test_line_label():
     check("foo:", Token("LINE_LABEL", "foo"))
     check("foo :", Token("LINE_LABEL", "foo"))
-    check("foo: bar", [Token("LINE_LABEL", "foo"), Token("ID", ("bar", SINGLE))])
+    check("foo: bar", [Token("LINE_LABEL", "foo"), Token("ID", ("bar", None))])
     check("foo.bar23:", Token("LINE_LABEL", "foo.bar23"))
+    # Keywords are never labels
+    check("else:", [Token("KEYWORD", "else"), Token("NEWLINE", ":")])
+    check(
+        "Print: ? 1",
+        [
+            Token("KEYWORD", "print"),
+            Token("NEWLINE", ":"),
+            Token("KEYWORD", "?"),
+            Token("INT_LIT", 1),
+        ],
+    )
 
 
 def test_line_num():
     check("123", Token("LINE_NUM", "123"))
-    check("123foo", [Token("LINE_NUM", "123"), Token("ID", ("foo", SINGLE))])
-    check("123 foo", [Token("LINE_NUM", "123"), Token("ID", ("foo", SINGLE))])
+    check("123foo", [Token("LINE_NUM", "123"), Token("ID", ("foo", None))])
+    check("123 foo", [Token("LINE_NUM", "123"), Token("ID", ("foo", None))])
 
 
 def test_line_num_label():
     check("123 foo:", Token("LINE_NUM_LABEL", ("123", "foo")))
     check(
         "123foo:bar",
-        [Token("LINE_NUM_LABEL", ("123", "foo")), Token("ID", ("bar", SINGLE))],
+        [Token("LINE_NUM_LABEL", ("123", "foo")), Token("ID", ("bar", None))],
+    )
+    check(
+        "10 else:",
+        [Token("LINE_NUM", "10"), Token("KEYWORD", "else"), Token("NEWLINE", ":")],
+    )
+
+
+def test_labels_on_later_lines():
+    check(
+        "? 1\n  foo: ? 2\n' x\n10",
+        [
+            Token("KEYWORD"),
+            Token("INT_LIT"),
+            Token("NEWLINE"),
+            Token("LINE_LABEL", "foo", lineno=2),
+            Token("KEYWORD"),
+            Token("INT_LIT"),
+            Token("NEWLINE"),
+            Token("NEWLINE", "'"),
+            Token("LINE_NUM", "10", lineno=4),
+        ],
+    )
+    # Not at the start of a line
+    check(
+        "x = 1 _\n10",
+        [Token("ID"), Token("PUNCTUATION"), Token("INT_LIT"), Token("INT_LIT", 10)],
+    )
+    check(
+        "? 1: 10",
+        [Token("KEYWORD"), Token("INT_LIT"), Token("NEWLINE"), Token("INT_LIT")],
     )
 
 
@@ -339,19 +430,27 @@ def test_line_split():
 
 
 def test_line_join():
-    check(
-        "foo_\nbar", [Token("ID", ("foo", SINGLE), 1), Token("ID", ("bar", SINGLE), 2)]
-    )
-    check(
-        "foo_ \nbar", [Token("ID", ("foo", SINGLE), 1), Token("ID", ("bar", SINGLE), 2)]
-    )
-    check("foo_\n", Token("ID", ("foo", SINGLE), 1))
+    check("foo_\nbar", [Token("ID", ("foo", None), 1), Token("ID", ("bar", None), 2)])
+    check("foo_ \nbar", [Token("ID", ("foo", None), 1), Token("ID", ("bar", None), 2)])
+    check("foo_\n", Token("ID", ("foo", None), 1))
     check("_\n", [])
     check(
         "foo_\nbar_\nbaz",
         [
-            Token("ID", ("foo", SINGLE), 1),
-            Token("ID", ("bar", SINGLE), 2),
-            Token("ID", ("baz", SINGLE), 3),
+            Token("ID", ("foo", None), 1),
+            Token("ID", ("bar", None), 2),
+            Token("ID", ("baz", None), 3),
         ],
     )
+
+
+def test_binary_input():
+    text = 'x% = &H1F + 2.5e3 \' note\nprint "caf\x82", x%; y.z$ : rem\n'
+    data = text.encode("latin-1")
+    expected = Lexer()
+    expected.input(data.decode("cp437"))
+    actual = Lexer(binary=True)
+    actual.input(data)
+    assert [(t.type, t.value, t.lexpos, t.lineno) for t in actual] == [
+        (t.type, t.value, t.lexpos, t.lineno) for t in expected
+    ]
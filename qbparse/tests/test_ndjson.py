@@ -0,0 +1,103 @@
+import json
+from io import StringIO
+from pathlib import Path
+
+from pytest import raises
+
+from qbparse import iter_statements, parse
+from qbparse.ndjson import main, write_program, write_statements
+
+SOURCE = """x = 1
+if x > 1 then ? -x, "a" else x = 2
+sub f (a as long)
+    ? a
+end sub
+"""
+
+
+def test_program():
+    out = StringIO()
+    write_program(parse(SOURCE), out)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [(r["procedure"], r["kind"]) for r in records] == [
+        ("_main", "Assignment"),
+        ("_main", "If"),
+        ("f", "Print"),
+    ]
+    assert records[0] == {
+        "procedure": "_main",
+        "kind": "Assignment",
+        "start": 0,
+        "end": 5,
+        "lval": {"kind": "Var", "start": 0, "end": 1, "name": "x", "type": "single"},
+        "rval": {
+            "kind": "Constant",
+            "start": 4,
+            "end": 5,
+            "value": 1,
+            "type": "single",
+        },
+    }
+    guard = records[1]["guard"]
+    assert (guard["kind"], guard["op"]) == ("BinOp", ">")
+    assert records[1]["then"][0]["params"][0]["kind"] == "UniOp"
+    assert records[1]["else"][0]["kind"] == "Assignment"
+    assert records[2]["params"][0]["type"] == "long"
+
+
+def test_streaming():
+    out = StringIO()
+    write_statements(iter_statements("? 1\n? 2\n"), out, file="x.bas")
+    lines = out.getvalue().splitlines()
+    assert [json.loads(line)["file"] for line in lines] == ["x.bas", "x.bas"]
+
+
+def test_cli(tmp_path: Path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a.bas").write_text(SOURCE)
+    (tmp_path / "sub" / "b.BAS").write_text("? )\n? 2\n")
+    (tmp_path / "notes.txt").write_text("? 3\n")
+    output = tmp_path / "out.ndjson"
+    for jobs in ("1", "2", "0"):
+        main([str(tmp_path), "-o", str(output), "-j", jobs])
+        records = [json.loads(line) for line in output.read_text().splitlines()]
+        assert [(r["file"], r["kind"]) for r in records] == [
+            ("a.bas", "Assignment"),
+            ("a.bas", "If"),
+            ("a.bas", "Print"),
+            ("sub/b.BAS", "Print"),
+            ("sub/b.BAS", "error"),
+        ]
+        assert (records[-1]["line"], records[-1]["column"]) == (1, 3)
+    with raises(SystemExit):
+        main([str(tmp_path), "-j", "-1"])
+
+
+def test_cli_bad_files(tmp_path: Path):
+    (tmp_path / "a.bas").symlink_to(tmp_path / "missing.bas")
+    (tmp_path / "b.bas").write_text("? " + "(" * 5000 + "1" + ")" * 5000 + "\n")
+    (tmp_path / "c.bas").write_text("? 1\n")
+    output = tmp_path / "out.ndjson"
+    for jobs in ("1", "2"):
+        main([str(tmp_path), "-o", str(output), "-j", jobs])
+        records = [json.loads(line) for line in output.read_text().splitlines()]
+        assert [(r["file"], r["kind"]) for r in records] == [
+            ("a.bas", "error"),
+            ("b.bas", "error"),
+            ("c.bas", "Print"),
+        ]
+        assert records[0]["message"].startswith("FileNotFoundError")
+        assert records[1]["message"].startswith("RecursionError")
+        assert records[1]["line"] is None
+
+
+def test_infinite_constant():
+    out = StringIO()
+    write_statements(iter_statements("? " + "9" * 400 + ".0\n"), out)
+    (line,) = out.getvalue().splitlines()
+
+    def strict(constant: str):
+        raise ValueError(f"{constant} is not valid JSON")
+
+    record = json.loads(line, parse_constant=strict)
+    assert record["params"][0]["value"] == "Infinity"
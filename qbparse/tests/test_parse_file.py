@@ -0,0 +1,39 @@
+from pathlib import Path
+
+from pytest import raises
+
+from qbparse import parse, parse_file
+from qbparse.ast import Constant, Print
+from qbparse.datatypes import BUILTIN_TYPES
+from qbparse.errors import ParseError
+
+
+def test_cp437_source(tmp_path: Path):
+    data = b'x = 1\nprint "caf\x82 \xb0";\n? x + 2\n'
+    path = tmp_path / "test.bas"
+    path.write_bytes(data)
+    program = parse_file(path)
+    impl = program.globals.procedures["_main"].impl
+    assert impl is not None
+    assert impl == parse(data.decode("cp437")).globals.procedures["_main"].impl
+    assert impl.find(Print).find(Constant) == Constant(
+        "café ░", BUILTIN_TYPES["string"]
+    )
+    assert program.lines.position(data.index(b"?")) == (3, 1)
+
+
+def test_empty_file(tmp_path: Path):
+    path = tmp_path / "empty.bas"
+    path.write_bytes(b"")
+    impl = parse_file(path).globals.procedures["_main"].impl
+    assert impl is not None
+    assert impl.statements == []
+
+
+def test_errors(tmp_path: Path):
+    path = tmp_path / "bad.bas"
+    path.write_bytes(b"x = 1\n? 2 +\n")
+    with raises(ParseError) as info:
+        parse_file(path)
+    assert (info.value.line, info.value.column) == (2, 6)
+    assert len(parse_file(path, recover=True).errors) == 1
@@ -0,0 +1,82 @@
+from pytest import raises
+
+from qbparse import parse
+from qbparse.ast import Goto, Node
+from qbparse.errors import ParseError
+from qbparse.serialize import dumps, loads
+
+SOURCE = """goto skip
+10 print "a"
+skip:
+  20 again: x = 1
+if x then 10 else goto again
+goto 020
+sub s
+    goto 10
+    10 ? 2
+end sub
+"""
+
+
+def run(input: str):
+    program = parse(input)
+    impl = program.globals.procedures["_main"].impl
+    assert impl is not None
+    return program, impl
+
+
+def gotos(node: Node) -> list[Goto]:
+    return [g for g in node.find_all(Goto) if isinstance(g, Goto)]
+
+
+def test_label_table():
+    _, impl = run(SOURCE)
+    assert set(impl.labels) == {"10", "skip", "20", "again"}
+    assert impl.labels["20"] is impl.labels["again"]
+    assert impl.labels["skip"] in impl.statements
+    assert impl.labels["10"].names == ["10"]
+
+
+def test_forward_and_backward_resolution():
+    _, impl = run(SOURCE)
+    targets = [(g.name, g.target) for g in gotos(impl)]
+    assert targets == [
+        ("skip", impl.labels["skip"]),
+        ("10", impl.labels["10"]),
+        ("again", impl.labels["again"]),
+        ("20", impl.labels["20"]),
+    ]
+
+
+def test_procedure_labels_are_local():
+    program, main = run(SOURCE)
+    impl = program.globals.procedures["s"].impl
+    assert impl is not None
+    (goto,) = gotos(impl)
+    assert goto.target is impl.labels["10"]
+    assert goto.target is not main.labels["10"]
+
+
+def test_labels_only_at_line_start():
+    _, impl = run("x = 1 + _\n2\n")
+    assert impl.labels == {}
+    # Not a label, so a call to an undefined SUB
+    raises(ParseError, parse, "? 1: foo: ? 2")
+
+
+def test_errors():
+    raises(ParseError, parse, "goto nowhere")
+    raises(ParseError, parse, "foo:\nfoo:")
+    raises(ParseError, parse, "10 ? 1\n010 ? 2")
+    raises(ParseError, parse, 'goto "x"')
+    program = parse("goto nowhere\n? 1", recover=True)
+    assert [str(e) for e in program.errors] == ["Label nowhere not defined"]
+    assert program.errors[0].line == 1
+
+
+def test_serialized():
+    loaded = loads(dumps(parse(SOURCE)))
+    impl = loaded.globals.procedures["_main"].impl
+    assert impl is not None
+    assert set(impl.labels) == {"10", "skip", "20", "again"}
+    assert all(g.target is impl.labels[g.name] for g in gotos(impl))
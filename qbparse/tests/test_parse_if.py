@@ -123,6 +123,23 @@ def test_multi_line():
     ]
 
 
+def test_else_colon():
+    stmts = list(
+        run("""
+            if 1 then
+                print "a";
+            else: print "b";
+            end if
+            print: print "c";
+    """).find_all(Statement)
+    )
+    assert stmts == [
+        If(ONE, [PrintStr("a")], [], [PrintStr("b")]),
+        Print([Print.FINAL_NEWLINE]),
+        PrintStr("c"),
+    ]
+
+
 def test_elseif():
     stmts = list(
         run("""
@@ -0,0 +1,125 @@
+from pathlib import Path
+
+from pytest import raises
+
+from qbparse import parse, parse_file
+from qbparse.ast import Assignment, BinOp, Constant, Print, Var
+from qbparse.datatypes import BUILTIN_TYPES, TypeSignature
+from qbparse.errors import ParseError
+
+SINGLE = BUILTIN_TYPES["single"]
+LONG = BUILTIN_TYPES["long"]
+STRING = BUILTIN_TYPES["string"]
+
+SOURCE = """x = 1
+sub greet (name$, times as long)
+    x = 2
+    print name$
+end sub
+function twice& (n&)
+    if n& then
+        twice& = n& * 2
+    end if
+end function
+print x
+"""
+
+
+def test_signatures():
+    program = parse(SOURCE)
+    greet = program.globals.procedures["greet"]
+    assert greet.signature == TypeSignature(BUILTIN_TYPES["_none"], [STRING, LONG])
+    twice = program.globals.procedures["twice"]
+    assert twice.signature == TypeSignature(LONG, [LONG])
+
+
+def test_local_scope():
+    program = parse(SOURCE)
+    impl = program.globals.procedures["greet"].impl
+    assert impl is not None
+    assert [p.name for p in impl.params] == ["name", "times"]
+    assert impl.symbols is not None
+    local_x = impl.symbols.find_variable("x")
+    assert local_x is not None
+    assert local_x is not program.globals.find_variable("x")
+    assert impl.statements[0] == Assignment(Var(local_x), Constant(2, SINGLE))
+
+
+def test_as_parameter_without_sigil():
+    program = parse("sub s (n as long)\n    n = n + 1\nend sub\n")
+    impl = program.globals.procedures["s"].impl
+    assert impl is not None and impl.symbols is not None
+    n = impl.params[0]
+    assert n.type is LONG
+    assert impl.symbols.find_variable("n") is n
+    assert impl.statements[0] == Assignment(
+        Var(n), BinOp("+", Var(n), Constant(1, SINGLE))
+    )
+
+
+def test_function_result():
+    impl = parse(SOURCE).globals.procedures["twice"].impl
+    assert impl is not None
+    assert impl.symbols is not None
+    result = impl.symbols.find_variable("twice", "&")
+    assert result is not None
+    n = impl.params[0]
+    assert impl.find(Assignment) == Assignment(
+        Var(result), BinOp("*", Var(n), Constant(2, SINGLE))
+    )
+
+
+def test_main_continues_after_procedures():
+    program = parse(SOURCE)
+    main = program.globals.procedures["_main"].impl
+    assert main is not None
+    assert len(main.statements) == 2
+    assert isinstance(main.statements[1], Print)
+
+
+def test_lazy_matches_eager():
+    eager = parse(SOURCE)
+    lazy = parse(SOURCE, lazy=True)
+    for name in ("greet", "twice"):
+        proc = lazy.globals.procedures[name]
+        assert proc.loader is not None
+        assert proc.impl == eager.globals.procedures[name].impl
+        assert proc.loader is None
+        assert proc.impl is proc.impl
+
+
+def test_lazy_defers_errors():
+    source = "sub bad\n? 1 +\nend sub\n? 2"
+    with raises(ParseError):
+        parse(source)
+    program = parse(source, lazy=True)
+    with raises(ParseError) as info:
+        _ = program.globals.procedures["bad"].impl
+    assert (info.value.line, info.value.column) == (2, 6)
+
+    program = parse(source, recover=True, lazy=True)
+    assert program.errors == []
+    impl = program.globals.procedures["bad"].impl
+    assert impl is not None and impl.statements == []
+    assert len(program.errors) == 1
+
+
+def test_lazy_file(tmp_path: Path):
+    path = tmp_path / "test.bas"
+    path.write_bytes(SOURCE.encode())
+    program = parse_file(path, lazy=True)
+    assert program.globals.procedures["greet"].impl == (
+        parse(SOURCE).globals.procedures["greet"].impl
+    )
+
+
+def test_errors():
+    raises(ParseError, parse, "sub foo\n? 1\n")
+    raises(ParseError, parse, "sub foo\nend sub\nsub foo\nend sub")
+    raises(ParseError, parse, "sub foo\nend function")
+    raises(ParseError, parse, "sub foo (x as nothing)\nend sub")
+    raises(ParseError, parse, "sub foo\nend sub\nfoo")
+    program = parse("sub foo\nelse\n? 1\nend sub", recover=True)
+    impl = program.globals.procedures["foo"].impl
+    assert impl is not None and len(impl.statements) == 1
+    assert len(program.errors) == 1
@@ -0,0 +1,103 @@
+from pytest import raises
+
+from qbparse import parse
+from qbparse.ast import Constant, If, Print, Statement
+from qbparse.datatypes import BUILTIN_TYPES
+from qbparse.errors import ParseError
+
+SINGLE = BUILTIN_TYPES["single"]
+STRING = BUILTIN_TYPES["string"]
+
+
+def PrintStr(s: str):
+    return Print([Constant(s, STRING)])
+
+
+def run(input: str):
+    program = parse(input, recover=True)
+    impl = program.globals.procedures["_main"].impl
+    assert impl is not None
+    return program, impl
+
+
+def test_no_errors():
+    program, impl = run('print "a";')
+    assert program.errors == []
+    assert impl.statements == [PrintStr("a")]
+
+
+def test_raises_without_recovery():
+    raises(ParseError, parse, '? 2 +\nprint "a";')
+
+
+def test_multiple_errors():
+    source = 'print "a";\n? 2 +\nprint "b";\n? )\nprint "c";'
+    program, impl = run(source)
+    assert impl.statements == [PrintStr("a"), PrintStr("b"), PrintStr("c")]
+    assert [e.lexpos for e in program.errors] == [
+        source.index("\n", source.index("+")),
+        source.index(")"),
+    ]
+
+
+def test_error_on_last_line():
+    program, impl = run('print "a";\n? 2 +\n')
+    assert len(program.errors) == 1
+    assert impl.statements == [PrintStr("a")]
+
+
+def test_bad_character():
+    source = 'print "a";\n@\nprint "b";'
+    program, impl = run(source)
+    assert impl.statements == [PrintStr("a"), PrintStr("b")]
+    assert [e.lexpos for e in program.errors] == [source.index("@")]
+
+
+def test_unsupported_sigil():
+    source = 'print "a";\nx%& = 1\n? &H1~%&\nsub s\n    y%& = 2\nend sub\nprint "b";'
+    program, impl = run(source)
+    assert impl.statements == [PrintStr("a"), PrintStr("b")]
+    assert [e.lexpos for e in program.errors] == [
+        source.index("x%&"),
+        source.index("&H1"),
+        source.index("y%&"),
+    ]
+    assert program.globals.procedures["s"].impl is not None
+
+
+def test_resync_at_line_split():
+    program, impl = run('? 2 + * 3 : print "a";')
+    assert len(program.errors) == 1
+    assert impl.statements == [PrintStr("a")]
+
+
+def test_error_in_block():
+    program, impl = run("""
+        if 1 then
+            ? 2 +
+            print "a";
+        else
+            ? (
+            print "b";
+        end if
+        print "c";
+    """)
+    assert len(program.errors) == 2
+    assert list(impl.find_all(Statement)) == [
+        If(Constant(1, SINGLE), [PrintStr("a")], [], [PrintStr("b")]),
+        PrintStr("c"),
+    ]
+
+
+def test_stray_block_end():
+    program, impl = run('print "a";\nelse\nprint "b";\nend if\nprint "c";')
+    assert len(program.errors) == 2
+    assert impl.statements == [PrintStr("a"), PrintStr("b"), PrintStr("c")]
+
+
+def test_error_in_procedure_header():
+    source = 'print "a";\nsub s(a as foo)\n    x = 1\nend sub\nprint "b";'
+    program, impl = run(source)
+    assert [str(e) for e in program.errors] == ["Unknown type"]
+    assert impl.statements == [PrintStr("a"), PrintStr("b")]
+    assert "s" not in program.globals.procedures
@@ -0,0 +1,79 @@
+from io import StringIO
+from pathlib import Path
+
+from pytest import CaptureFixture
+
+from qbparse import parse
+from qbparse.interpreter import Interpreter, main
+from qbparse.profiler import Profile
+
+SOURCE = """10 i = i + 1
+if i < 3 then
+    ? i;
+end if
+if i < 3 then goto 10
+"""
+
+
+def profiled(source: str) -> Profile:
+    profile = Profile()
+    Interpreter(parse(source), profile).run(StringIO())
+    return profile
+
+
+def test_hit_counts():
+    profile = profiled(SOURCE)
+    counts = [(profile.name(s), s.hits) for s in profile.stats]
+    assert counts == [
+        ("Assignment:1", 3),
+        ("If:2", 3),
+        ("Print:3", 2),
+        ("If:5", 3),
+        ("Goto:5", 2),
+    ]
+    (outer, inner) = profile.stats[1:3]
+    assert inner.parent is outer
+    assert outer.time >= inner.time
+    assert all(t >= 0 for t in profile.self_times().values())
+
+
+def test_unprofiled_is_uninstrumented():
+    interpreter = Interpreter(parse("? 1"))
+    assert interpreter.body.__code__.co_name == "run"
+
+
+def test_flat():
+    out = StringIO()
+    profiled(SOURCE).write_flat(out)
+    lines = out.getvalue().splitlines()
+    assert lines[0].split() == ["hits", "total", "ms", "self", "ms", "statement"]
+    assert sorted(line.split()[-1] for line in lines[1:]) == [
+        "Assignment:1",
+        "Goto:5",
+        "If:2",
+        "If:5",
+        "Print:3",
+    ]
+
+
+def test_collapsed():
+    profile = profiled(SOURCE)
+    for stats in profile.stats:
+        # Make every statement show up
+        stats.time += 5000 * (stats.parent is None) + 1000
+    out = StringIO()
+    profile.write_collapsed(out)
+    stacks = [line.rsplit(" ", 1)[0] for line in out.getvalue().splitlines()]
+    assert "_main;If:2;Print:3" in stacks
+    assert "_main;Assignment:1" in stacks
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in out.getvalue().splitlines())
+
+
+def test_cli(tmp_path: Path, capsys: CaptureFixture[str]):
+    (tmp_path / "a.bas").write_text(SOURCE)
+    collapsed = tmp_path / "out.folded"
+    main([str(tmp_path / "a.bas"), "--profile", "--collapsed", str(collapsed)])
+    captured = capsys.readouterr()
+    assert captured.out == " 1  2 "
+    assert "Print:3" in captured.err
+    assert collapsed.exists()
@@ -0,0 +1,59 @@
+from collections.abc import Sequence
+
+from ply.lex import LexToken
+from pytest import raises
+
+from qbparse import parse
+from qbparse.context import ParseContext
+from qbparse.lexer import tokenize
+from qbparse.parsers import iter_program
+from qbparse.recording import VERSION, record, replay
+from qbparse.symbols import SymbolStore
+
+SOURCE = """x = 1: y$ = "café"
+10 print x; -2.5, 3e2, 1.5d-3, 1f2
+z~%% = &HFF~%% + &B101`3 + 12345678901234567890
+label: goto label ' done
+sub s (a$8, b as long)
+    a$8 = "a" _
+        + "b"
+end sub
+if$ = "?" rem
+"""
+
+
+def summary(tokens: Sequence[LexToken]) -> list:
+    return [(t.type, t.value, t.lexpos, t.endpos, t.lineno) for t in tokens]
+
+
+def test_round_trip():
+    for source in SOURCE, SOURCE.encode("cp437"), "":
+        tokens = tokenize(source)
+        replayed = replay(record(source), source)
+        assert summary(replayed.tokens) == summary(tokens.tokens)
+        assert (replayed.length, replayed.lineno) == (tokens.length, tokens.lineno)
+        assert list(replayed.starts) == tokens.starts
+    replayed = replay(record(SOURCE))
+    assert summary(replayed.tokens[3:-3]) == summary(tokenize(SOURCE).tokens[3:-3])
+
+
+def test_parse_replayed():
+    replayed = replay(record(SOURCE))
+    symbols = SymbolStore()
+    statements = list(iter_program(ParseContext(replayed, symbols)))
+    expected = parse(SOURCE)
+    impl = expected.globals.procedures["_main"].impl
+    assert impl is not None
+    assert statements == impl.statements
+    assert symbols.variables == expected.globals.variables
+
+
+def test_rejects_stale():
+    data = bytearray(record(SOURCE))
+    with raises(ValueError, match="different source"):
+        replay(bytes(data), SOURCE + "\n")
+    data[4] = VERSION + 1
+    with raises(ValueError, match="version"):
+        replay(bytes(data))
+    with raises(ValueError, match="Not a token recording"):
+        replay(b"QBPA" + bytes(data[4:]))
@@ -0,0 +1,117 @@
+import pickle
+
+from pytest import raises
+
+from qbparse import parse
+from qbparse.ast import Constant, Print, Var
+from qbparse.datatypes import BUILTIN_TYPES, FixedWidthType
+from qbparse.serialize import Writer, dumps, loads
+
+SOURCE = """x = 1
+y$ = "hello"
+z$8 = "fixed"
+if x > 1 then
+    print y$; -x, 1.5
+elseif x then
+    ? 123456789012345678901234567890
+else
+    x = &HFFFFFFFF&&
+end if
+sub greet (name$, times as long)
+    x = 2
+end sub
+function twice& (n&)
+    twice& = n& * 2
+end function
+"""
+
+
+def test_round_trip():
+    program = parse(SOURCE)
+    loaded = loads(dumps(program))
+    for name, proc in program.globals.procedures.items():
+        copy = loaded.globals.procedures[name]
+        assert copy == proc
+        assert copy.impl == proc.impl
+        assert copy.impl is not None and proc.impl is not None
+        assert [(n.start, n.end) for n in copy.impl.find_all(Constant)] == [
+            (n.start, n.end) for n in proc.impl.find_all(Constant)
+        ]
+    assert loaded.globals.variables == program.globals.variables
+    greet = loaded.globals.procedures["greet"].impl
+    assert greet is not None and greet.symbols is not None
+    assert greet.symbols.find_variable("times") == greet.params[1]
+    assert loaded.globals.types.keys() == program.globals.types.keys()
+    assert loaded.lines.starts == program.lines.starts
+
+
+def test_identity_preserved():
+    loaded = loads(dumps(parse(SOURCE)))
+    x = loaded.globals.find_variable("x")
+    assert x is not None and x.type is BUILTIN_TYPES["single"]
+    main = loaded.globals.procedures["_main"].impl
+    assert main is not None and main.symbols is loaded.globals
+    printed = main.find(Print)
+    assert isinstance(printed, Print)
+    assert Print.TAB_SEPARATOR in printed.params
+    # Every reference to a variable is the one object in the symbol store
+    xs = [v for v in main.find_all(Var) if isinstance(v, Var) and v.target.name == "x"]
+    assert xs and all(v.target is x for v in xs)
+
+
+def test_equal_types_share_entry():
+    w = Writer()
+    w.type(FixedWidthType.of_string(8))
+    w.type(FixedWidthType.of_string(8))
+    w.type(FixedWidthType.of_string(4))
+    assert w.derived == [FixedWidthType.of_string(8), FixedWidthType.of_string(4)]
+    assert w.out == bytes([len(w.type_ids) - 2] * 2 + [len(w.type_ids) - 1])
+
+
+def test_float_literals():
+    program = parse("x = 1.5f\ny = -25f-3\nz## = 12345678901234567890f99\n")
+    main = loads(dumps(program)).globals.procedures["_main"].impl
+    assert main is not None
+    assert [c.value for c in main.find_all(Constant) if isinstance(c, Constant)] == [
+        (15, -1),
+        (25, -3),
+        (12345678901234567890, 99),
+    ]
+    assert main == program.globals.procedures["_main"].impl
+
+
+def test_unknown_constant():
+    program = parse("x = 1\n")
+    main = program.globals.procedures["_main"].impl
+    assert main is not None
+    constant = main.find(Constant)
+    assert isinstance(constant, Constant)
+    constant.value = [1]  # type: ignore[assignment]
+    with raises(ValueError, match="Cannot serialize constant"):
+        dumps(program)
+
+
+def test_errors_kept():
+    program = parse("? 1\n? )\n", recover=True)
+    loaded = loads(dumps(program))
+    assert [(str(e), e.lexpos, e.line) for e in loaded.errors] == [
+        (str(e), e.lexpos, e.line) for e in program.errors
+    ]
+
+
+def test_lazy_bodies_serialized():
+    loaded = loads(dumps(parse(SOURCE, lazy=True)))
+    assert loaded.globals.procedures["greet"].impl == (
+        parse(SOURCE).globals.procedures["greet"].impl
+    )
+
+
+def test_smaller_than_pickle():
+    program = parse(SOURCE[: SOURCE.index("sub")] * 20)
+    assert len(dumps(program)) * 4 < len(pickle.dumps(program))
+
+
+def test_bad_input():
+    data = dumps(parse("? 1"))
+    raises(ValueError, loads, b"nope" + data[4:])
+    raises(ValueError, loads, data[:4] + b"\xff" + data[5:])
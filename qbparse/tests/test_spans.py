@@ -0,0 +1,72 @@
+from pytest import raises
+
+from qbparse import parse
+from qbparse.ast import Assignment, BinOp, Constant, If, Node, Print, UniOp
+from qbparse.errors import ParseError
+from qbparse.source import LineIndex
+
+
+def span_text(source: str, node: Node):
+    return source[node.start : node.end]
+
+
+def run(source: str):
+    impl = parse(source).globals.procedures["_main"].impl
+    assert impl is not None
+    return impl
+
+
+def test_statement_spans():
+    source = 'x = 1\n  print "a"; x\n'
+    impl = run(source)
+    assert [span_text(source, s) for s in impl.statements] == [
+        "x = 1",
+        'print "a"; x',
+    ]
+
+
+def test_expression_spans():
+    source = "x = 2 * -(y + 3)"
+    impl = run(source)
+    assignment = impl.find(Assignment)
+    assert isinstance(assignment, Assignment)
+    assert span_text(source, assignment.lval) == "x"
+    assert span_text(source, impl.find(BinOp)) == "2 * -(y + 3)"
+    assert span_text(source, impl.find(UniOp)) == "-(y + 3)"
+    assert [span_text(source, c) for c in impl.find_all(Constant)] == ["2", "3"]
+
+
+def test_if_span():
+    source = "if 1 then\n  ? 2\nend if\n? 3"
+    impl = run(source)
+    assert span_text(source, impl.find(If)) == "if 1 then\n  ? 2\nend if"
+
+
+def test_shared_constants_unspanned():
+    impl = run("? 1, 2")
+    print_ = impl.find(Print)
+    assert isinstance(print_, Print)
+    assert print_.params[1] is Print.TAB_SEPARATOR
+    assert (Print.TAB_SEPARATOR.start, Print.TAB_SEPARATOR.end) == (-1, -1)
+
+
+def test_line_index():
+    lines = LineIndex("ab\ncde\n\nf")
+    assert lines.position(0) == (1, 1)
+    assert lines.position(2) == (1, 3)
+    assert lines.position(3) == (2, 1)
+    assert lines.position(5) == (2, 3)
+    assert lines.position(7) == (3, 1)
+    assert lines.position(8) == (4, 1)
+    assert lines.position(9) == (4, 2)
+    assert lines.line_start(4) == 8
+    assert LineIndex(b"a\nb").position(2) == (2, 1)
+
+
+def test_error_position():
+    with raises(ParseError) as info:
+        parse("x = 1\n  ? 2 + )")
+    assert (info.value.lexpos, info.value.line, info.value.column) == (14, 2, 9)
+
+    program = parse("? )\n? 1\n  ? (", recover=True)
+    assert [(e.line, e.column) for e in program.errors] == [(1, 3), (3, 6)]
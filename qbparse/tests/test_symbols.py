@@ -0,0 +1,114 @@
+from pytest import raises
+
+from qbparse import parse
+from qbparse.context import ParseContext
+from qbparse.datatypes import BUILTIN_TYPES, TypeSignature
+from qbparse.errors import ParseError
+from qbparse.symbols import BUILTIN_PROCS, Procedure, SymbolStore
+
+SINGLE = BUILTIN_TYPES["single"]
+PRELUDE = """count% = 0
+sub note (message$)
+    copy$20 = message$
+end sub
+"""
+
+
+def test_fork_is_copy_on_write():
+    base = SymbolStore()
+    x = base.create_local("x", SINGLE)
+    fork = base.fork()
+    assert fork.variables is base.variables
+    y = fork.create_local("y", SINGLE)
+    fork.create_local("x", BUILTIN_TYPES["integer"])
+    assert fork.find_variable("x") is x
+    assert base.find_variable("y") is None
+    assert base.variables == {("x", SINGLE): x}
+    assert fork.find_variable("y") is y
+    # The base can still change, without affecting the fork
+    base.create_local("z", SINGLE)
+    assert fork.find_variable("z") is None
+
+
+def test_rollback():
+    store = SymbolStore()
+    store.create_local("x", SINGLE)
+    checkpoint = store.fork()
+    store.add_procedure(Procedure("p", TypeSignature(SINGLE, [])))
+    store.lookup_sigil("$4")
+    store = checkpoint
+    assert store.find_procedure("p") is None
+    assert "string * 4" not in store.types
+    assert store.find_variable("x") is not None
+
+
+def test_frozen():
+    store = SymbolStore().freeze()
+    with raises(ValueError):
+        store.create_local("x", SINGLE)
+    with raises(ValueError):
+        store.lookup_sigil("`3")
+    assert store.lookup_sigil("%") is BUILTIN_TYPES["integer"]
+
+
+def test_prelude():
+    prelude = parse(PRELUDE, lazy=True).globals.freeze()
+    first = parse("count% = count% + 1\n", prelude=prelude)
+    second = parse("sub note\nend sub\n", recover=True, prelude=prelude)
+    assert first.globals.named("count") == prelude.named("count")
+    assert first.globals.procedures["note"] is prelude.procedures["note"]
+    assert str(second.errors[0]) == "Duplicate definition"
+    assert "_main" in prelude.procedures
+    assert (
+        prelude.procedures["_main"].impl is not first.globals.procedures["_main"].impl
+    )
+    with raises(ParseError):
+        parse("count% = 1\nend sub\n", prelude=prelude)
+    assert [name for name, _ in prelude.variables] == ["count"]
+
+
+def test_builtin_procedures():
+    symbols = SymbolStore()
+    left = symbols.find_procedure("left")
+    assert left is not None and left.signature is not None
+    assert left.signature.ret is BUILTIN_TYPES["string"]
+    assert left.signature.params == [BUILTIN_TYPES["string"], BUILTIN_TYPES["long"]]
+    assert symbols.find_procedure("left") is left
+    cls = SymbolStore(symbols).find_procedure("cls")
+    assert cls is not None and cls.signature is not None
+    assert cls.signature.ret is BUILTIN_TYPES["_none"]
+    assert symbols.find_procedure("_rgb32") is not None
+    assert symbols.find_procedure("leftover") is None
+    with raises(ParseError, match="Duplicate definition"):
+        parse("sub cls\nend sub\n")
+
+
+def test_builtin_names_resolve_to_builtins():
+    ctx = ParseContext("x = timer", SymbolStore())
+    next(ctx)
+    next(ctx)
+    assert (ctx.tok.type, ctx.tok.value) == ("PROCEDURE", BUILTIN_PROCS["timer"])
+    assert ParseContext("inkey$", SymbolStore()).tok.value is BUILTIN_PROCS["inkey"]
+    # Written with the wrong sigil
+    assert ParseContext("inkey%", SymbolStore()).tok.type == "ERROR"
+    # The parser cannot call procedures in expressions yet, builtin or not
+    with raises(ParseError, match="Unimplemented procedure call"):
+        parse("x = timer")
+    with raises(ParseError, match="Unimplemented procedure call"):
+        parse("timer = 1")
+
+
+def test_variables_by_name():
+    store = SymbolStore()
+    x = store.create_local("x", SINGLE)
+    x_int = store.create_local("x", BUILTIN_TYPES["integer"])
+    fixed = store.create_local("s", store.lookup_sigil("$5"))
+    assert store.named("x") == [x, x_int]
+    y = store.create_local("y", SINGLE)
+    assert store.named("y") == [y]
+    assert store.named("z") == []
+    assert store.find_variable("x", "%") is x_int
+    assert store.find_variable("s", "$5") is fixed
+    assert store.find_variable("s") is None
+    with raises(ParseError, match="Duplicate variable"):
+        store.create_local("x", SINGLE)
@@ -0,0 +1,84 @@
+"""
+Parses on many threads at once. Races show up as exceptions or as results that
+differ from a parse on one thread; on the free-threaded build they are far more
+likely to.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier, Thread
+
+from pytest import MonkeyPatch
+
+from qbparse import context, parse
+from qbparse.serialize import dumps
+
+THREADS = 8
+ROUNDS = 20
+
+SOURCES = [
+    'x = 1\nif x then ? x, "a" else ? &HFF&; 1.5d0\n',
+    "10 a%% = 1\ngoto 10\nsub s (n as long)\n? n\nend sub\n",
+    'function f&\nf& = 2\nend function\ny$2 = "ab"\n? y$2 + "c"\n',
+]
+
+
+def test_concurrent_parses():
+    expected = [dumps(parse(s)) for s in SOURCES]
+    inputs = [s.encode() if n % 2 else s for n in range(ROUNDS) for s in SOURCES]
+    barrier = Barrier(THREADS)
+
+    def work(offset: int) -> list[bytes]:
+        barrier.wait()
+        # Each thread starts at a different input, so all are parsed at once
+        order = inputs[offset:] + inputs[:offset]
+        return [dumps(parse(s, lazy=offset % 2 == 1)) for s in order]
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        results = list(pool.map(work, range(THREADS)))
+    for offset, result in enumerate(results):
+        order = inputs[offset:] + inputs[:offset]
+        for source, data in zip(order, result):
+            text = source if isinstance(source, str) else source.decode()
+            assert data == expected[SOURCES.index(text)]
+
+
+def test_lazy_body_loaded_once():
+    program = parse("sub s\n? 1\nend sub\n", lazy=True)
+    proc = program.globals.procedures["s"]
+    barrier = Barrier(THREADS)
+
+    def load(_: int):
+        barrier.wait()
+        return proc.impl
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        impls = list(pool.map(load, range(THREADS)))
+    assert all(impl is impls[0] for impl in impls)
+    assert proc.impl is impls[0]
+
+
+def test_lazy_body_errors_reported_once():
+    body = "? 1\n" * 10000 + "? 2 +\n"
+    program = parse(f"sub s\n{body}end sub\n", lazy=True, recover=True)
+    proc = program.globals.procedures["s"]
+    barrier = Barrier(THREADS)
+
+    def load(_: int):
+        barrier.wait()
+        return proc.impl
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(load, range(THREADS)))
+    assert len(program.errors) == 1
+
+
+def test_lazy_body_traced(monkeypatch: MonkeyPatch):
+    # The trace prints the function's own PROCEDURE token while its body loads
+    monkeypatch.setattr(context, "TRACE_TOKENS", True)
+    program = parse("function f&\nf& = 2\nend function\n", lazy=True)
+    proc = program.globals.procedures["f"]
+    thread = Thread(target=lambda: proc.impl, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
+    assert proc.impl is not None
@@ -0,0 +1,230 @@
+from random import Random
+
+from pytest import importorskip, mark, raises
+
+from qbparse import parse
+from qbparse.ast import Assignment, BinOp, Constant, Expr, If, UniOp, Var
+from qbparse.runtime import (
+    BINARY_OPS,
+    UNARY_OPS,
+    QBError,
+    Value,
+    constant_value,
+    converter,
+)
+from qbparse.symbols import Variable
+
+np = importorskip("numpy")
+
+from qbparse.vector import column, evaluate, truth  # noqa: E402
+
+
+def parse_expr(source: str) -> Expr:
+    program = parse(f"y = {source}")
+    impl = program.globals.procedures["_main"].impl
+    assert impl is not None
+    assignment = impl.find(Assignment)
+    assert isinstance(assignment, Assignment)
+    return assignment.rval
+
+
+def variables(expr: Expr) -> dict[str, Variable]:
+    return {
+        v.target.name: v.target
+        for v in expr.find_all(Var, nesting=True)
+        if isinstance(v, Var)
+    }
+
+
+@mark.parametrize(
+    "source",
+    [
+        "a% * 3 - b&",
+        "a% \\ b&",
+        "a% mod b&",
+        "a% / b& + 0.5",
+        "a% ^ 2",
+        "a% imp b&",
+        "a% eqv b&",
+        "not a% xor b&",
+        "a% > b& or a% = 3",
+        "-a% and 7",
+    ],
+)
+def test_matches_scalar_operators(source: str):
+    expr = parse_expr(source)
+    names = variables(expr)
+    data = {
+        "a": np.array([-7, -1, 3, 5, 100], dtype=np.int16),
+        "b": np.array([2, 3, -4, 5, 7], dtype=np.int32),
+    }
+    result = evaluate(expr, {var: data[name] for name, var in names.items()})
+    # Row by row with the interpreter's operators
+    for row in range(5):
+        env = {name: int(values[row]) for name, values in data.items()}
+        assert result[row] == scalar(expr, env)
+
+
+def scalar(expr: Expr, env: dict[str, int]) -> Value:
+    match expr:
+        case Constant():
+            return constant_value(expr.value, expr.type)
+        case Var():
+            return env[expr.target.name]
+        case BinOp():
+            return BINARY_OPS[expr.name](
+                scalar(expr.left, env), scalar(expr.right, env)
+            )
+        case UniOp():
+            return UNARY_OPS[expr.name](scalar(expr.param, env))
+        case _:
+            raise ValueError(f"Cannot evaluate {type(expr).__name__}")
+
+
+def test_column_types():
+    integer = parse_expr("a%").find(Var)
+    assert isinstance(integer, Var)
+    values = column([32767.0, 32768, 2.5, 3.5], integer.target.type)
+    assert values.dtype == np.int16
+    assert list(values) == [32767, -32768, 2, 4]
+    expected = [converter(integer.target.type)(v) for v in [32767.0, 32768, 2.5, 3.5]]
+    assert list(values) == expected
+    single = parse_expr("a!").find(Var)
+    assert isinstance(single, Var)
+    assert column([0.1], single.target.type).dtype == np.float32
+
+
+@mark.parametrize(
+    "source",
+    ["a~&& - b&&", "a~&& + b&&", "-a~&&", "b&& * b&&", "a~&& \\ b&&", "a~&& > b&&"],
+)
+def test_integers_past_int64(source: str):
+    expr = parse_expr(source)
+    names = variables(expr)
+    data = {
+        "a": np.array([2**63 + 5, 2**64 - 1, 7], dtype=np.uint64),
+        "b": np.array([2**62, -(2**63), 3], dtype=np.int64),
+    }
+    result = evaluate(expr, {var: data[name] for name, var in names.items()})
+    for row in range(3):
+        env = {name: int(values[row]) for name, values in data.items()}
+        assert result[row] == scalar(expr, env)
+
+
+LARGE_CONSTANTS = ["1e30", "2^70", "20^23", "2^63", "1e18", "1d18", "9.5", "-5", "7"]
+LARGE_OPERATORS = [
+    "+",
+    "-",
+    "*",
+    "\\",
+    "mod",
+    "and",
+    "or",
+    "xor",
+    "imp",
+    "eqv",
+    "<",
+    "=",
+]
+
+
+def large_integer_expressions(count: int) -> list[str]:
+    # Seeded, so the same expressions are tried on every run
+    rng = Random(38)
+
+    def operand(depth: int) -> str:
+        if depth == 0 or rng.random() < 0.3:
+            return rng.choice([*LARGE_CONSTANTS, "a%", "b&"])
+        if rng.random() < 0.2:
+            return f"{rng.choice(['not', '-'])} ({operand(depth - 1)})"
+        op = rng.choice(LARGE_OPERATORS)
+        return f"({operand(depth - 1)}) {op} ({operand(depth - 1)})"
+
+    return [operand(3) for _ in range(count)]
+
+
+@mark.parametrize(
+    "source",
+    [
+        "(not 1e30) = 1",
+        "(2^70 and 1) + a%",
+        "(not 2^70) < a%",
+        "1e30 mod 7",
+        "1e30 mod a%",
+        "-(2^70) mod a%",
+        "1e30 \\ b&",
+        "not (20^23) * a%",
+        "9.5 eqv 2^63",
+        "-(1d18 xor 3) = -1d18",
+        *large_integer_expressions(200),
+    ],
+)
+def test_large_integers_match_scalar(source: str):
+    expr = parse_expr(source)
+    names = variables(expr)
+    data = {
+        "a": np.array([3, -5, 100], dtype=np.int16),
+        "b": np.array([2, 7, -(2**31)], dtype=np.int32),
+    }
+    rows = []
+    for row in range(3):
+        env = {name: int(values[row]) for name, values in data.items()}
+        try:
+            rows.append(scalar(expr, env))
+        except QBError as error:
+            rows.append(error)
+    columns = {var: data[name] for name, var in names.items()}
+    errors = [str(e) for e in rows if isinstance(e, QBError)]
+    if errors:
+        with raises(QBError) as error:
+            evaluate(expr, columns)
+        assert str(error.value) in errors
+        return
+    result = evaluate(expr, columns)
+    for row in range(3):
+        assert (result[row] if result.ndim else result[()]) == rows[row]
+
+
+def test_large_integer_column():
+    (a,) = variables(parse_expr("a~&&")).values()
+    values = column([2**64 - 1, 2**63, 2**64 + 1, -1], a.type)
+    assert values.dtype == np.uint64
+    assert list(values) == [2**64 - 1, 2**63, 1, 2**64 - 1]
+    # NumPy alone would make these float64
+    assert list(column([2**64 - 1, 1], a.type)) == [2**64 - 1, 1]
+    assert list(column([2**63, 2.5], a.type)) == [2**63, 2]
+
+
+def test_guard_and_strings():
+    program = parse('if a$ + "!" = "x!" then ? 1')
+    impl = program.globals.procedures["_main"].impl
+    assert impl is not None
+    guard = impl.find(If)
+    assert isinstance(guard, If)
+    (a,) = variables(guard.guard).values()
+    result = evaluate(guard.guard, {a: np.array(["x", "y", ""])})
+    assert list(truth(result)) == [True, False, False]
+
+
+def test_errors():
+    expr = parse_expr("a% \\ b%")
+    names = variables(expr)
+    columns = {names["a"]: np.array([1, 2]), names["b"]: np.array([1, 0])}
+    raises(QBError, evaluate, expr, columns)
+    raises(QBError, evaluate, parse_expr("1 / a"), {})
+    raises(QBError, evaluate, parse_expr("a$ + 1"), {})
+    # The same errors as the interpreter
+    expr = parse_expr("a ^ (1 / 3)")
+    (a,) = variables(expr).values()
+    with raises(QBError, match="Illegal function call"):
+        evaluate(expr, {a: np.array([8.0, -8.0])})
+    with raises(QBError, match="Illegal function call"):
+        scalar(expr, {"a": -8})
+    with raises(QBError, match="Division by zero"):
+        evaluate(parse_expr("0 ^ -1"), {})
+
+
+def test_constant():
+    result = evaluate(parse_expr("2 + 3"), {})
+    assert result.shape == ()
+    assert result == 5
@@ -0,0 +1,95 @@
+from pytest import raises
+
+from qbparse import lexer
+from qbparse.datatypes import BUILTIN_TYPES
+from qbparse.lexer import Tokens
+from qbparse.source import source_hash
+from qbparse.workspace import Workspace, deep_size
+
+SOURCE = """x% = 1
+function twice& (n&)
+    twice& = n& * 2
+end function
+"""
+
+
+def test_parse_on_access():
+    workspace = Workspace()
+    document = workspace.open("a.bas", SOURCE, 1)
+    assert document.program is None and workspace.size == 0
+    program = workspace.program("a.bas")
+    assert workspace.program("a.bas") is program
+    assert document.size == deep_size(program) > 0
+    assert workspace.sizes() == {"a.bas": document.size}
+    assert workspace.size == document.size
+
+
+def test_versions():
+    workspace = Workspace()
+    workspace.open("a.bas", SOURCE, 2)
+    first = workspace.program("a.bas")
+    workspace.open("a.bas", "y = 2\n", 3)
+    assert workspace.size == 0
+    assert workspace.program("a.bas") is not first
+    with raises(ValueError):
+        workspace.open("a.bas", SOURCE, 1)
+    workspace.close("a.bas")
+    assert workspace.size == 0 and not workspace.documents
+
+
+def test_eviction_keeps_outline():
+    workspace = Workspace(budget=0)
+    workspace.open("a.bas", SOURCE)
+    workspace.open("b.bas", "b = 1\n")
+    workspace.program("a.bas")
+    # Over budget, but the program just parsed is kept
+    assert list(workspace.sizes()) == ["a.bas"]
+    workspace.program("b.bas")
+    assert list(workspace.sizes()) == ["b.bas"]
+    a = workspace.documents["a.bas"]
+    assert a.program is None
+    outline = workspace.outline("a.bas")
+    assert a.program is None
+    signature = outline.procedures["twice"]
+    assert signature is not None and signature.ret is BUILTIN_TYPES["long"]
+    assert [v.name for v in outline.variables] == ["x"]
+    # Parsed again on demand
+    assert workspace.program("a.bas").globals.find_variable("x", "%") is not None
+    assert list(workspace.sizes()) == ["a.bas"]
+
+
+def test_budget_holds_recent_programs():
+    workspace = Workspace()
+    for n in range(3):
+        workspace.open(f"{n}.bas", SOURCE)
+        workspace.program(f"{n}.bas")
+    workspace.budget = workspace.size - 1
+    workspace.program("0.bas")
+    workspace.evict()
+    assert list(workspace.sizes()) == ["2.bas", "0.bas"]
+    assert workspace.size == sum(workspace.sizes().values())
+
+
+def test_lazy_bodies_counted():
+    source = SOURCE + "".join(f"sub s{n}\n    y = {n}\nend sub\n" for n in range(50))
+    workspace = Workspace(lazy=True)
+    workspace.open("a.bas", source)
+    program = workspace.program("a.bas")
+    assert source_hash(source) not in lexer.cache.entries
+    # Unloaded bodies keep the tokens alive, so they count towards the budget
+    unloaded = workspace.sizes()["a.bas"]
+    assert unloaded > deep_size(Tokens(source))
+    eager = Workspace()
+    eager.open("a.bas", source)
+    eager.program("a.bas")
+    for proc in program.globals.procedures.values():
+        assert proc.impl is not None
+    # Measured again once the bodies have loaded and let go of the tokens
+    loaded = workspace.sizes()["a.bas"]
+    assert loaded < unloaded
+    assert abs(loaded - eager.size) < eager.size // 10
+    assert workspace.size == loaded
+    workspace.budget = 0
+    workspace.open("b.bas", SOURCE)
+    workspace.program("b.bas")
+    assert list(workspace.sizes()) == ["b.bas"]
@@ -0,0 +1,345 @@
+"""
+Evaluates an expression over many rows at once with NumPy.
+
+Each variable is given as an array with one value per row, and the expression
+is evaluated columnwise, one NumPy operation per node. Values follow the
+interpreter's semantics: integer results are exact, computed in 64 bits or as
+Python integers where they would not fit, and floating point results are in
+double precision (extended precision if _FLOAT is involved). Values are only
+made to fit a variable's type by column(). Powers of doubles are the exception
+to one operation per node: they are worked out row by row, to give the same
+result as the interpreter.
+
+NumPy is an optional dependency, needed only by this module.
+"""
+
+from collections.abc import Mapping
+from typing import Any
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from qbparse.ast import BinOp, Constant, Expr, UniOp, Var
+from qbparse.datatypes import BUILTIN_TYPES, FixedWidthType, Type
+from qbparse.runtime import (
+    QBError,
+    base_type,
+    constant_value,
+    initial_value,
+    is_integer,
+    is_string,
+    power,
+    to_integer,
+)
+from qbparse.symbols import Variable
+
+type Array = NDArray[Any]
+
+INTEGER_DTYPES = [
+    np.dtype(np.int8),
+    np.dtype(np.uint8),
+    np.dtype(np.int16),
+    np.dtype(np.uint16),
+    np.dtype(np.int32),
+    np.dtype(np.uint32),
+    np.dtype(np.int64),
+    np.dtype(np.uint64),
+]
+
+COMPARISONS = {
+    "=": np.equal,
+    "<>": np.not_equal,
+    "<": np.less,
+    ">": np.greater,
+    "<=": np.less_equal,
+    ">=": np.greater_equal,
+}
+
+# As operators, since NumPy would make a Python integer result uint64 to invert
+# it
+LOGICAL = {
+    "imp": lambda a, b: ~a | b,
+    "eqv": lambda a, b: ~(a ^ b),
+    "xor": np.bitwise_xor,
+    "or": np.bitwise_or,
+    "and": np.bitwise_and,
+}
+
+ARITHMETIC = {
+    "-": np.subtract,
+    "*": np.multiply,
+}
+
+
+def dtype(typ: Type) -> np.dtype[Any]:
+    """
+    The NumPy type that stores values of a QB64 type: the smallest integer type
+    that holds its range, float32, float64, longdouble, or str.
+    """
+    if is_integer(typ):
+        for candidate in INTEGER_DTYPES:
+            info = np.iinfo(candidate)
+            if info.min <= typ.min and typ.max <= info.max:
+                return candidate
+        raise QBError(f"No array type for {typ.name}")
+    if is_string(typ):
+        return np.dtype(np.str_)
+    base = base_type(typ)
+    if base is BUILTIN_TYPES["single"]:
+        return np.dtype(np.float32)
+    if base is BUILTIN_TYPES["_float"]:
+        return np.dtype(np.longdouble)
+    return np.dtype(np.float64)
+
+
+def is_text(values: Array) -> bool:
+    return values.dtype.kind == "U"
+
+
+# Past this, a result estimated in floating point may not fit in int64
+INT64_SAFE = 2.0**62
+
+# Integers past this are not all exactly floats
+FLOAT_EXACT = 2**53
+
+INT64_MIN = int(np.iinfo(np.int64).min)
+INT64_MAX = int(np.iinfo(np.int64).max)
+
+round_each = np.frompyfunc(to_integer, 1, 1)
+power_each = np.frompyfunc(power, 2, 1)
+
+
+def wide(values: Array) -> Array:
+    # As Python integers, which cannot overflow. Operations on 0-dimensional
+    # arrays give NumPy scalars, which are made arrays first.
+    return np.asarray(values).astype(object)
+
+
+def exact_integers(values: Array) -> Array:
+    # The interpreter's rounding, to Python integers
+    return np.asarray(round_each(values), dtype=object)
+
+
+def widen(a: Array, b: Array) -> tuple[Array, Array]:
+    # Integers worked on with Python integers are both made Python integers, as
+    # int64 ones would overflow in intermediate results
+    if a.dtype.kind == "O" or b.dtype.kind == "O":
+        return wide(a), wide(b)
+    return a, b
+
+
+def comparable(a: Array, b: Array) -> tuple[Array, Array]:
+    # NumPy compares integers with floats in floating point, which rounds large
+    # integers; as Python objects they are compared exactly
+    if (a.dtype.kind == "f") == (b.dtype.kind == "f"):
+        return a, b
+    integral = b if a.dtype.kind == "f" else a
+    if integral.dtype.kind == "O" or np.any(np.abs(integral) > FLOAT_EXACT):
+        return wide(a), wide(b)
+    return a, b
+
+
+def array(values: Any) -> Array:
+    """
+    The result of a NumPy operation as an array. Operations on 0-dimensional
+    object arrays give plain Python objects, and a Python integer may not fit
+    any other array type.
+    """
+    if isinstance(values, np.ndarray):
+        return values
+    if isinstance(values, int):
+        return np.asarray(values, dtype=object)
+    return np.asarray(values)
+
+
+def numbers(values: Array) -> Array:
+    if is_text(values):
+        raise QBError("Type mismatch")
+    if values.dtype.kind == "f":
+        return values.astype(np.longdouble if values.dtype == np.longdouble else float)
+    if values.dtype.kind == "O":
+        return values
+    if values.dtype == np.uint64 and np.any(values > np.iinfo(np.int64).max):
+        return wide(values)
+    return values.astype(np.int64)
+
+
+def integers(values: Array) -> Array:
+    """
+    Round to the nearest integer, halves to even, as QB64 does for operands of
+    integer operators.
+    """
+    values = numbers(values)
+    if values.dtype.kind == "O":
+        return exact_integers(values)
+    if values.dtype.kind == "f":
+        rounded = np.rint(values)
+        if np.any(np.abs(rounded) >= INT64_SAFE):
+            return exact_integers(rounded)
+        return rounded.astype(np.int64)
+    return values
+
+
+def arithmetic(op: Any, *operands: Array) -> Array:
+    """
+    Apply op to numbers. Integers are worked on in int64 unless a result might
+    overflow it, which is checked by estimating the results in floating point.
+    """
+    if all(a.dtype == np.int64 for a in operands):
+        estimate = op(*[a.astype(float) for a in operands])
+        if np.any(np.abs(estimate) >= INT64_SAFE):
+            operands = tuple(wide(a) for a in operands)
+    return op(*operands)
+
+
+def as_array(values: ArrayLike) -> Array:
+    """
+    Values as an array. NumPy makes float64 from Python integers past int64,
+    losing precision, so such values are kept as Python objects instead.
+    """
+    array = np.asarray(values)
+    if array.dtype.kind != "f" or isinstance(values, np.ndarray):
+        return array
+    exact = np.asarray(values, dtype=object)
+    for value in exact.flat:
+        if isinstance(value, int) and not INT64_MIN <= value <= INT64_MAX:
+            return exact
+    return array
+
+
+def column(values: ArrayLike, typ: Type) -> Array:
+    """
+    Values stored in variables of the given type: integers are rounded and wrap
+    around within the type's range, floats are rounded to the type's precision,
+    and fixed-length strings are padded or truncated.
+    """
+    values = as_array(values)
+    target = dtype(typ)
+    if is_string(typ):
+        if not is_text(values):
+            raise QBError("Type mismatch")
+        if isinstance(typ, FixedWidthType):
+            return np.char.ljust(values.astype(f"U{typ.width}"), typ.width)
+        return values.astype(target)
+    if is_integer(typ):
+        values = integers(values)
+        low = int(typ.min)
+        span = int(typ.max) - low + 1
+        if span < 2**64 or values.dtype.kind == "O":
+            values = (values - low) % span + low
+        return values.astype(target)
+    return numbers(values).astype(target)
+
+
+def divide_check(divisor: Array):
+    if np.any(divisor == 0):
+        raise QBError("Division by zero")
+
+
+def int_divide(a: Array, b: Array) -> Array:
+    a, b = widen(integers(a), integers(b))
+    divide_check(b)
+    quotient = array(arithmetic(np.abs, a) // arithmetic(np.abs, b))
+    return np.where((a < 0) == (b < 0), quotient, -quotient)
+
+
+def binary(name: str, a: Array, b: Array) -> Array:
+    if name in COMPARISONS:
+        if is_text(a) != is_text(b):
+            raise QBError("Type mismatch")
+        if not is_text(a):
+            a, b = comparable(a, b)
+        return np.where(COMPARISONS[name](a, b), -1, 0).astype(np.int64)
+    if name == "+":
+        if is_text(a) and is_text(b):
+            return np.char.add(a, b)
+        return arithmetic(np.add, numbers(a), numbers(b))
+    if name in LOGICAL:
+        return LOGICAL[name](*widen(integers(a), integers(b)))
+    if name in ARITHMETIC:
+        return arithmetic(ARITHMETIC[name], numbers(a), numbers(b))
+    if name == "/":
+        b = numbers(b)
+        divide_check(b)
+        return np.true_divide(numbers(a), b)
+    if name == "\\":
+        return int_divide(a, b)
+    if name == "mod":
+        a, b = widen(integers(a), integers(b))
+        return a - b * int_divide(a, b)
+    if name == "^":
+        base = numbers(a)
+        if base.dtype == np.longdouble:
+            return np.power(base, numbers(b))
+        # NumPy's pow can differ from the C library's in the last place, so
+        # each row uses the interpreter's
+        return np.asarray(power_each(base.astype(float), numbers(b))).astype(float)
+    raise QBError(f"Unknown operator {name}")
+
+
+class Evaluator:
+    def __init__(self, columns: Mapping[Variable, ArrayLike]):
+        self.columns = columns
+        # Variables converted to their type, so each is done once
+        self.cache: dict[int, Array] = {}
+
+    def variable(self, var: Variable) -> Array:
+        values = self.cache.get(id(var))
+        if values is None:
+            if var in self.columns:
+                values = column(self.columns[var], var.type)
+            else:
+                values = np.asarray(initial_value(var.type), dtype(var.type))
+            self.cache[id(var)] = values
+        return values
+
+    def expr(self, expr: Expr) -> Array:
+        match expr:
+            case Constant():
+                value = constant_value(expr.value, expr.type)
+                return np.asarray(value, dtype(expr.type))
+            case Var():
+                return self.variable(expr.target)
+            case BinOp():
+                left, right = self.expr(expr.left), self.expr(expr.right)
+                return array(binary(expr.name, left, right))
+            case UniOp(name="negation"):
+                return array(arithmetic(np.negative, numbers(self.expr(expr.param))))
+            case UniOp(name="not"):
+                return array(np.invert(integers(self.expr(expr.param))))
+            case _:
+                raise QBError(f"Cannot evaluate {type(expr).__name__}")
+
+
+def evaluate(expr: Expr, columns: Mapping[Variable, ArrayLike]) -> Array:
+    """
+    Evaluate expr for every row of columns, which gives an array of values for
+    each variable. Variables not in columns have their initial value. The result
+    has one value per row, or is 0-dimensional if expr uses no variables.
+
+    Raises QBError if any row would: division by zero, floating point overflow,
+    fractional powers of negative numbers and type mismatches are checked for
+    the whole column.
+    """
+    try:
+        with np.errstate(over="call", divide="call", invalid="call", call=fp_error):
+            return Evaluator(columns).expr(expr)
+    except OverflowError:
+        raise QBError("Overflow") from None
+
+
+def fp_error(kind: str, flag: int):
+    # Called by NumPy with the kind of floating point error. An invalid value is
+    # a NaN, from a negative number to a fractional power.
+    if kind == "divide by zero":
+        raise QBError("Division by zero")
+    if kind == "invalid value":
+        raise QBError("Illegal function call")
+    raise QBError("Overflow")
+
+
+def truth(values: Array) -> NDArray[np.bool_]:
+    """
+    Rows where a guard evaluated by evaluate() is true.
+    """
+    return numbers(values) != 0
@@ -0,0 +1,220 @@
+"""
+Parsed programs for many open documents, as kept by an editor backend.
+
+Documents are parsed when their program is first asked for, in recovery mode
+so that a program is always available. A Workspace has a memory budget: when
+the parsed programs together use more than that, the least recently used ones
+are dropped, keeping only an outline of their symbols, and are parsed again
+when next needed. Programs are parsed without the tokenize() cache, so that
+dropping one frees its tokens too.
+
+In lazy mode a program keeps its tokens until every body is loaded. A program
+is measured again on the next call to the Workspace after one of its bodies
+loads.
+
+A Workspace must only be used by one thread at a time.
+"""
+
+import gc
+import sys
+from collections import OrderedDict
+from collections.abc import Callable
+from types import FunctionType, ModuleType
+from typing import Any
+
+from qbparse import Program, parse
+from qbparse.ast import ProcDefinition
+from qbparse.datatypes import TypeSignature
+from qbparse.errors import ParseError
+from qbparse.source import Source
+from qbparse.symbols import Variable
+
+# Default memory budget, in bytes
+DEFAULT_BUDGET = 256 * 1024 * 1024
+
+
+def deep_size(root: Any) -> int:
+    """
+    Bytes used by root and everything it refers to, leaving out classes and
+    modules. Of a function, only the variables it closes over are followed, as
+    those of a lazy body's loader keep its parse state alive.
+    """
+    seen: set[int] = set()
+    stack = [root]
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, type | ModuleType):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, FunctionType):
+            stack.extend(obj.__closure__ or ())
+        else:
+            stack.extend(gc.get_referents(obj))
+    return size
+
+
+class Outline:
+    """
+    The global symbols of a program: enough to complete names and show
+    signatures without its AST.
+    """
+
+    def __init__(self, program: Program):
+        globals = program.globals
+        self.procedures: dict[str, TypeSignature | None] = {
+            name: proc.signature
+            for name, proc in globals.procedures.items()
+            if name != "_main"
+        }
+        self.variables: list[Variable] = list(globals.variables.values())
+        self.errors: list[ParseError] = list(program.errors)
+
+    def __repr__(self):
+        return (
+            f"[Outline procedures={len(self.procedures)} "
+            f"variables={len(self.variables)}]"
+        )
+
+
+class Document:
+    def __init__(self, uri: str, text: Source, version: int):
+        self.uri = uri
+        self.text = text
+        self.version = version
+        # None until parsed, and again once evicted
+        self.program: Program | None = None
+        # Outline of the last parse, kept after eviction
+        self.outline: Outline | None = None
+        # Bytes used by program, measured when it was parsed
+        self.size = 0
+
+    def __repr__(self):
+        state = "parsed" if self.program is not None else "unparsed"
+        return f"[Document {self.uri} version={self.version} {state} size={self.size}]"
+
+
+class Workspace:
+    def __init__(self, budget: int = DEFAULT_BUDGET, lazy: bool = False):
+        """
+        budget is the memory, in bytes, that parsed programs may use together.
+        The most recently used program is kept even if it alone is over budget.
+        """
+        self.budget = budget
+        self.lazy = lazy
+        self.documents: dict[str, Document] = {}
+        # Documents with a parsed program, least recently used first
+        self.parsed: OrderedDict[str, Document] = OrderedDict()
+        # Total size of the parsed programs
+        self.size = 0
+        # Documents with a lazy body loaded since they were last measured
+        self.stale: set[str] = set()
+
+    def __repr__(self):
+        return (
+            f"[Workspace documents={len(self.documents)} parsed={len(self.parsed)} "
+            f"size={self.size} budget={self.budget}]"
+        )
+
+    def open(self, uri: str, text: Source, version: int = 0) -> Document:
+        """
+        Add a document, or replace its text. A document's versions must
+        increase; raises ValueError for a version older than the current one.
+        """
+        document = self.documents.get(uri)
+        if document is not None:
+            if version < document.version:
+                raise ValueError(
+                    f"Version {version} of {uri} is older than {document.version}"
+                )
+            self.drop(document)
+        document = self.documents[uri] = Document(uri, text, version)
+        return document
+
+    def close(self, uri: str):
+        self.drop(self.documents.pop(uri))
+
+    def program(self, uri: str) -> Program:
+        """
+        The parsed program of a document, parsing it if needed.
+        """
+        document = self.documents[uri]
+        program = document.program
+        if program is None:
+            program = parse(document.text, recover=True, lazy=self.lazy, cached=False)
+            for proc in program.globals.procedures.values():
+                if proc.loader is not None:
+                    proc.loader = self.watch(uri, proc.loader)
+            document.program = program
+            document.outline = None
+            document.size = deep_size(program)
+            self.size += document.size
+            self.parsed[uri] = document
+        else:
+            self.parsed.move_to_end(uri)
+        self.evict()
+        return program
+
+    def watch(
+        self, uri: str, loader: Callable[[], ProcDefinition]
+    ) -> Callable[[], ProcDefinition]:
+        # Only the stale set and uri are closed over, so that measuring the
+        # program does not take in the Workspace
+        stale = self.stale
+
+        def load() -> ProcDefinition:
+            impl = loader()
+            stale.add(uri)
+            return impl
+
+        return load
+
+    def measure(self):
+        """
+        Measure again the programs whose lazy bodies have loaded.
+        """
+        while self.stale:
+            document = self.parsed.get(self.stale.pop())
+            if document is not None and document.program is not None:
+                size = deep_size(document.program)
+                self.size += size - document.size
+                document.size = size
+
+    def outline(self, uri: str) -> Outline:
+        """
+        The outline of a document's symbols. An evicted document's outline is
+        kept, so only a document that was never parsed is parsed for this.
+        """
+        document = self.documents[uri]
+        if document.outline is None:
+            if document.program is None:
+                self.program(uri)
+            assert document.program is not None
+            document.outline = Outline(document.program)
+        return document.outline
+
+    def evict(self):
+        """
+        Drop the least recently used programs until within budget, apart from
+        the most recently used one.
+        """
+        self.measure()
+        while self.size > self.budget and len(self.parsed) > 1:
+            uri, document = next(iter(self.parsed.items()))
+            document.outline = self.outline(uri)
+            self.drop(document)
+
+    def drop(self, document: Document):
+        if document.program is not None:
+            document.program = None
+            self.size -= document.size
+            document.size = 0
+            del self.parsed[document.uri]
+
+    def sizes(self) -> dict[str, int]:
+        """
+        Bytes used by the program of each parsed document.
+        """
+        self.measure()
+        return {uri: document.size for uri, document in self.parsed.items()}
@@ -1,5 +1,6 @@
 from collections.abc import Callable
 from logging import Logger
+from mmap import mmap
 from re import VERBOSE, Match, Pattern, RegexFlag
 from typing import Any
 
@@ -12,6 +13,8 @@ class LexToken:
     lineno: int
     lexpos: int
     lexer: Lexer
+    # Not part of PLY; set by qbparse.context.ParseContext
+    endpos: int
 
     def __str__(self) -> str: ...
     def __repr__(self) -> str: ...
@@ -19,13 +22,17 @@ class LexToken:
 class Lexer:
     lexpos: int
     lineno: int
-    lexdata: str | bytes
+    lexdata: str | bytes | mmap
     lexlen: int
-    lexmatch: Match[str]
+    lexmatch: Match[Any]
+    lexstatere: dict[str, list[tuple[Pattern[Any], list[Any]]]]
+    lexstateignore: dict[str, Any]
+    lexliterals: str | bytes
+    lexstatestack: list[str]
 
     def __init__(self) -> None: ...
-    def clone(self, object: object) -> Lexer: ...
-    def input(self, s: str | bytes) -> None: ...
+    def clone(self, object: object | None = None) -> Lexer: ...
+    def input(self, s: str | bytes | mmap) -> None: ...
     def begin(self, state: str) -> None: ...
     def push_state(self, state: str) -> None: ...
     def pop_state(self) -> None: ...